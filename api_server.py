@@ -6,12 +6,8 @@ Flask API Server for Zotero Tag Management
 """
 
 import os
-import json
-import subprocess
-import re
 import threading
 import time
-import requests
 from pathlib import Path
 from datetime import datetime
 from flask import Flask, request, jsonify
@@ -29,20 +25,26 @@ sync_status = {
 }
 
 from zotero_api import (
-    get_zotero_client,
     add_tags_to_item,
-    set_tags_on_item,
     fetch_all_items,
     item_to_row,
+    items_to_dataframe,
     replace_cluster_tag,
     batch_replace_cluster_tags,
     batch_update_items,
+    fetch_items_by_keys,
     # Ideas API
     fetch_ideas,
+    get_idea,
     create_idea,
     update_idea,
-    delete_idea
+    delete_idea,
+    sync_store_if_stale
 )
+from zotero_pool import pool_metrics, zotero_client
+from tag_queue import TagWriteQueue
+from zotero_store import open_store
+from papers_store import get_papers_store
 
 # Load .env
 env_path = Path(__file__).parent / ".env"
@@ -53,16 +55,65 @@ if env_path.exists():
             os.environ.setdefault(k.strip(), v.strip())
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Scores-Shape", "X-Scores-Dtype"])
 
 # API Key authentication
 API_KEY = os.environ.get("APP_API_KEY")
 
+# 로컬 Zotero 미러가 이보다 오래되면 읽기 전에 증분 동기화 (초)
+MIRROR_MAX_AGE = float(os.environ.get("ZOTERO_MIRROR_MAX_AGE", "30"))
+
+
+def get_mirror(zot):
+    """로컬 SQLite 미러 (태그/아이디어 읽기, 쓰기 계획용)"""
+    return sync_store_if_stale(zot, open_store(zot), MIRROR_MAX_AGE)
+
+
+# 태그 편집 write-behind 큐: 편집을 모아서 이 주기(초)마다 Zotero에 씀
+TAG_QUEUE_FLUSH_INTERVAL = float(os.environ.get("TAG_QUEUE_FLUSH_INTERVAL", "2"))
+tag_queue = None
+tag_queue_lock = threading.Lock()
+
+
+def get_tag_queue():
+    """기본 라이브러리의 태그 쓰기 큐 (처음 호출 시 flush 스레드 시작, 밀린 편집 이어서 처리)"""
+    global tag_queue
+    with tag_queue_lock:
+        if tag_queue is None:
+            with zotero_client() as zot:
+                path = open_store(zot).path.with_name(f"tag_queue_{zot.library_type}_{zot.library_id}.sqlite")
+            tag_queue = TagWriteQueue(path, flush_interval=TAG_QUEUE_FLUSH_INTERVAL)
+            tag_queue.start(zotero_client, get_mirror, on_flushed=update_papers_json_tags_bulk)
+        return tag_queue
+
+
+def enqueue_tag_edit(zot, keys: list, **edit) -> dict:
+    """태그 편집을 큐에 넣고 미러에 바로 반영
+
+    edit: TagWriteQueue.enqueue 인자 (replace= / add= / remove=)
+    Returns: key -> 새 태그 목록 (라이브러리에 없는 아이템은 None)
+    """
+    store = get_mirror(zot)
+    items = fetch_items_by_keys(zot, keys, store=store)  # 미러에 없는 아이템만 GET
+    queue = get_tag_queue()
+    tags_by_key = {}
+    for key in dict.fromkeys(keys):
+        if key not in items:
+            tags_by_key[key] = None
+            continue
+        op = queue.enqueue(key, **edit)
+        tags_by_key[key] = TagWriteQueue.apply_locally(store, key, op)
+    return tags_by_key
+
+
+# POST지만 읽기만 하는 엔드포인트 (body가 커서 GET 대신 POST) → API key 불필요
+READ_ONLY_POST_ENDPOINTS = {'semantic_search_batch'}
+
 
 @app.before_request
 def check_api_key():
     """Check API key for write operations"""
-    if request.method in ['POST', 'PUT', 'DELETE']:
+    if request.method in ['POST', 'PUT', 'DELETE'] and request.endpoint not in READ_ONLY_POST_ENDPOINTS:
         if not API_KEY:
             return jsonify({"error": "Server API key not configured"}), 500
 
@@ -77,8 +128,28 @@ def check_api_key():
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    return jsonify({"status": "ok"})
+    """Health check endpoint (always 200 while the process is up; search readiness in semantic_model)"""
+    return jsonify({"status": "ok", "semantic_model": semantic_model_status})
+
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness for search traffic: 503 until the query encoder is loaded and warmed
+
+    SEMANTIC_MODEL_PRELOAD=lazy never gates (the first search loads the model); status is only reported.
+    """
+    ready = SEMANTIC_MODEL_PRELOAD == "lazy" or semantic_model_status["status"] == "ready"
+    return jsonify({"ready": ready, "semantic_model": semantic_model_status}), 200 if ready else 503
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Zotero client pool utilization / connection reuse, papers.json cache, query embedding cache"""
+    return jsonify({
+        "zotero_pool": pool_metrics(),
+        "papers_store": get_papers_store().status(),
+        "query_cache": _query_cache.metrics() if _query_cache is not None else None,
+    })
 
 
 @app.route('/api/auth/verify', methods=['POST'])
@@ -98,59 +169,65 @@ def verify_auth():
 def get_paper_tags(zotero_key):
     """Get tags for a specific paper"""
     try:
-        zot = get_zotero_client()
-        item = zot.item(zotero_key)
-        tags = [t['tag'] for t in item['data'].get('tags', [])]
-        return jsonify({"success": True, "tags": tags})
+        with zotero_client() as zot:
+            store = get_mirror(zot)
+            tags = store.item_tags(zotero_key)
+            if tags is None:
+                # 미러에 아직 없는 아이템 (방금 추가됨 등)
+                item = zot.item(zotero_key)
+                store.upsert_item(item)
+                tags = [t['tag'] for t in item['data'].get('tags', [])]
+            return jsonify({"success": True, "tags": tags})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
 @app.route('/api/tags/paper/<zotero_key>', methods=['POST'])
 def update_paper_tags(zotero_key):
-    """Update tags for a specific paper (replace all tags)"""
+    """Update tags for a specific paper (replace all tags)
+
+    바로 응답하고 Zotero 쓰기는 태그 큐에서 처리
+    """
     try:
         data = request.json
         tags = data.get('tags', [])
 
-        zot = get_zotero_client()
-        success = set_tags_on_item(zot, zotero_key, tags)
+        with zotero_client() as zot:
+            tags = enqueue_tag_edit(zot, [zotero_key], replace=tags)[zotero_key]
 
-        if success:
-            # Update local papers.json
-            update_papers_json_tags(zotero_key, tags)
-            return jsonify({"success": True, "tags": tags})
-        else:
-            return jsonify({"success": False, "error": "Failed to update tags"}), 500
+        if tags is None:
+            return jsonify({"success": False, "error": "Item not found"}), 404
+        return jsonify({"success": True, "tags": tags, "queued": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
 @app.route('/api/tags/paper/<zotero_key>/add', methods=['POST'])
 def add_paper_tags(zotero_key):
-    """Add tags to a paper (preserves existing)"""
+    """Add tags to a paper (preserves existing)
+
+    바로 응답하고 Zotero 쓰기는 태그 큐에서 처리
+    """
     try:
         data = request.json
         new_tags = data.get('tags', [])
 
-        zot = get_zotero_client()
-        success = add_tags_to_item(zot, zotero_key, new_tags)
+        with zotero_client() as zot:
+            all_tags = enqueue_tag_edit(zot, [zotero_key], add=new_tags)[zotero_key]
 
-        if success:
-            # Get updated tags
-            item = zot.item(zotero_key)
-            all_tags = [t['tag'] for t in item['data'].get('tags', [])]
-            update_papers_json_tags(zotero_key, all_tags)
-            return jsonify({"success": True, "tags": all_tags})
-        else:
-            return jsonify({"success": False, "error": "Failed to add tags"}), 500
+        if all_tags is None:
+            return jsonify({"success": False, "error": "Item not found"}), 404
+        return jsonify({"success": True, "tags": all_tags, "queued": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
 @app.route('/api/tags/batch', methods=['POST'])
 def batch_tag_operation():
-    """Batch add/remove tags for multiple papers"""
+    """Batch add/remove tags for multiple papers
+
+    "queue": true면 태그 큐에 넣고 바로 응답 (북마크 토글 등 빠른 연속 편집용)
+    """
     try:
         data = request.json
         action = data.get('action')  # 'add' or 'remove'
@@ -160,32 +237,65 @@ def batch_tag_operation():
         if not action or not tag or not zotero_keys:
             return jsonify({"error": "Missing required fields"}), 400
 
-        zot = get_zotero_client()
-        results = {"success": 0, "failed": 0}
-
-        for key in zotero_keys:
-            try:
-                item = zot.item(key)
-                existing_tags = [t['tag'] for t in item['data'].get('tags', [])]
-
-                if action == 'add':
-                    if tag not in existing_tags:
-                        existing_tags.append(tag)
-                elif action == 'remove':
-                    existing_tags = [t for t in existing_tags if t != tag]
-
-                item['data']['tags'] = [{'tag': t} for t in existing_tags]
-                zot.update_item(item)
-
-                # Update local papers.json
-                update_papers_json_tags(key, existing_tags)
-
+        if data.get('queue'):
+            with zotero_client() as zot:
+                edit = {'add': [tag]} if action == 'add' else {'remove': [tag]}
+                tags_by_key = enqueue_tag_edit(zot, zotero_keys, **edit)
+            per_key = {key: "queued" if tags is not None else "not_found" for key, tags in tags_by_key.items()}
+            queued = sum(1 for r in per_key.values() if r == "queued")
+            return jsonify({"success": queued, "failed": len(per_key) - queued, "queued": True, "results": per_key})
+
+        with zotero_client() as zot:
+            store = get_mirror(zot)
+            results = {"success": 0, "failed": 0, "unchanged": 0, "results": {}}
+
+            # 현재 버전/태그는 미러에서 (미러에 없는 것만 50개씩 묶어서 GET)
+            items = fetch_items_by_keys(zot, zotero_keys, store=store)
+
+            def apply_action(item):
+                """새 태그 목록 (이미 원하는 상태면 None)"""
+                tags = item['data'].get('tags', [])
+                has_tag = any(t['tag'] == tag for t in tags)
+                if (action == 'add') == has_tag:
+                    return None
+                return tags + [{'tag': tag}] if action == 'add' else [t for t in tags if t['tag'] != tag]
+
+            to_write = []
+            for key in dict.fromkeys(zotero_keys):
+                item = items.get(key)
+                if item is None:
+                    results["results"][key] = "not_found"
+                    results["failed"] += 1
+                    continue
+                new_tags = apply_action(item)
+                if new_tags is None:
+                    results["results"][key] = "unchanged"
+                    results["unchanged"] += 1
+                    results["success"] += 1
+                    continue
+                to_write.append({**item, 'data': {**item['data'], 'tags': new_tags}})
+
+            # 50개씩 배치로 쓰기 (버전 충돌 아이템은 다시 받아 재계산)
+            batch_result = batch_update_items(zot, to_write, compute_tags=apply_action, store=store) \
+                if to_write else {"failed_keys": []}
+            failed_keys = set(batch_result["failed_keys"])
+
+            tags_by_key = {}
+            for item in to_write:
+                key = item['key']
+                if key in failed_keys:
+                    results["results"][key] = "failed"
+                    results["failed"] += 1
+                    continue
+                tags_by_key[key] = [t['tag'] for t in batch_result["tags"][key]]
+                results["results"][key] = "updated"
                 results["success"] += 1
-            except Exception as e:
-                print(f"Error processing {key}: {e}")
-                results["failed"] += 1
 
-        return jsonify(results)
+            # Update local papers.json (한 번만 쓰기)
+            if tags_by_key:
+                update_papers_json_tags_bulk(tags_by_key)
+
+            return jsonify(results)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -197,47 +307,49 @@ def run_cluster_sync_background():
     try:
         update_sync_progress(1, "Loading papers data...")
 
-        # Load papers.json
-        papers_path = Path(__file__).parent / "papers.json"
-        with open(papers_path, 'r', encoding='utf-8') as f:
-            papers_data = json.load(f)
-
-        papers = papers_data.get('papers', [])
-        cluster_labels = papers_data.get('cluster_labels', {})
+        # papers.json (메모리 스냅샷, 읽기만 함)
+        snap = get_papers_store().snapshot()
+        papers = snap.papers
+        cluster_labels = snap.data.get('cluster_labels', {})
 
         update_sync_progress(1, "Fetching Zotero items...")
-        zot = get_zotero_client()
-        all_items = fetch_all_items(
-            zot,
-            include_notes=False,
-            on_progress=lambda cur, tot, msg: update_sync_progress(1, msg, cur, tot)
-        )
-
-        # Build cluster mapping
-        update_sync_progress(2, "Preparing cluster tags...")
-        cluster_mapping = {}
-        for paper in papers:
-            zotero_key = paper.get('zotero_key')
-            cluster_id = paper.get('cluster')
-            if not zotero_key or cluster_id is None:
-                continue
-
-            label = cluster_labels.get(str(cluster_id), f"Cluster {cluster_id}")
-            label = label.replace(",", " &")
-            tag = f"cluster: {label}"
-            cluster_mapping[zotero_key] = tag
-
-        total = len(cluster_mapping)
-        update_sync_progress(2, f"Syncing cluster tags (0/{total})...", 0, total)
+        with zotero_client() as zot:
+            # 태그/버전 계획은 미러에서 (버전이 바뀐 아이템만 받아옴), 쓰기 결과도 미러에 반영
+            store = open_store(zot)
+            all_items = fetch_all_items(
+                zot,
+                include_notes=False,
+                include_pdfs=False,
+                on_progress=lambda cur, tot, msg: update_sync_progress(1, msg, cur, tot),
+                store=store
+            )
 
-        results = batch_replace_cluster_tags(
-            zot, all_items, cluster_mapping,
-            on_progress=lambda cur, tot: update_sync_progress(2, f"Syncing cluster tags ({cur}/{tot})...", cur, tot)
-        )
+            # Build cluster mapping
+            update_sync_progress(2, "Preparing cluster tags...")
+            cluster_mapping = {}
+            for paper in papers:
+                zotero_key = paper.get('zotero_key')
+                cluster_id = paper.get('cluster')
+                if not zotero_key or cluster_id is None:
+                    continue
+
+                label = cluster_labels.get(str(cluster_id), f"Cluster {cluster_id}")
+                label = label.replace(",", " &")
+                tag = f"cluster: {label}"
+                cluster_mapping[zotero_key] = tag
+
+            total = len(cluster_mapping)
+            update_sync_progress(2, f"Syncing cluster tags (0/{total})...", 0, total)
+
+            results = batch_replace_cluster_tags(
+                zot, all_items, cluster_mapping,
+                on_progress=lambda cur, tot: update_sync_progress(2, f"Syncing cluster tags ({cur}/{tot})...", cur, tot),
+                store=store
+            )
 
-        sync_status["last_result"] = {"cluster_sync": {"status": "success", **results}}
-        sync_status["error"] = None
-        update_sync_progress(None, "Complete")
+            sync_status["last_result"] = {"cluster_sync": {"status": "success", **results}}
+            sync_status["error"] = None
+            update_sync_progress(None, "Complete")
 
     except Exception as e:
         print(f"Cluster sync error: {e}")
@@ -283,38 +395,34 @@ def sync_cluster_tags_legacy():
         prefix = data.get('prefix', 'cluster:')
         cluster_labels = data.get('cluster_labels', {})
 
-        # Load papers.json to get cluster mapping
-        papers_path = Path(__file__).parent / "papers.json"
-        with open(papers_path, 'r', encoding='utf-8') as f:
-            papers_data = json.load(f)
+        # papers.json 스냅샷에서 cluster mapping
+        papers = get_papers_store().snapshot().papers
 
-        papers = papers_data.get('papers', papers_data)
+        with zotero_client() as zot:
+            results = {"success": 0, "failed": 0, "skipped": 0}
 
-        zot = get_zotero_client()
-        results = {"success": 0, "failed": 0, "skipped": 0}
+            for paper in papers:
+                zotero_key = paper.get('zotero_key')
+                cluster_id = paper.get('cluster')
 
-        for paper in papers:
-            zotero_key = paper.get('zotero_key')
-            cluster_id = paper.get('cluster')
-
-            if not zotero_key:
-                results["skipped"] += 1
-                continue
+                if not zotero_key:
+                    results["skipped"] += 1
+                    continue
 
-            # Get cluster label
-            label = cluster_labels.get(str(cluster_id), cluster_labels.get(cluster_id, f"Cluster {cluster_id}"))
-            tag = f"{prefix}{label}"
+                # Get cluster label
+                label = cluster_labels.get(str(cluster_id), cluster_labels.get(cluster_id, f"Cluster {cluster_id}"))
+                tag = f"{prefix}{label}"
 
-            try:
-                if add_tags_to_item(zot, zotero_key, [tag]):
-                    results["success"] += 1
-                else:
+                try:
+                    if add_tags_to_item(zot, zotero_key, [tag]):
+                        results["success"] += 1
+                    else:
+                        results["failed"] += 1
+                except Exception as e:
+                    print(f"Error syncing {zotero_key}: {e}")
                     results["failed"] += 1
-            except Exception as e:
-                print(f"Error syncing {zotero_key}: {e}")
-                results["failed"] += 1
 
-        return jsonify(results)
+            return jsonify(results)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -323,33 +431,74 @@ def sync_cluster_tags_legacy():
 def reload_papers():
     """Reload papers from Zotero API and update papers.json"""
     try:
-        zot = get_zotero_client()
-        items = fetch_all_items(zot)
-
-        # This would need the full build_map logic
-        # For now, just return the count
-        return jsonify({
-            "success": True,
-            "message": f"Fetched {len(items)} items. Run build_map.py --source api to regenerate papers.json"
-        })
+        with zotero_client() as zot:
+            items = fetch_all_items(zot, store=open_store(zot))
+
+            # This would need the full build_map logic
+            # For now, just return the count
+            return jsonify({
+                "success": True,
+                "message": f"Fetched {len(items)} items. Run build_map.py --source api to regenerate papers.json"
+            })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-def update_sync_progress(step, detail=None, current=None, total=None):
+def update_sync_progress(step, detail=None, current=None, total=None, stage=None):
     """Update sync progress for frontend polling"""
     global sync_status
     sync_status["current_step"] = step
     sync_status["step_detail"] = detail
     if current is not None and total is not None:
-        sync_status["progress"] = {"current": current, "total": total}
+        sync_status["progress"] = {"current": current, "total": total, "stage": stage}
     else:
         sync_status["progress"] = None
 
 
+BUILD_STAGE_NAMES = {
+    "filter": "Filtering items...",
+    "metadata": "Processing metadata...",
+    "embedding": "Embedding",
+    "combine": "Combining features...",
+    "reduce": "Reducing dimensions...",
+    "cluster": "Clustering...",
+    "labels": "Generating cluster labels...",
+    "centroids": "Calculating centroids...",
+    "records": "Building records...",
+    "citation_links": "Building citation links...",
+    "ann": "Training search index...",
+    "lexical": "Building keyword index...",
+    "neighbors": "Finding similar papers...",
+    "passages": "Saving passage index...",
+    "write": "Saving papers.json...",
+}
+
+
+def on_build_progress(stage, current, total):
+    """Structured progress callback for build_map.run_pipeline"""
+    if stage == "embedding":
+        # Keep step_detail (shown as a log line) coarse; progress is exact
+        if current == 0 or current == total or current % 50 == 0:
+            detail = f"Build: Embedding ({current}/{total})..."
+        else:
+            detail = sync_status["step_detail"]
+    else:
+        detail = f"Build: {BUILD_STAGE_NAMES.get(stage, stage)}"
+    update_sync_progress(2, detail, current, total, stage=stage)
+
+
+def add_review_tag(item):
+    """method-review 태그를 추가한 태그 목록 (이미 있으면 None)"""
+    tags = item['data'].get('tags', [])
+    if any(t['tag'] == 'method-review' for t in tags):
+        return None
+    return tags + [{'tag': 'method-review'}]
+
+
 def run_full_sync_background():
     """Background task for full sync"""
     global sync_status
+    import requests
 
     try:
         results = {
@@ -360,89 +509,43 @@ def run_full_sync_background():
             "reference_cache": {"status": "pending"}
         }
 
-        # Step 1: Run build_map.py --source api (with real-time progress)
-        update_sync_progress(1, "Starting build_map.py...")
-        print("Starting full sync: building papers.json from Zotero API...")
-
-        process = subprocess.Popen(
-            ["python", "-u", "build_map.py", "--source", "api"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            cwd=Path(__file__).parent
-        )
-
-        output_lines = []
-        build_step_map = {
-            "[1/5]": "Loading from Zotero API...",
-            "[2/5]": "Processing metadata...",
-            "[3/5]": "Building embeddings...",
-            "[4/5]": "Reducing dimensions...",
-            "[5/5]": "Clustering..."
-        }
-
-        while True:
-            line = process.stdout.readline()
-            if not line and process.poll() is not None:
-                break
-            if line:
-                line = line.strip()
-                output_lines.append(line)
-                print(f"  build_map: {line}")
-
-                # Parse [X/5] progress pattern
-                for prefix, desc in build_step_map.items():
-                    if prefix in line:
-                        update_sync_progress(1, f"Build: {desc}")
-                        break
+        # Step 1: Fetch all items once (used by both the build and the tag sync)
+        with zotero_client() as zot:
+            update_sync_progress(1, "Fetching Zotero items...")
+            print("Starting full sync: fetching items from Zotero API...")
+            store = open_store(zot)
+            all_items = fetch_all_items(
+                zot,
+                on_progress=lambda cur, tot, msg: update_sync_progress(1, msg, cur, tot, stage="fetch"),
+                store=store
+            )
+        item_by_key = {item['key']: item for item in all_items}
 
-                # Parse embedding progress (Processed X/Y)
-                progress_match = re.search(r'Processed (\d+)/(\d+)', line)
-                if progress_match:
-                    cur, tot = int(progress_match.group(1)), int(progress_match.group(2))
-                    update_sync_progress(1, f"Embedding ({cur}/{tot})...", cur, tot)
-
-        process.wait()
-        if process.returncode != 0:
-            stderr = process.stderr.read()
-            sync_status["error"] = stderr[-500:] if stderr else "Build failed"
-            sync_status["running"] = False
-            return
+        # Step 2: Build papers.json in-process (shares the semantic search model)
+        update_sync_progress(2, "Loading embedding model...")
+        import build_map
 
-        # Parse build output for stats
-        output = "\n".join(output_lines)
-        papers_match = re.search(r'Papers: (\d+)', output)
-        clusters_match = re.search(r'Clusters: (\d+)', output)
-        reviews_match = re.search(r'Auto-tagged reviews: (\d+)', output)
+        papers_path = Path(__file__).parent / "papers.json"
+        build_result = build_map.run_pipeline(
+            items_to_dataframe(all_items),
+            output=str(papers_path),
+            source="api",
+            model=get_semantic_model(),
+            on_progress=on_build_progress
+        )
 
         results["build"] = {
             "status": "success",
-            "papers": int(papers_match.group(1)) if papers_match else 0,
-            "clusters": int(clusters_match.group(1)) if clusters_match else 0,
-            "auto_reviews": int(reviews_match.group(1)) if reviews_match else 0
+            "papers": build_result["papers"],
+            "clusters": build_result["clusters"],
+            "auto_reviews": build_result["auto_reviews"],
+            "cluster_stability": build_result["cluster_stability"]
         }
 
-        # Step 2: Load papers.json for cluster and tag sync
-        update_sync_progress(2, "Loading papers data...")
-        papers_path = Path(__file__).parent / "papers.json"
-        with open(papers_path, 'r', encoding='utf-8') as f:
-            papers_data = json.load(f)
-
+        papers_data = build_result["output_data"]
         papers = papers_data.get('papers', [])
         cluster_labels = papers_data.get('cluster_labels', {})
 
-        zot = get_zotero_client()
-
-        # Fetch all items once for batch operations
-        update_sync_progress(2, "Fetching Zotero items...")
-        print("Fetching Zotero items for batch update...")
-        all_items = fetch_all_items(
-            zot,
-            include_notes=False,
-            on_progress=lambda cur, tot, msg: update_sync_progress(2, msg, cur, tot)
-        )
-        item_by_key = {item['key']: item for item in all_items}
-
         # Step 3: Sync cluster tags (batch)
         update_sync_progress(3, "Preparing cluster tags...")
         print("Syncing cluster tags to Zotero (batch)...")
@@ -455,17 +558,20 @@ def run_full_sync_background():
             if not zotero_key or cluster_id is None:
                 continue
 
-            label = cluster_labels.get(str(cluster_id), f"Cluster {cluster_id}")
+            # In-memory build output has int keys (str keys once round-tripped through JSON)
+            label = cluster_labels.get(cluster_id, cluster_labels.get(str(cluster_id), f"Cluster {cluster_id}"))
             label = label.replace(",", " &")
             tag = f"cluster: {label}"
             cluster_mapping[zotero_key] = tag
 
         total_items = len(cluster_mapping)
         update_sync_progress(3, f"Syncing cluster tags (0/{total_items})...", 0, total_items)
-        cluster_results = batch_replace_cluster_tags(
-            zot, all_items, cluster_mapping,
-            on_progress=lambda cur, tot: update_sync_progress(3, f"Syncing cluster tags ({cur}/{tot})...", cur, tot)
-        )
+        with zotero_client() as zot:
+            cluster_results = batch_replace_cluster_tags(
+                zot, all_items, cluster_mapping,
+                on_progress=lambda cur, tot: update_sync_progress(3, f"Syncing cluster tags ({cur}/{tot})...", cur, tot),
+                store=store
+            )
         results["cluster_sync"] = {"status": "success", **cluster_results}
 
         # Step 4: Sync method-review tags (batch)
@@ -482,23 +588,26 @@ def run_full_sync_background():
                 review_results["skipped"] += 1
                 continue
 
-            item = item_by_key.get(zotero_key)
+            # Step 3에서 쓴 아이템도 미러에는 새 버전/태그가 반영되어 있음
+            item = store.get_item(zotero_key) if zotero_key in item_by_key else None
             if not item:
                 review_results["skipped"] += 1
                 continue
 
-            existing_tags = [t['tag'] for t in item['data'].get('tags', [])]
-            if 'method-review' not in existing_tags:
-                item['data']['tags'].append({'tag': 'method-review'})
-                items_to_update.append(item)
+            tags = add_review_tag(item)
+            if tags is not None:
+                items_to_update.append({**item, 'data': {**item['data'], 'tags': tags}})
 
         if items_to_update:
             total_reviews = len(items_to_update)
             update_sync_progress(4, f"Syncing review tags (0/{total_reviews})...", 0, total_reviews)
-            batch_result = batch_update_items(
-                zot, items_to_update,
-                on_progress=lambda cur, tot: update_sync_progress(4, f"Syncing review tags ({cur}/{tot})...", cur, tot)
-            )
+            with zotero_client() as zot:
+                batch_result = batch_update_items(
+                    zot, items_to_update,
+                    on_progress=lambda cur, tot: update_sync_progress(4, f"Syncing review tags ({cur}/{tot})...", cur, tot),
+                    compute_tags=add_review_tag,
+                    store=store
+                )
             review_results["success"] = batch_result["success"]
             review_results["failed"] = batch_result["failed"]
 
@@ -665,8 +774,7 @@ def run_full_sync_background():
 
         # Save updated papers.json
         update_sync_progress(7, "Saving papers.json...")
-        with open(papers_path, 'w', encoding='utf-8') as f:
-            json.dump(papers_data, f, ensure_ascii=False, indent=2)
+        get_papers_store(papers_path).write(papers_data)
         print("Saved updated papers.json with citation_links and reference_cache")
 
         print("Full sync completed!")
@@ -711,22 +819,23 @@ def full_sync():
 
 @app.route('/api/sync-status', methods=['GET'])
 def get_sync_status():
-    """Get current sync status"""
-    return jsonify(sync_status)
+    """Get current sync status (+ 태그 쓰기 큐 상태)"""
+    return jsonify({**sync_status, "tag_queue": tag_queue.status() if tag_queue else None})
 
 
 def run_citations_sync_background():
     """Background task for citations-only sync (fetches ALL papers, ignoring existing)"""
     global sync_status
+    import requests
 
     try:
         results = {"citation_fetch": {"status": "pending"}, "citation_links": {"status": "pending"}}
 
         # Step 1: Load papers.json
         update_sync_progress(1, "Loading papers data...")
-        papers_path = Path(__file__).parent / "papers.json"
-        with open(papers_path, 'r', encoding='utf-8') as f:
-            papers_data = json.load(f)
+        # 스냅샷은 공유되므로 수정용 사본에 citation 데이터를 채움
+        papers_store = get_papers_store()
+        papers_data = papers_store.copy()
 
         papers = papers_data.get('papers', [])
 
@@ -927,8 +1036,7 @@ def run_citations_sync_background():
 
         # Save updated papers.json
         update_sync_progress(4, "Saving papers.json...")
-        with open(papers_path, 'w', encoding='utf-8') as f:
-            json.dump(papers_data, f, ensure_ascii=False, indent=2)
+        papers_store.write(papers_data)
         print("Saved updated papers.json")
 
         print("Citations sync completed!")
@@ -976,16 +1084,169 @@ def citations_sync():
 # Semantic Search
 # ============================================================
 
-# Lazy-loaded model for semantic search
+SEMANTIC_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+
+# 서버 시작 시 쿼리 인코더 로드 방식
+#   background: 시작하자마자 백그라운드 스레드에서 로드 + 워밍업 (준비되면 /api/health/ready = 200)
+#   blocking: 로드 + 워밍업이 끝난 뒤에 요청을 받음
+#   lazy: 첫 시맨틱 검색 요청에서 로드
+SEMANTIC_MODEL_PRELOAD = os.environ.get("SEMANTIC_MODEL_PRELOAD", "background").lower()
+# 워밍업 쿼리 (한국어/영어 토크나이저 경로, 배치 크기 1과 여러 개)
+SEMANTIC_WARMUP_QUERIES = ["haptic feedback in virtual reality", "가상현실 촉각 피드백"]
+
 _semantic_model = None
+_semantic_model_lock = threading.Lock()
+semantic_model_status = {
+    "status": "not_loaded",  # not_loaded | loading | ready | error
+    "mode": SEMANTIC_MODEL_PRELOAD,
+    "error": None,
+    "load_ms": None,
+    "warmup_ms": None,
+}
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
 
 def get_semantic_model():
-    """Lazy load sentence transformer model"""
+    """Sentence transformer for query encoding (loaded and warmed once; concurrent callers wait for the same load)"""
     global _semantic_model
-    if _semantic_model is None:
-        from sentence_transformers import SentenceTransformer
-        _semantic_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-    return _semantic_model
+    if _semantic_model is not None:
+        return _semantic_model
+    with _semantic_model_lock:
+        if _semantic_model is None:
+            semantic_model_status.update(status="loading", error=None)
+            try:
+                start = time.perf_counter()
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(SEMANTIC_MODEL_NAME)
+                semantic_model_status["load_ms"] = round((time.perf_counter() - start) * 1000)
+
+                # 첫 encode는 토크나이저/스레드 풀 초기화로 느림 → 요청 전에 한 번씩 돌려둠
+                start = time.perf_counter()
+                model.encode(SEMANTIC_WARMUP_QUERIES[:1])
+                model.encode(SEMANTIC_WARMUP_QUERIES)
+                semantic_model_status["warmup_ms"] = round((time.perf_counter() - start) * 1000)
+            except Exception as e:
+                semantic_model_status.update(status="error", error=str(e))
+                raise
+            _semantic_model = model
+            semantic_model_status["status"] = "ready"
+        return _semantic_model
+
+
+def preload_semantic_model():
+    """SEMANTIC_MODEL_PRELOAD에 따라 서버 시작 시 인코더 로드"""
+    if SEMANTIC_MODEL_PRELOAD == "lazy":
+        return
+
+    def load():
+        try:
+            get_semantic_model()
+            print(f"Semantic model ready (load {semantic_model_status['load_ms']} ms, "
+                  f"warmup {semantic_model_status['warmup_ms']} ms)")
+        except Exception as e:
+            print(f"Semantic model failed to load: {e}")
+
+    if SEMANTIC_MODEL_PRELOAD == "blocking":
+        load()
+    else:
+        threading.Thread(target=load, name="semantic-model-preload", daemon=True).start()
+
+
+def get_query_cache():
+    """쿼리 임베딩 캐시 (같은 쿼리는 모델을 다시 돌리지 않음)"""
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            from semantic_index import QueryEmbeddingCache
+            _query_cache = QueryEmbeddingCache(lambda texts: get_semantic_model().encode(texts), SEMANTIC_MODEL_NAME)
+        return _query_cache
+
+
+def rank_by_similarity(papers: list, query_emb, top_k: int = 20) -> list:
+    """Rank papers by cosine similarity to a query embedding
+    (요청마다 행렬을 새로 만드는 기준 구현 - 서버는 semantic_index 사용, benchmark.py search 비교용)
+
+    Returns: [(paper, similarity)] sorted by similarity (descending)
+    """
+    import numpy as np
+
+    # Filter papers with embeddings
+    papers_with_emb = [p for p in papers if p.get('embedding')]
+    if not papers_with_emb:
+        return []
+
+    # Get embeddings matrix
+    embeddings = np.array([p['embedding'] for p in papers_with_emb])
+
+    # Cosine similarity
+    query_norm = query_emb / np.linalg.norm(query_emb)
+    emb_norms = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    similarities = np.dot(emb_norms, query_norm)
+
+    # Get top K
+    top_indices = np.argsort(similarities)[::-1][:top_k]
+    return [(papers_with_emb[idx], float(similarities[idx])) for idx in top_indices]
+
+
+def get_semantic_index(snapshot=None):
+    """현재 papers.json 스냅샷의 검색 인덱스 (build_map이 만든 ANN 중심점이 있으면 같이 로드)"""
+    from semantic_index import ann_path, index_for
+
+    papers_store = get_papers_store()
+    return index_for(snapshot or papers_store.snapshot(), ann_file=ann_path(papers_store.path))
+
+
+def parse_semantic_filters(source) -> dict:
+    """시맨틱 검색 필터 (query params 또는 JSON body의 filters)
+
+    year_min, year_max, clusters, tags (쉼표 구분 또는 목록), min_venue_quality, is_paper, has_notes
+    Raises ValueError for malformed values
+    """
+    def as_list(value):
+        if value is None or value == "":
+            return []
+        if isinstance(value, str):
+            return [v.strip() for v in value.split(",") if v.strip()]
+        return list(value)
+
+    def as_bool(value):
+        if value is None or value == "":
+            return None
+        if isinstance(value, bool):
+            return value
+        if str(value).lower() in ("1", "true", "yes"):
+            return True
+        if str(value).lower() in ("0", "false", "no"):
+            return False
+        raise ValueError(f"Invalid boolean: {value}")
+
+    def as_number(value, cast):
+        return None if value is None or value == "" else cast(value)
+
+    filters = {
+        "year_min": as_number(source.get("year_min"), int),
+        "year_max": as_number(source.get("year_max"), int),
+        "clusters": [int(c) for c in as_list(source.get("clusters"))],
+        "tags": [str(t) for t in as_list(source.get("tags"))],
+        "min_venue_quality": as_number(source.get("min_venue_quality"), float),
+        "is_paper": as_bool(source.get("is_paper")),
+        "has_notes": as_bool(source.get("has_notes")),
+    }
+    return {k: v for k, v in filters.items() if v not in (None, [])}
+
+
+def semantic_result(paper: dict, similarity: float) -> dict:
+    """시맨틱 검색 결과 한 건 (papers.json 필드 일부 + 유사도)"""
+    return {
+        "id": paper["id"],
+        "title": paper.get("title", ""),
+        "authors": paper.get("authors", ""),
+        "year": paper.get("year"),
+        "cluster": paper.get("cluster"),
+        "cluster_label": paper.get("cluster_label", ""),
+        "similarity": similarity
+    }
 
 
 @app.route('/api/semantic-search', methods=['GET'])
@@ -995,59 +1256,315 @@ def semantic_search():
     Query params:
         q: search query (required)
         top_k: number of results (default 20)
+        nprobe: ANN lists to scan when an ANN index is loaded
+                (default SEMANTIC_ANN_NPROBE, higher = better recall / slower, 0 = exact)
+        filters (applied before top-k selection):
+            year_min, year_max: year range (papers without a year pass)
+            clusters: comma-separated cluster IDs
+            tags: comma-separated tags, all required (case-insensitive)
+            min_venue_quality: minimum venue_quality
+            is_paper, has_notes: true/false
     """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Query parameter 'q' is required"}), 400
+
+    top_k = int(request.args.get('top_k', 20))
+    nprobe = request.args.get('nprobe', type=int)
+    try:
+        filters = parse_semantic_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter: {e}"}), 400
+
+    try:
+        # papers.json 스냅샷 + 스냅샷당 한 번 만드는 정규화 임베딩 행렬
+        index = get_semantic_index()
+        if not len(index):
+            return jsonify({"error": "No embeddings found. Run build_map.py first."}), 500
+
+        # 필터는 미리 만든 컬럼 배열로 mask를 만들어 top-k 선택 전에 적용
+        mask = index.filter_mask(filters)
+
+        # Encode query (cached / coalesced)
+        query_emb = get_query_cache().get(query)
+
+        results = [semantic_result(paper, similarity)
+                   for paper, similarity in index.search(query_emb, top_k, nprobe=nprobe, mask=mask)]
+
+        return jsonify({
+            "query": query,
+            "mode": index.mode(nprobe, mask),
+            "candidates": len(index) if mask is None else int(mask.sum()),
+            "results": results
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# 한 요청에 보낼 수 있는 쿼리 수 (쿼리 × 논문 점수 행렬 크기 제한)
+SEMANTIC_BATCH_MAX_QUERIES = 256
+
+
+@app.route('/api/semantic-search/batch', methods=['POST'])
+def semantic_search_batch():
+    """Search many queries at once (one batched encode + one matrix product)
+
+    Read-only: POST only for the request body, so no API key is required (READ_ONLY_POST_ENDPOINTS).
+
+    Body:
+        queries: list of search queries (required)
+        top_k: results per query (default 20)
+        filters: same keys as GET /api/semantic-search (lists or comma-separated strings)
+        format: "json" (default) - top_k results per query
+                "binary" - float16 scores, row-major (query x paper id), NaN = no embedding or filtered out;
+                           shape in X-Scores-Shape
+    """
+    data = request.json or {}
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+        return jsonify({"error": "'queries' must be a non-empty list of non-empty strings"}), 400
+    if len(queries) > SEMANTIC_BATCH_MAX_QUERIES:
+        return jsonify({"error": f"At most {SEMANTIC_BATCH_MAX_QUERIES} queries per request"}), 400
+
+    top_k = int(data.get('top_k', 20))
+    fmt = data.get('format', 'json')
+    if fmt not in ('json', 'binary'):
+        return jsonify({"error": "format must be 'json' or 'binary'"}), 400
+    try:
+        filters = parse_semantic_filters(data.get('filters') or {})
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid filter: {e}"}), 400
+
+    try:
+        index = get_semantic_index()
+        if not len(index):
+            return jsonify({"error": "No embeddings found. Run build_map.py first."}), 500
+
+        mask = index.filter_mask(filters)
+
+        # 캐시에 없는 쿼리만 모델 호출 한 번으로 인코딩
+        query_embs = get_query_cache().get_many(queries)
+
+        if fmt == 'binary':
+            scores = index.scores_by_id(query_embs, mask=mask)
+            return app.response_class(
+                scores.astype('<f2').tobytes(),
+                mimetype='application/octet-stream',
+                headers={"X-Scores-Shape": f"{scores.shape[0]},{scores.shape[1]}", "X-Scores-Dtype": "float16"},
+            )
+
+        results = [
+            {"query": query, "results": [semantic_result(paper, similarity) for paper, similarity in ranked]}
+            for query, ranked in zip(queries, index.search_many(query_embs, top_k, mask=mask))
+        ]
+        return jsonify({"mode": "exact", "results": results})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/papers/<int:paper_id>/similar', methods=['GET'])
+def similar_papers(paper_id):
+    """Papers most similar to one paper ("more like this")
+
+    Query params:
+        top_k: number of results (default 10)
+
+    Served from the neighbours build_map precomputed (<output>.neighbors.npz, embedding cosine
+    blended with co-citation). Papers added after the build, or top_k above the stored count,
+    fall back to an exact embedding search.
+    """
+    from paper_neighbors import neighbors_for, neighbors_path
+
+    top_k = int(request.args.get('top_k', 10))
+    try:
+        papers_store = get_papers_store()
+        snapshot = papers_store.snapshot()
+        paper = snapshot.get(paper_id)
+        if paper is None:
+            return jsonify({"error": "Paper not found"}), 404
+
+        table = neighbors_for(snapshot, neighbors_path(papers_store.path))
+        ranked = table.lookup(snapshot, paper_id, top_k) if table is not None else None
+        source = "precomputed"
+        if ranked is None:
+            if not paper.get('embedding'):
+                return jsonify({"error": "Paper has no embedding. Run build_map.py first."}), 404
+            # exact: 이 논문 임베딩으로 검색 (자기 자신 제외)
+            index = get_semantic_index(snapshot)
+            ranked = [(p, s) for p, s in index.search(paper['embedding'], top_k + 1, nprobe=0)
+                      if p['id'] != paper_id][:top_k]
+            source = "exact"
+
+        return jsonify({
+            "id": paper_id,
+            "source": source,
+            "results": [semantic_result(p, similarity) for p, similarity in ranked]
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def allowed_paper_ids(snapshot, filters):
+    """필터 → paper id로 인덱싱하는 bool 배열 (BM25 / passage 색인용, 필터 없으면 None)
+
+    SemanticIndex.filter_mask()는 임베딩 있는 논문 행만 다루므로 스냅샷 전체 논문으로 따로 계산
+    """
+    if not filters:
+        return None
     import numpy as np
+    from semantic_index import columns_for
+
+    mask = columns_for(snapshot).mask(filters)
+    kept = [p.get("id", -1) for p, keep in zip(snapshot.papers, mask) if keep]
+    kept = [pid for pid in kept if pid >= 0]
+    allowed_ids = np.zeros(max(kept, default=-1) + 1, dtype=bool)
+    allowed_ids[kept] = True
+    return allowed_ids
+
+
+@app.route('/api/passage-search', methods=['GET'])
+def passage_search():
+    """Search abstract / note passages; one result per paper, ranked by its best-matching chunk
+
+    Query params:
+        q: search query (required)
+        top_k: number of papers (default 20)
+        filters: same as GET /api/semantic-search
+
+    Needs the passage index build_map writes with --embedding weighted (<output>.passages.npz).
+    """
+    from passage_index import passages_for, passages_path
 
     query = request.args.get('q', '').strip()
     if not query:
         return jsonify({"error": "Query parameter 'q' is required"}), 400
 
     top_k = int(request.args.get('top_k', 20))
+    try:
+        filters = parse_semantic_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter: {e}"}), 400
 
     try:
-        # Load papers with embeddings
-        papers_path = Path(__file__).parent / "papers.json"
-        with open(papers_path, 'r', encoding='utf-8') as f:
-            papers_data = json.load(f)
+        papers_store = get_papers_store()
+        snapshot = papers_store.snapshot()
+        passages = passages_for(snapshot, passages_path(papers_store.path))
+        if passages is None:
+            return jsonify({"error": "No passage index found. Run build_map.py --embedding weighted first."}), 500
 
-        papers = papers_data.get('papers', [])
+        allowed_ids = allowed_paper_ids(snapshot, filters)
+        query_emb = get_query_cache().get(query)
+
+        results = []
+        # 빌드 후 삭제되거나 id가 바뀐 논문은 건너뛰므로 조금 더 가져옴
+        for hit in passages.search(query_emb, top_k + 10, allowed_ids=allowed_ids):
+            paper = snapshot.get(hit["id"])
+            if paper is None or paper.get("zotero_key", "") != hit["key"]:
+                continue
+            results.append({
+                **semantic_result(paper, hit["score"]),
+                "section": hit["section"],
+                "chunk": hit["chunk"],
+                "snippet": hit["snippet"],
+            })
+            if len(results) == top_k:
+                break
+
+        return jsonify({"query": query, "chunks": len(passages), "results": results})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        # Filter papers with embeddings
-        papers_with_emb = [(i, p) for i, p in enumerate(papers) if p.get('embedding')]
-        if not papers_with_emb:
-            return jsonify({"error": "No embeddings found. Run build_map.py first."}), 500
 
-        # Get embeddings matrix
-        embeddings = np.array([p['embedding'] for _, p in papers_with_emb])
+def get_lexical_index(snapshot=None):
+    """현재 papers.json 스냅샷의 BM25 색인 (build_map이 만든 papers.bm25.npz, 없으면 papers.json으로 생성)"""
+    from lexical_index import lexical_index_for, lexical_path
 
-        # Encode query
-        model = get_semantic_model()
-        query_emb = model.encode([query])[0]
+    papers_store = get_papers_store()
+    return lexical_index_for(snapshot or papers_store.snapshot(), path=lexical_path(papers_store.path))
 
-        # Cosine similarity
-        query_norm = query_emb / np.linalg.norm(query_emb)
-        emb_norms = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
-        similarities = np.dot(emb_norms, query_norm)
 
-        # Get top K
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+@app.route('/api/hybrid-search', methods=['GET'])
+def hybrid_search():
+    """Keyword (BM25) + semantic search merged with reciprocal rank fusion
+
+    Query params:
+        q: search query (required)
+        top_k: number of results (default 20)
+        candidates: results taken from each ranking before fusion (default 100)
+        k: RRF constant (default 60, higher = flatter rank weights)
+        nprobe, filters: same as GET /api/semantic-search (filters apply to both rankings)
+    """
+    from lexical_index import RRF_K, reciprocal_rank_fusion
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Query parameter 'q' is required"}), 400
+
+    top_k = int(request.args.get('top_k', 20))
+    candidates = max(int(request.args.get('candidates', 100)), top_k)
+    rrf_k = int(request.args.get('k', RRF_K))
+    nprobe = request.args.get('nprobe', type=int)
+    try:
+        filters = parse_semantic_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter: {e}"}), 400
 
+    try:
+        timings = {}
+        start = time.perf_counter()
+
+        def lap(name):
+            nonlocal start
+            now = time.perf_counter()
+            timings[name] = round((now - start) * 1000, 2)
+            start = now
+
+        snapshot = get_papers_store().snapshot()
+        # 두 색인 모두 같은 스냅샷에서 (중간에 papers.json이 바뀌어도 id가 어긋나지 않게)
+        index = get_semantic_index(snapshot)
+        lexical = get_lexical_index(snapshot)
+        mask = index.filter_mask(filters)  # 벡터 쪽: 임베딩 행 기준
+        allowed_ids = allowed_paper_ids(snapshot, filters)  # BM25 쪽: 임베딩 없는 논문 포함
+        lap("prepare")
+
+        vector_hits = []
+        if len(index):
+            query_emb = get_query_cache().get(query)
+            lap("encode")
+            vector_hits = index.search(query_emb, candidates, nprobe=nprobe, mask=mask)
+            lap("vector")
+
+        lexical_hits = lexical.search(query, candidates, allowed_ids=allowed_ids)
+        lap("lexical")
+
+        fused = reciprocal_rank_fusion(
+            [[p["id"] for p, _ in vector_hits], [pid for pid, _ in lexical_hits]], k=rrf_k
+        )[:top_k]
+        vector_rank = {p["id"]: (rank, sim) for rank, (p, sim) in enumerate(vector_hits, start=1)}
+        lexical_rank = {pid: (rank, score) for rank, (pid, score) in enumerate(lexical_hits, start=1)}
         results = []
-        for idx in top_indices:
-            orig_idx, paper = papers_with_emb[idx]
+        for pid, rrf_score in fused:
+            v_rank, similarity = vector_rank.get(pid, (None, None))
+            l_rank, bm25 = lexical_rank.get(pid, (None, None))
             results.append({
-                "id": paper["id"],
-                "title": paper.get("title", ""),
-                "authors": paper.get("authors", ""),
-                "year": paper.get("year"),
-                "cluster": paper.get("cluster"),
-                "cluster_label": paper.get("cluster_label", ""),
-                "similarity": float(similarities[idx])
+                **semantic_result(snapshot.get(pid), similarity),
+                "bm25": bm25,
+                "vector_rank": v_rank,
+                "lexical_rank": l_rank,
+                "rrf_score": rrf_score,
             })
+        lap("fuse")
+        timings["total"] = round(sum(timings.values()), 2)
 
         return jsonify({
             "query": query,
-            "results": results
+            "mode": index.mode(nprobe, mask) if len(index) else "lexical",
+            "results": results,
+            "timings_ms": timings,
         })
 
     except Exception as e:
@@ -1062,9 +1579,9 @@ def semantic_search():
 def get_ideas():
     """Get all ideas from Zotero Ideas collection"""
     try:
-        zot = get_zotero_client()
-        ideas = fetch_ideas(zot)
-        return jsonify({"success": True, "ideas": ideas})
+        with zotero_client() as zot:
+            ideas = fetch_ideas(zot, store=get_mirror(zot))
+            return jsonify({"success": True, "ideas": ideas})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -1077,13 +1594,13 @@ def create_new_idea():
         if not data.get('title'):
             return jsonify({"success": False, "error": "Title is required"}), 400
 
-        zot = get_zotero_client()
-        idea = create_idea(zot, data)
+        with zotero_client() as zot:
+            idea = create_idea(zot, data, store=get_mirror(zot))
 
-        if idea:
-            return jsonify({"success": True, "idea": idea})
-        else:
-            return jsonify({"success": False, "error": "Failed to create idea"}), 500
+            if idea:
+                return jsonify({"success": True, "idea": idea})
+            else:
+                return jsonify({"success": False, "error": "Failed to create idea"}), 500
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -1094,24 +1611,24 @@ def update_existing_idea(zotero_key):
     try:
         data = request.json
 
-        zot = get_zotero_client()
+        with zotero_client() as zot:
+            store = get_mirror(zot)
 
-        # Fetch existing idea first to preserve fields not being updated
-        ideas = fetch_ideas(zot)
-        existing_idea = next((i for i in ideas if i.get('zotero_key') == zotero_key), None)
-        if not existing_idea:
-            return jsonify({"success": False, "error": "Idea not found"}), 404
+            # Fetch existing idea first to preserve fields not being updated (미러에서 이 아이디어만)
+            existing_idea = get_idea(zot, zotero_key, store=store)
+            if not existing_idea:
+                return jsonify({"success": False, "error": "Idea not found"}), 404
 
-        # Merge updates into existing idea
-        for key, value in data.items():
-            existing_idea[key] = value
+            # Merge updates into existing idea
+            for key, value in data.items():
+                existing_idea[key] = value
 
-        success = update_idea(zot, existing_idea)
+            success = update_idea(zot, existing_idea, store=store)
 
-        if success:
-            return jsonify({"success": True})
-        else:
-            return jsonify({"success": False, "error": "Failed to update idea"}), 500
+            if success:
+                return jsonify({"success": True})
+            else:
+                return jsonify({"success": False, "error": "Failed to update idea"}), 500
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -1120,13 +1637,13 @@ def update_existing_idea(zotero_key):
 def delete_existing_idea(zotero_key):
     """Delete an idea"""
     try:
-        zot = get_zotero_client()
-        success = delete_idea(zot, zotero_key)
+        with zotero_client() as zot:
+            success = delete_idea(zot, zotero_key, store=get_mirror(zot))
 
-        if success:
-            return jsonify({"success": True})
-        else:
-            return jsonify({"success": False, "error": "Failed to delete idea"}), 500
+            if success:
+                return jsonify({"success": True})
+            else:
+                return jsonify({"success": False, "error": "Failed to delete idea"}), 500
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -1140,26 +1657,26 @@ def add_paper_to_idea(zotero_key):
         if not paper_key:
             return jsonify({"success": False, "error": "paper_key is required"}), 400
 
-        zot = get_zotero_client()
-
-        # Fetch current idea
-        ideas = fetch_ideas(zot)
-        idea = next((i for i in ideas if i.get('zotero_key') == zotero_key), None)
-        if not idea:
-            return jsonify({"success": False, "error": "Idea not found"}), 404
-
-        # Add paper if not already connected
-        connected = idea.get('connected_papers', [])
-        if paper_key not in connected:
-            connected.append(paper_key)
-            idea['connected_papers'] = connected
-            success = update_idea(zot, idea)
-            if success:
-                return jsonify({"success": True, "connected_papers": connected})
+        with zotero_client() as zot:
+            store = get_mirror(zot)
+
+            # Fetch current idea (미러에서 이 아이디어만)
+            idea = get_idea(zot, zotero_key, store=store)
+            if not idea:
+                return jsonify({"success": False, "error": "Idea not found"}), 404
+
+            # Add paper if not already connected
+            connected = idea.get('connected_papers', [])
+            if paper_key not in connected:
+                connected.append(paper_key)
+                idea['connected_papers'] = connected
+                success = update_idea(zot, idea, store=store)
+                if success:
+                    return jsonify({"success": True, "connected_papers": connected})
+                else:
+                    return jsonify({"success": False, "error": "Failed to update"}), 500
             else:
-                return jsonify({"success": False, "error": "Failed to update"}), 500
-        else:
-            return jsonify({"success": True, "connected_papers": connected, "message": "Already connected"})
+                return jsonify({"success": True, "connected_papers": connected, "message": "Already connected"})
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -1169,26 +1686,26 @@ def add_paper_to_idea(zotero_key):
 def remove_paper_from_idea(zotero_key, paper_key):
     """Remove a paper from an idea's connected papers"""
     try:
-        zot = get_zotero_client()
-
-        # Fetch current idea
-        ideas = fetch_ideas(zot)
-        idea = next((i for i in ideas if i.get('zotero_key') == zotero_key), None)
-        if not idea:
-            return jsonify({"success": False, "error": "Idea not found"}), 404
-
-        # Remove paper
-        connected = idea.get('connected_papers', [])
-        if paper_key in connected:
-            connected.remove(paper_key)
-            idea['connected_papers'] = connected
-            success = update_idea(zot, idea)
-            if success:
-                return jsonify({"success": True, "connected_papers": connected})
+        with zotero_client() as zot:
+            store = get_mirror(zot)
+
+            # Fetch current idea (미러에서 이 아이디어만)
+            idea = get_idea(zot, zotero_key, store=store)
+            if not idea:
+                return jsonify({"success": False, "error": "Idea not found"}), 404
+
+            # Remove paper
+            connected = idea.get('connected_papers', [])
+            if paper_key in connected:
+                connected.remove(paper_key)
+                idea['connected_papers'] = connected
+                success = update_idea(zot, idea, store=store)
+                if success:
+                    return jsonify({"success": True, "connected_papers": connected})
+                else:
+                    return jsonify({"success": False, "error": "Failed to update"}), 500
             else:
-                return jsonify({"success": False, "error": "Failed to update"}), 500
-        else:
-            return jsonify({"success": True, "connected_papers": connected, "message": "Not connected"})
+                return jsonify({"success": True, "connected_papers": connected, "message": "Not connected"})
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -1201,6 +1718,8 @@ def remove_paper_from_idea(zotero_key, paper_key):
 @app.route('/api/external-search', methods=['GET'])
 def external_search():
     """Search for papers on Semantic Scholar"""
+    import requests
+
     query = request.args.get('q', '').strip()
     if not query:
         return jsonify({"error": "Query parameter 'q' is required"}), 400
@@ -1209,20 +1728,9 @@ def external_search():
     limit = min(max(limit, 1), 100)  # Clamp to 1-100
 
     try:
-        # Load papers.json to get existing paper IDs
-        papers_path = Path(__file__).parent / "papers.json"
-        my_s2_ids = set()
-        my_dois = set()
-
-        if papers_path.exists():
-            with open(papers_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                papers = data.get('papers', data) if isinstance(data, dict) else data
-                for p in papers:
-                    if p.get('s2_id'):
-                        my_s2_ids.add(p['s2_id'])
-                    if p.get('doi'):
-                        my_dois.add(p['doi'].lower())
+        # 라이브러리 논문 (s2_id / doi 인덱스)
+        papers_store = get_papers_store()
+        snap = papers_store.snapshot() if papers_store.exists() else None
 
         # Call Semantic Scholar Search API
         S2_API_KEY = os.environ.get("S2_API_KEY")
@@ -1251,7 +1759,7 @@ def external_search():
             paper_id = r.get('paperId', '')
             doi = (r.get('externalIds') or {}).get('DOI', '').lower()
 
-            r['in_library'] = (paper_id in my_s2_ids) or (doi and doi in my_dois)
+            r['in_library'] = bool(snap and (snap.find_s2(paper_id) or snap.find_doi(doi)))
 
         return jsonify({
             "success": True,
@@ -1272,26 +1780,26 @@ def external_search():
 
 def update_papers_json_tags(zotero_key: str, tags: list):
     """Update tags in papers.json for a specific paper"""
-    papers_path = Path(__file__).parent / "papers.json"
+    update_papers_json_tags_bulk({zotero_key: tags})
 
-    try:
-        with open(papers_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
 
-        papers = data.get('papers', data)
+def update_papers_json_tags_bulk(tags_by_key: dict):
+    """Update tags in papers.json for many papers (zotero_key -> tags) with a single write"""
+    papers_store = get_papers_store()
 
+    def apply_tags(data):
+        papers = data.get('papers', []) if isinstance(data, dict) else data
         for paper in papers:
-            if paper.get('zotero_key') == zotero_key:
+            tags = tags_by_key.get(paper.get('zotero_key'))
+            if tags is not None:
                 paper['tags'] = ', '.join(tags)
-                break
-
-        if 'papers' in data:
-            data['papers'] = papers
-        else:
-            data = papers
 
-        with open(papers_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+    try:
+        # papers.json에 없는 아이템뿐이면 쓰지 않음
+        snap = papers_store.snapshot()
+        if not any(key in snap.by_zotero_key for key in tags_by_key):
+            return
+        papers_store.update(apply_tags)
 
     except Exception as e:
         print(f"Error updating papers.json: {e}")
@@ -1308,4 +1816,16 @@ if __name__ == '__main__':
     print(f"Starting API server on port {port}")
     print(f"API Key configured: {'Yes' if API_KEY else 'No'}")
 
+    # 이전 실행에서 밀린 태그 편집 이어서 쓰기
+    try:
+        pending = get_tag_queue().status()["depth"]
+        if pending:
+            print(f"Resuming {pending} queued tag edits")
+    except ValueError as e:
+        print(f"Tag queue disabled: {e}")
+
+    # 첫 시맨틱 검색이 모델 로드를 기다리지 않도록 (debug reloader의 감시 프로세스에서는 로드 안 함)
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        preload_semantic_model()
+
     app.run(host='0.0.0.0', port=port, debug=debug)
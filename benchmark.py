@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+"""
+Zotero Explorer - Benchmarks
+- imports: 모듈 import 시간 측정 (python -X importtime) + 예산 체크
+- generate: item_to_row 형식의 합성 라이브러리 생성 (CSV)
+- scale: 합성 라이브러리로 build_map stage / 시맨틱 검색 / citation link 처리량 측정
+- search: 시맨틱 검색 p50/p99 - rank_by_similarity(기준) vs semantic_index.SemanticIndex
+- ann: IVF ANN 인덱스의 nprobe별 recall@k (exact 검색 대비) / 지연시간
+"""
+
+import os
+import re
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import subprocess
+import multiprocessing
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).parent
+
+# ============================================================
+# Import-time benchmark
+# ============================================================
+
+# 모듈별 import 예산 (ms, cumulative). CLI 시작과 서버 cold start가 이 안에 들어와야 함
+IMPORT_BUDGETS_MS = {
+    "build_map": 350,
+    "api_server": 600,
+    "zotero_api": 50,
+}
+
+# 이 모듈들은 import 시점에 로드되면 안 됨 (필요한 코드 경로에서만 lazy import)
+HEAVY_MODULES = ["pandas", "sklearn", "umap", "bs4", "pyzotero", "sentence_transformers", "torch"]
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def parse_importtime(stderr: str) -> list[dict]:
+    """-X importtime 출력 파싱 → [{module, self_us, cumulative_us, depth}]"""
+    entries = []
+    for line in stderr.splitlines():
+        m = IMPORTTIME_RE.match(line)
+        if not m:
+            continue
+        entries.append({
+            "module": m.group(4),
+            "self_us": int(m.group(1)),
+            "cumulative_us": int(m.group(2)),
+            "depth": (len(m.group(3)) - 1) // 2,
+        })
+    return entries
+
+
+def measure_import(module: str) -> dict:
+    """새 인터프리터에서 module을 import하고 importtime 리포트 반환"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-500:]}")
+
+    entries = parse_importtime(proc.stderr)
+    top_idx = next((i for i, e in enumerate(entries) if e["module"] == module and e["depth"] == 0), None)
+    if top_idx is None:
+        raise RuntimeError(f"import {module}: no importtime entry found")
+    top = entries[top_idx]
+
+    # importtime은 post-order로 출력 → 직전 depth-0 항목 이후가 이 모듈의 하위 import
+    start = top_idx
+    while start > 0 and entries[start - 1]["depth"] > 0:
+        start -= 1
+    children = entries[start:top_idx]
+    loaded = {e["module"].split(".")[0] for e in children}
+
+    return {
+        "module": module,
+        "total_ms": top["cumulative_us"] / 1000,
+        "heavy_loaded": [m for m in HEAVY_MODULES if m in loaded],
+        "slowest": [
+            {"module": e["module"], "cumulative_ms": e["cumulative_us"] / 1000, "self_ms": e["self_us"] / 1000}
+            for e in sorted(children, key=lambda e: -e["cumulative_us"])[:10]
+        ],
+    }
+
+
+def run_import_benchmark(args) -> bool:
+    """모든 대상 모듈의 import 시간 측정 (repeat 중 최솟값), 예산 초과 여부 반환"""
+    modules = args.modules or list(IMPORT_BUDGETS_MS)
+    results = []
+    ok = True
+
+    for module in modules:
+        runs = [measure_import(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["total_ms"])
+        budget = IMPORT_BUDGETS_MS.get(module)
+        best["budget_ms"] = budget
+        best["within_budget"] = (budget is None or best["total_ms"] <= budget) and not best["heavy_loaded"]
+        results.append(best)
+
+        status = "OK" if best["within_budget"] else "OVER BUDGET"
+        budget_str = f"{budget}ms" if budget else "-"
+        print(f"\n{module}: {best['total_ms']:.1f}ms (budget {budget_str}) [{status}]")
+        if best["heavy_loaded"]:
+            print(f"  ⚠ heavy modules loaded at import: {', '.join(best['heavy_loaded'])}")
+        for e in best["slowest"][:5]:
+            print(f"  {e['cumulative_ms']:8.1f}ms  {e['module']}")
+
+        ok = ok and best["within_budget"]
+
+    if args.output:
+        write_results(args.output, "imports", results)
+
+    return ok
+
+
+# ============================================================
+# Synthetic library
+# ============================================================
+
+# 토픽별 어휘 (영어 + 한국어 혼합). 토픽이 같은 논문끼리 텍스트/임베딩이 비슷해지도록
+SYNTHETIC_TOPICS = [
+    (["haptic", "feedback", "vibrotactile", "wearable", "actuator", "glove"], ["햅틱", "촉각", "피드백", "웨어러블"]),
+    (["virtual", "reality", "immersive", "headset", "locomotion", "presence"], ["가상현실", "몰입", "헤드셋", "현존감"]),
+    (["conversational", "agent", "chatbot", "dialogue", "llm", "voice"], ["대화형", "에이전트", "챗봇", "음성"]),
+    (["accessibility", "blind", "screen", "reader", "low-vision", "assistive"], ["접근성", "시각장애", "보조기술", "스크린리더"]),
+    (["visualization", "dashboard", "chart", "visual", "analytics", "exploration"], ["시각화", "대시보드", "차트", "분석"]),
+    (["crowdsourcing", "workers", "gig", "platform", "labor", "microtask"], ["크라우드소싱", "플랫폼", "노동", "작업자"]),
+    (["mobile", "sensing", "smartphone", "notification", "context", "wellbeing"], ["모바일", "센싱", "스마트폰", "알림"]),
+    (["education", "learning", "students", "classroom", "tutoring", "feedback"], ["교육", "학습", "학생", "튜터링"]),
+    (["health", "clinical", "patients", "tracking", "self-tracking", "care"], ["건강", "환자", "의료", "자기추적"]),
+    (["privacy", "security", "consent", "tracking", "data", "trust"], ["프라이버시", "보안", "동의", "신뢰"]),
+]
+SYNTHETIC_COMMON = ["we", "present", "study", "system", "participants", "interaction", "design", "evaluation",
+                    "results", "show", "users", "novel", "approach", "prototype", "interviews", "findings"]
+SYNTHETIC_VENUES = [
+    ("conferencePaper", "Proceedings of the CHI Conference on Human Factors in Computing Systems"),
+    ("conferencePaper", "Proceedings of the ACM Symposium on User Interface Software and Technology"),
+    ("conferencePaper", "Extended Abstracts of the CHI Conference on Human Factors in Computing Systems"),
+    ("conferencePaper", "Proceedings of the ACM Designing Interactive Systems Conference"),
+    ("journalArticle", "Proc. ACM Hum.-Comput. Interact."),
+    ("journalArticle", "Proc. ACM Interact. Mob. Wearable Ubiquitous Technol."),
+    ("journalArticle", "International Journal of Human-Computer Studies"),
+    ("journalArticle", "한국HCI학회 논문지"),
+    ("preprint", "arXiv"),
+    ("webpage", ""),
+]
+SYNTHETIC_NAMES = [("Kim", "Minji"), ("Lee", "Jihoon"), ("Park", "Soyeon"), ("Smith", "Alex"), ("Müller", "Jana"),
+                   ("Tanaka", "Yuki"), ("García", "Lucía"), ("Chen", "Wei"), ("Okafor", "Chidi"), ("Nguyen", "Linh")]
+SYNTHETIC_TAGS = ["starred", "to-read", "method-survey", "method-lab-study", "thesis", "reviewed"]
+
+
+def _synthetic_words(rng: random.Random, topic: int, n: int, korean_ratio: float = 0.2) -> list[str]:
+    en, ko = SYNTHETIC_TOPICS[topic]
+    words = []
+    for _ in range(n):
+        r = rng.random()
+        if r < korean_ratio:
+            words.append(rng.choice(ko) + rng.choice(["", "을", "의", "에서", "를"]))
+        elif r < 0.6:
+            words.append(rng.choice(en))
+        else:
+            words.append(rng.choice(SYNTHETIC_COMMON))
+    return words
+
+
+def generate_synthetic_items(n: int, seed: int = 42, notes_ratio: float = 0.8) -> list[dict]:
+    """Zotero API 형식의 합성 아이템 생성 (item_to_row 입력과 동일한 구조)
+
+    다국어 제목/초록, HTML 노트, venue, DOI, 태그, PDF 첨부 키 포함.
+    각 아이템의 토픽은 '_topic'에 기록 (합성 임베딩 생성용)
+    """
+    rng = random.Random(seed)
+    items = []
+    for i in range(n):
+        topic = rng.randrange(len(SYNTHETIC_TOPICS))
+        item_type, venue = rng.choice(SYNTHETIC_VENUES)
+        korean = rng.random() < 0.15  # 일부는 한국어 논문
+        title_words = _synthetic_words(rng, topic, rng.randint(5, 12), korean_ratio=0.8 if korean else 0.1)
+        abstract_words = _synthetic_words(rng, topic, rng.randint(80, 250), korean_ratio=0.6 if korean else 0.05)
+        year = rng.randint(1995, 2025)
+
+        data = {
+            "key": f"S{i:07d}",
+            "version": rng.randint(1, 5000),
+            "itemType": item_type,
+            "title": " ".join(title_words).capitalize(),
+            "creators": [
+                {"creatorType": "author", "lastName": last, "firstName": first}
+                for last, first in rng.sample(SYNTHETIC_NAMES, rng.randint(1, 5))
+            ],
+            "abstractNote": " ".join(abstract_words),
+            "date": rng.choice([str(year), f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", f"{rng.randint(1, 12)}월 {rng.randint(1, 28)}, {year}"]),
+            "DOI": f"10.1145/{3000000 + i}" if item_type != "webpage" else "",
+            "url": f"https://example.org/paper/{i}",
+            "tags": [{"tag": t} for t in rng.sample(SYNTHETIC_TAGS, rng.randint(0, 3))],
+        }
+        if item_type == "conferencePaper":
+            data["proceedingsTitle"] = venue
+            data["conferenceName"] = venue.replace("Proceedings of the ", "")
+        elif venue:
+            data["publicationTitle"] = venue
+
+        notes = []
+        if rng.random() < notes_ratio:
+            paragraphs = "".join(
+                f"<p>{' '.join(_synthetic_words(rng, topic, rng.randint(20, 120), korean_ratio=0.4))}</p>"
+                for _ in range(rng.randint(1, 8))
+            )
+            bullets = "".join(f"<li>{' '.join(_synthetic_words(rng, topic, 8))}</li>" for _ in range(rng.randint(0, 5)))
+            notes.append({"key": f"N{i:07d}", "data": {"itemType": "note", "parentItem": data["key"],
+                                                       "note": f"<h1>Reading notes</h1>{paragraphs}<ul>{bullets}</ul>"}})
+
+        items.append({
+            "key": data["key"],
+            "version": data["version"],
+            "data": data,
+            "_notes": notes,
+            "_pdf_key": f"P{i:07d}" if rng.random() < 0.7 else "",
+            "_topic": topic,
+        })
+    return items
+
+
+def synthetic_embeddings(topics: list[int], dim: int = 384, seed: int = 42) -> np.ndarray:
+    """토픽 중심 + 노이즈로 만든 합성 임베딩 (모델 없이 downstream stage 측정용)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((len(SYNTHETIC_TOPICS), dim)).astype(np.float32)
+    noise = rng.standard_normal((len(topics), dim)).astype(np.float32) * 0.8
+    return centers[np.asarray(topics)] + noise
+
+
+def synthetic_subtopic_embeddings(n: int, n_queries: int, dim: int = 384, papers_per_subtopic: int = 100,
+                                  seed: int = 42) -> tuple[np.ndarray, np.ndarray]:
+    """토픽 → 세부 주제 → 논문 계층 구조의 합성 임베딩 (실제 문장 임베딩처럼 이웃이 뭉쳐 있음)
+
+    synthetic_embeddings는 토픽 안에서 등방성 노이즈뿐이라 ANN에는 최악의 분포.
+    Returns: (papers, queries) - 쿼리도 같은 세부 주제들에서 뽑음
+    """
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((len(SYNTHETIC_TOPICS), dim)).astype(np.float32)
+    n_sub = max(len(SYNTHETIC_TOPICS), n // papers_per_subtopic)
+    subtopics = topics[rng.integers(0, len(topics), n_sub)] + rng.standard_normal((n_sub, dim)).astype(np.float32) * 0.6
+
+    def sample(count: int) -> np.ndarray:
+        return subtopics[rng.integers(0, n_sub, count)] + rng.standard_normal((count, dim)).astype(np.float32) * 0.7
+
+    return sample(n), sample(n_queries)
+
+
+def attach_synthetic_citations(records: list, seed: int = 42, external_pool: int = 5000) -> None:
+    """records에 s2_id / references / citations 부여 (내부 + 외부 참조 혼합)"""
+    rng = random.Random(seed)
+    s2_ids = [f"{rng.getrandbits(160):040x}" for _ in records]
+    external = [f"{rng.getrandbits(160):040x}" for _ in range(external_pool)]
+    for rec, s2_id in zip(records, s2_ids):
+        rec["s2_id"] = s2_id
+        rec["citation_count"] = rng.randint(0, 500)
+        rec["references"] = rng.sample(s2_ids, min(len(s2_ids), rng.randint(0, 8))) + rng.sample(external, rng.randint(5, 40))
+        rec["citations"] = rng.sample(s2_ids, min(len(s2_ids), rng.randint(0, 4))) + rng.sample(external, rng.randint(0, 20))
+
+
+def run_generate(args) -> None:
+    """합성 라이브러리를 Zotero CSV 형식으로 저장 (build_map.py --source csv 입력용)"""
+    from zotero_api import item_to_row
+
+    items = generate_synthetic_items(args.size, seed=args.seed, notes_ratio=args.notes_ratio)
+    rows = [item_to_row(item) for item in items]
+    fieldnames = [k for k in rows[0] if not k.startswith("_")]
+
+    with open(args.output, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Generated {len(rows)} synthetic items → {args.output}")
+
+
+# ============================================================
+# Scaling benchmark
+# ============================================================
+
+def run_scale_size(size: int, options: dict) -> dict:
+    """합성 라이브러리 size개로 파이프라인 stage별 처리량/메모리 측정 (별도 프로세스에서 실행)"""
+    import pandas as pd
+    import build_map
+    from build_profile import StageProfiler
+    from zotero_api import item_to_row
+
+    print(f"\n=== {size} items ===")
+    profiler = StageProfiler()
+    seed = options["seed"]
+
+    with profiler.stage("generate", items=size):
+        items = generate_synthetic_items(size, seed=seed)
+    topics = [item["_topic"] for item in items]
+
+    with profiler.stage("item_to_row", items=size):
+        df = pd.DataFrame([item_to_row(item) for item in items])
+    del items
+
+    with profiler.stage("filter", items=len(df)):
+        df = build_map.filter_items(df, include_all=True)
+
+    with profiler.stage("metadata", items=len(df)):
+        df = build_map.process_metadata(df)
+
+    with profiler.stage("embedding", items=len(df)):
+        if options["embedding"] == "synthetic":
+            embeddings = synthetic_embeddings(topics, seed=seed)
+        else:
+            embeddings = build_map.build_embeddings(df, options["embedding"])
+
+    with profiler.stage("combine", items=len(df)):
+        combined = build_map.combine_features(df, embeddings)
+
+    with profiler.stage("reduce", items=len(df)):
+        coords = build_map.reduce_dimensions(combined, options["dim_reduction"])
+    df["x"] = coords[:, 0]
+    df["y"] = coords[:, 1]
+
+    with profiler.stage("cluster", items=len(df)):
+        df["cluster"], n_clusters = build_map.cluster_papers(combined, options["clusters"])
+
+    with profiler.stage("labels", items=len(df)):
+        cluster_labels = build_map.generate_cluster_labels(df, n_clusters)
+
+    with profiler.stage("centroids", items=len(df)):
+        build_map.compute_cluster_centroids(df, n_clusters)
+
+    with profiler.stage("records", items=len(df)):
+        records, _ = build_map.build_records(df, embeddings, cluster_labels, {})
+    attach_synthetic_citations(records, seed=seed)
+
+    with profiler.stage("citation_links", items=len(records)) as st:
+        st["links"] = len(build_map.build_citation_links(records))
+
+    # api_server가 요청마다 하는 papers.json 파싱 비용
+    payload = json.dumps({"papers": records}, ensure_ascii=False)
+    with profiler.stage("papers_json_load", items=len(records)) as st:
+        papers = json.loads(payload)["papers"]
+        st["bytes"] = len(payload.encode("utf-8"))
+    del payload
+
+    run_search_queries(profiler, papers, options["queries"], seed)
+
+    report = profiler.report()
+    report["size"] = size
+    report["embedding"] = options["embedding"]
+    profiler.print_summary()
+    return report
+
+
+def run_search_queries(profiler, papers: list, n_queries: int, seed: int) -> None:
+    """api_server.rank_by_similarity로 시맨틱 검색 지연시간 측정 (p50/p99)"""
+    from api_server import rank_by_similarity
+
+    rng = np.random.default_rng(seed + 1)
+    queries = synthetic_embeddings(rng.integers(0, len(SYNTHETIC_TOPICS), n_queries).tolist(), seed=seed)
+
+    for top_k in (20, 200):
+        with profiler.stage(f"semantic_search_top{top_k}", items=len(papers)) as st:
+            latencies = []
+            for q in queries:
+                start = time.perf_counter()
+                rank_by_similarity(papers, q, top_k)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            st["queries"] = n_queries
+            st["p50_ms"] = round(latencies[len(latencies) // 2] * 1000, 3)
+            st["p99_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3)
+
+
+def run_scale_benchmark(args) -> None:
+    """크기별로 새 프로세스에서 측정 (peak RSS가 이전 크기의 영향을 받지 않도록)"""
+    sizes = [int(s) for s in args.sizes.split(",")]
+    options = {
+        "seed": args.seed,
+        "embedding": args.embedding,
+        "dim_reduction": args.dim_reduction,
+        "clusters": args.clusters,
+        "queries": args.queries,
+    }
+
+    ctx = multiprocessing.get_context("spawn")
+    reports = []
+    for size in sizes:
+        with ctx.Pool(1) as pool:
+            reports.append(pool.apply(run_scale_size, (size, options)))
+
+    print("\n=== Throughput (items/s) ===")
+    stage_names = [s["stage"] for s in reports[0]["stages"]]
+    print(f"  {'stage':<24}" + "".join(f"{size:>14}" for size in sizes))
+    for name in stage_names:
+        row = []
+        for report in reports:
+            stage = next((s for s in report["stages"] if s["stage"] == name), {})
+            if "p50_ms" in stage:
+                row.append(f"p50 {stage['p50_ms']:.1f}ms")
+            else:
+                row.append(f"{stage.get('items_per_s', 0):.0f}")
+        print(f"  {name:<24}" + "".join(f"{v:>14}" for v in row))
+    print("  " + "peak RSS (MB)".ljust(24) + "".join(f"{r['peak_rss_mb'] or 0:>14.0f}" for r in reports))
+
+    write_results(args.output, "scale", reports)
+
+
+# ============================================================
+# Semantic search benchmark
+# ============================================================
+
+def latency_stats(latencies: list[float]) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+    }
+
+
+def run_search_size(size: int, options: dict) -> dict:
+    """size개 합성 논문(papers.json과 같은 list 임베딩)에서 두 구현의 검색 지연시간 비교"""
+    from api_server import rank_by_similarity
+    from semantic_index import SemanticIndex
+
+    seed = options["seed"]
+    rng = np.random.default_rng(seed)
+    topics = rng.integers(0, len(SYNTHETIC_TOPICS), size).tolist()
+    papers = [{"id": i, "embedding": emb} for i, emb in enumerate(synthetic_embeddings(topics, seed=seed).tolist())]
+    queries = synthetic_embeddings(rng.integers(0, len(SYNTHETIC_TOPICS), options["queries"]).tolist(), seed=seed + 1)
+
+    start = time.perf_counter()
+    index = SemanticIndex(papers)
+    result = {"size": size, "queries": len(queries), "index_build_ms": round((time.perf_counter() - start) * 1000, 1),
+              "index_mb": round(index.matrix.nbytes / 1024 / 1024, 1)}
+
+    for top_k in options["top_k"]:
+        baseline, indexed, overlap = [], [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            expected = rank_by_similarity(papers, q, top_k)
+            t1 = time.perf_counter()
+            got = index.search(q, top_k)
+            t2 = time.perf_counter()
+            baseline.append(t1 - t0)
+            indexed.append(t2 - t1)
+            overlap.append(len({p["id"] for p, _ in expected} & {p["id"] for p, _ in got}) / max(1, len(expected)))
+
+        base, idx = latency_stats(baseline), latency_stats(indexed)
+        result[f"top{top_k}"] = {
+            "rank_by_similarity": base,
+            "semantic_index": idx,
+            "speedup_p50": round(base["p50_ms"] / idx["p50_ms"], 1) if idx["p50_ms"] else None,
+            "overlap": round(sum(overlap) / len(overlap), 4),  # float32 반올림 차이로 경계 순위만 다를 수 있음
+        }
+        print(f"  {size:>7} top{top_k:<4} rank_by_similarity p50 {base['p50_ms']:>9.2f}ms p99 {base['p99_ms']:>9.2f}ms"
+              f" | index p50 {idx['p50_ms']:>7.2f}ms p99 {idx['p99_ms']:>7.2f}ms"
+              f" | x{result[f'top{top_k}']['speedup_p50']} overlap {result[f'top{top_k}']['overlap']}")
+    return result
+
+
+def run_search_benchmark(args) -> None:
+    """크기별로 새 프로세스에서 측정"""
+    sizes = [int(s) for s in args.sizes.split(",")]
+    options = {"seed": args.seed, "queries": args.queries, "top_k": [int(k) for k in args.top_k.split(",")]}
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for size in sizes:
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(run_search_size, (size, options)))
+
+    write_results(args.output, "search", results)
+
+
+def run_ann_size(size: int, options: dict) -> dict:
+    """size개 합성 논문에서 IVF 학습/배정 시간과 nprobe별 recall@k, 지연시간 측정"""
+    from semantic_index import SemanticIndex, train_centroids
+
+    seed, top_k = options["seed"], options["top_k"]
+    rng = np.random.default_rng(seed)
+    if options["distribution"] == "topics":
+        embeddings = synthetic_embeddings(rng.integers(0, len(SYNTHETIC_TOPICS), size).tolist(), seed=seed)
+        queries = synthetic_embeddings(rng.integers(0, len(SYNTHETIC_TOPICS), options["queries"]).tolist(), seed=seed + 1)
+    else:
+        embeddings, queries = synthetic_subtopic_embeddings(size, options["queries"], seed=seed)
+    papers = [{"id": i, "embedding": emb} for i, emb in enumerate(embeddings.tolist())]
+
+    index = SemanticIndex(papers)
+    start = time.perf_counter()
+    centroids = train_centroids(index.matrix, options["lists"])
+    train_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    index.attach_ann(centroids)  # 서버가 중심점 파일을 로드할 때 드는 비용 (배정 + 재배치)
+    assign_ms = (time.perf_counter() - start) * 1000
+
+    exact, exact_lat = [], []
+    for q in queries:
+        start = time.perf_counter()
+        exact.append({p["id"] for p, _ in index.search(q, top_k, nprobe=0)})
+        exact_lat.append(time.perf_counter() - start)
+
+    result = {"size": size, "lists": index.ann.n_lists, "train_ms": round(train_ms, 1),
+              "assign_ms": round(assign_ms, 1), "top_k": top_k, "exact": latency_stats(exact_lat), "nprobe": {}}
+    print(f"  {size:>7} lists {index.ann.n_lists}  train {train_ms:.0f}ms  assign {assign_ms:.0f}ms"
+          f"  exact p50 {result['exact']['p50_ms']:.2f}ms p99 {result['exact']['p99_ms']:.2f}ms")
+
+    for nprobe in options["nprobe"]:
+        latencies, recall = [], []
+        for q, expected in zip(queries, exact):
+            start = time.perf_counter()
+            got = index.search(q, top_k, nprobe=nprobe)
+            latencies.append(time.perf_counter() - start)
+            recall.append(len(expected & {p["id"] for p, _ in got}) / max(1, len(expected)))
+        stats = {**latency_stats(latencies), "recall": round(sum(recall) / len(recall), 4)}
+        result["nprobe"][nprobe] = stats
+        print(f"          nprobe {nprobe:>4}  recall@{top_k} {stats['recall']:.3f}"
+              f"  p50 {stats['p50_ms']:.2f}ms p99 {stats['p99_ms']:.2f}ms")
+    return result
+
+
+def run_ann_benchmark(args) -> None:
+    """크기별로 새 프로세스에서 측정"""
+    sizes = [int(s) for s in args.sizes.split(",")]
+    options = {"seed": args.seed, "queries": args.queries, "top_k": args.top_k, "lists": args.lists,
+               "nprobe": [int(n) for n in args.nprobe.split(",")], "distribution": args.distribution}
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for size in sizes:
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(run_ann_size, (size, options)))
+
+    write_results(args.output, "ann", results)
+
+
+# ============================================================
+# 공통
+# ============================================================
+
+def write_results(path: str, benchmark: str, results) -> None:
+    """벤치마크 결과를 JSON으로 저장"""
+    output = {
+        "benchmark": benchmark,
+        "run_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"\nResults written to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zotero Explorer benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p_imports = subparsers.add_parser("imports", help="Import-time report with startup budgets")
+    p_imports.add_argument("modules", nargs="*", help=f"Modules to measure (default: {', '.join(IMPORT_BUDGETS_MS)})")
+    p_imports.add_argument("--repeat", type=int, default=3, help="Runs per module (best is reported)")
+    p_imports.add_argument("--output", help="Write results JSON to this file")
+
+    p_generate = subparsers.add_parser("generate", help="Generate a synthetic library as Zotero CSV")
+    p_generate.add_argument("--size", type=int, default=10000, help="Number of items")
+    p_generate.add_argument("--seed", type=int, default=42)
+    p_generate.add_argument("--notes-ratio", type=float, default=0.8, help="Fraction of items with notes")
+    p_generate.add_argument("--output", required=True,
+                            help="Output CSV file (build_map.py --source csv reads every *.csv in its directory)")
+
+    p_scale = subparsers.add_parser("scale", help="Scaling benchmark on synthetic libraries")
+    p_scale.add_argument("--sizes", default="1000,10000", help="Comma-separated library sizes (e.g. 1000,10000,100000)")
+    p_scale.add_argument("--seed", type=int, default=42)
+    p_scale.add_argument("--embedding", choices=["synthetic", "local", "weighted"], default="synthetic",
+                         help="synthetic: topic vectors without a model (default); local/weighted: real model")
+    p_scale.add_argument("--dim-reduction", choices=["pca", "umap", "tsne"], default="pca")
+    p_scale.add_argument("--clusters", type=int, default=10, help="Fixed k (0 = auto-detect, slow at scale)")
+    p_scale.add_argument("--queries", type=int, default=50, help="Semantic search queries per size")
+    p_scale.add_argument("--output", default="bench_scale.json", help="Results JSON file")
+
+    p_search = subparsers.add_parser("search", help="Semantic search latency: rank_by_similarity vs SemanticIndex")
+    p_search.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated library sizes")
+    p_search.add_argument("--seed", type=int, default=42)
+    p_search.add_argument("--queries", type=int, default=50, help="Queries per size")
+    p_search.add_argument("--top-k", default="20,200", help="Comma-separated top_k values")
+    p_search.add_argument("--output", default="bench_search.json", help="Results JSON file")
+
+    p_ann = subparsers.add_parser("ann", help="ANN (IVF) recall@k vs exact search and latency per nprobe")
+    p_ann.add_argument("--sizes", default="10000,100000", help="Comma-separated library sizes")
+    p_ann.add_argument("--seed", type=int, default=42)
+    p_ann.add_argument("--queries", type=int, default=100, help="Queries per size")
+    p_ann.add_argument("--top-k", type=int, default=20)
+    p_ann.add_argument("--lists", type=int, default=0, help="IVF lists (0 = sqrt(n), as build_map)")
+    p_ann.add_argument("--nprobe", default="1,4,8,16,32,64", help="Comma-separated nprobe values")
+    p_ann.add_argument("--distribution", choices=["subtopics", "topics"], default="subtopics",
+                       help="subtopics: clustered like real embeddings (default); topics: isotropic noise (worst case)")
+    p_ann.add_argument("--output", default="bench_ann.json", help="Results JSON file")
+
+    args = parser.parse_args()
+
+    if args.command == "imports":
+        ok = run_import_benchmark(args)
+        sys.exit(0 if ok else 1)
+    elif args.command == "generate":
+        run_generate(args)
+    elif args.command == "scale":
+        run_scale_benchmark(args)
+    elif args.command == "search":
+        run_search_benchmark(args)
+    elif args.command == "ann":
+        run_ann_benchmark(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,23 +12,23 @@ Zotero Explorer - Map Builder
 import os
 os.environ['CUDA_VISIBLE_DEVICES'] = ''
 
-import pandas as pd
 import numpy as np
 import json
 import re
 import math
 import argparse
 import glob
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from bs4 import BeautifulSoup
-from sklearn.preprocessing import StandardScaler
-from sklearn.manifold import TSNE
-from sklearn.decomposition import PCA
-import umap
-from sklearn.cluster import KMeans, DBSCAN
-from sklearn.metrics import silhouette_score
-from sklearn.feature_extraction.text import TfidfVectorizer
+from typing import TYPE_CHECKING
+
+from build_profile import StageProfiler
+
+# pandas, scikit-learn, umap, bs4는 무거우므로 실제로 쓰는 함수 안에서 import
+# (--help / --dim-reduction pca 실행이나 api_server에서의 import를 빠르게)
+if TYPE_CHECKING:
+    import pandas as pd
 
 # ============================================================
 # 설정
@@ -317,6 +317,9 @@ CURRENT_YEAR = 2025
 
 def extract_text_from_html(html_content: str) -> str:
     """HTML에서 텍스트만 추출"""
+    import pandas as pd
+    from bs4 import BeautifulSoup
+
     if pd.isna(html_content) or not html_content:
         return ""
     soup = BeautifulSoup(html_content, "html.parser")
@@ -358,6 +361,8 @@ def get_venue_score(row) -> float:
 
 def get_type_score(item_type: str) -> float:
     """item type 점수"""
+    import pandas as pd
+
     if pd.isna(item_type):
         return 2
     return TYPE_SCORE.get(item_type, 2)
@@ -409,6 +414,8 @@ def is_review_paper(title: str, abstract: str) -> bool:
 
 def build_text_for_embedding(row) -> str:
     """임베딩용 텍스트 생성 (Title + Abstract + Notes)"""
+    import pandas as pd
+
     parts = []
 
     # Title
@@ -440,12 +447,22 @@ def build_text_for_embedding(row) -> str:
 # 임베딩 함수
 # ============================================================
 
-def embed_with_sentence_transformers(texts: list, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2") -> np.ndarray:
-    """sentence-transformers로 임베딩"""
+def load_sentence_transformer(model_name: str, model=None):
+    """SentenceTransformer 로드 (이미 로드된 model이 있으면 재사용)"""
+    if model is not None:
+        print(f"Using preloaded model: {model_name}")
+        return model
+
     from sentence_transformers import SentenceTransformer
 
     print(f"Loading model: {model_name}")
-    model = SentenceTransformer(model_name)
+    return SentenceTransformer(model_name)
+
+
+def embed_with_sentence_transformers(texts: list, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+                                     model=None) -> np.ndarray:
+    """sentence-transformers로 임베딩"""
+    model = load_sentence_transformer(model_name, model)
 
     print(f"Embedding {len(texts)} texts...")
     embeddings = model.encode(texts, show_progress_bar=True)
@@ -482,13 +499,18 @@ def chunk_text(text: str, max_chars: int = 1500) -> list:
     return chunks if chunks else [text[:max_chars]]
 
 
-def embed_with_weighted_sections(df: pd.DataFrame, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
-                                  title_weight: float = 0.3, abstract_weight: float = 0.4, notes_weight: float = 0.3) -> np.ndarray:
-    """섹션별 가중치 + 청킹으로 임베딩"""
-    from sentence_transformers import SentenceTransformer
+def embed_with_weighted_sections(df: "pd.DataFrame", model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+                                  title_weight: float = 0.3, abstract_weight: float = 0.4, notes_weight: float = 0.3,
+                                  model=None, on_progress=None, passages: list | None = None) -> np.ndarray:
+    """섹션별 가중치 + 청킹으로 임베딩
 
-    print(f"Loading model: {model_name}")
-    model = SentenceTransformer(model_name)
+    on_progress: Callback function(current, total) called after each paper
+    passages: 리스트를 주면 초록/노트 청크 임베딩을 평균 내기 전에
+              (paper id, zotero_key, section, 청크 번호, text, float16 embedding)으로 추가 (passage_index용)
+    """
+    import pandas as pd
+
+    model = load_sentence_transformer(model_name, model)
 
     embeddings = []
     total = len(df)
@@ -496,10 +518,16 @@ def embed_with_weighted_sections(df: pd.DataFrame, model_name: str = "paraphrase
     print(f"Embedding {total} papers with weighted sections...")
     print(f"  Weights: title={title_weight}, abstract={abstract_weight}, notes={notes_weight}")
 
-    for idx, (_, row) in enumerate(df.iterrows()):
+    for idx, (paper_id, row) in enumerate(df.iterrows()):
         if (idx + 1) % 50 == 0 or idx == 0:
             print(f"  Processed {idx + 1}/{total}")
 
+        def keep_chunks(section, chunks, chunk_embs):
+            if passages is not None:
+                key = str(row.get("Key", "") or "")
+                passages.extend((int(paper_id), key, section, i, text, emb.astype(np.float16))
+                                for i, (text, emb) in enumerate(zip(chunks, chunk_embs)))
+
         section_embs = []
         section_weights = []
 
@@ -517,6 +545,7 @@ def embed_with_weighted_sections(df: pd.DataFrame, model_name: str = "paraphrase
             chunks = chunk_text(abstract_str)
             if chunks:
                 chunk_embs = model.encode(chunks)
+                keep_chunks("abstract", chunks, chunk_embs)
                 abstract_emb = np.mean(chunk_embs, axis=0) if len(chunks) > 1 else chunk_embs[0]
                 section_embs.append(abstract_emb)
                 section_weights.append(abstract_weight)
@@ -529,6 +558,7 @@ def embed_with_weighted_sections(df: pd.DataFrame, model_name: str = "paraphrase
                 chunks = chunk_text(notes_text)
                 if chunks:
                     chunk_embs = model.encode(chunks)
+                    keep_chunks("notes", chunks, chunk_embs)
                     notes_emb = np.mean(chunk_embs, axis=0) if len(chunks) > 1 else chunk_embs[0]
                     section_embs.append(notes_emb)
                     section_weights.append(notes_weight)
@@ -544,12 +574,14 @@ def embed_with_weighted_sections(df: pd.DataFrame, model_name: str = "paraphrase
             final_emb = model.encode(str(fallback_title) if pd.notna(fallback_title) else "Untitled")
 
         embeddings.append(final_emb)
+        if on_progress:
+            on_progress(idx + 1, total)
 
     print(f"  Processed {total}/{total}")
     return np.array(embeddings)
 
 
-def embed_with_openai(texts: list, model: str = "text-embedding-3-small") -> np.ndarray:
+def embed_with_openai(texts: list, model: str = "text-embedding-3-small", on_progress=None) -> np.ndarray:
     """OpenAI API로 임베딩"""
     import openai
 
@@ -568,6 +600,8 @@ def embed_with_openai(texts: list, model: str = "text-embedding-3-small") -> np.
             embeddings.append(item.embedding)
 
         print(f"  Processed {min(i+batch_size, len(texts))}/{len(texts)}")
+        if on_progress:
+            on_progress(min(i + batch_size, len(texts)), len(texts))
 
     return np.array(embeddings)
 
@@ -576,8 +610,10 @@ def embed_with_openai(texts: list, model: str = "text-embedding-3-small") -> np.
 # 메인 로직
 # ============================================================
 
-def load_from_csv() -> pd.DataFrame:
+def load_from_csv() -> "pd.DataFrame":
     """Load data from CSV files in current directory"""
+    import pandas as pd
+
     csv_files = glob.glob("*.csv")
     if not csv_files:
         raise FileNotFoundError("No CSV files found in current directory")
@@ -596,50 +632,37 @@ def load_from_csv() -> pd.DataFrame:
     return df
 
 
-def load_from_api() -> pd.DataFrame:
+def load_from_api() -> "pd.DataFrame":
     """Load data from Zotero API"""
     from zotero_api import get_zotero_client, fetch_items_as_dataframe
+    from zotero_store import open_store
 
     print("\n[1/5] Loading from Zotero API...")
     zot = get_zotero_client()
-    df = fetch_items_as_dataframe(zot)
+    df = fetch_items_as_dataframe(zot, store=open_store(zot))
     print(f"  Loaded {len(df)} items from API")
     return df
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Build paper map from Zotero CSV or API")
-    parser.add_argument("--output", default="papers.json", help="Output JSON file")
-    parser.add_argument("--source", choices=["csv", "api"], default="csv",
-                        help="Data source: csv (default) or api (Zotero API)")
-    parser.add_argument("--embedding", choices=["local", "local-large", "weighted", "openai"], default="weighted",
-                        help="Embedding: local (simple), local-large, weighted (chunking+weights, recommended), openai")
-    parser.add_argument("--clusters", type=int, default=0,
-                        help="Number of clusters (0 = auto-detect optimal k)")
-    parser.add_argument("--dim-reduction", choices=["tsne", "pca", "umap"], default="umap",
-                        help="Dimensionality reduction method (umap recommended)")
-    parser.add_argument("--min-dist", type=float, default=0.3,
-                        help="UMAP min_dist: 0.1(tight) ~ 0.5(spread)")
-    parser.add_argument("--all", action="store_true",
-                        help="Include all papers (default: notes-only)")
-    parser.add_argument("--notes-only", action="store_true", default=True,
-                        help="Only include items with notes")
-    args = parser.parse_args()
+def load_from_sqlite(zotero_dir: str | None = None) -> "pd.DataFrame":
+    """Load data from a local Zotero data directory (zotero.sqlite snapshot)"""
+    from zotero_api import items_to_dataframe
+    from zotero_sqlite import default_zotero_dir, load_items_from_sqlite
+
+    zotero_dir = zotero_dir or default_zotero_dir()
+    print(f"\n[1/5] Loading from {zotero_dir}/zotero.sqlite...")
+    items = load_items_from_sqlite(
+        zotero_dir,
+        library_type=os.environ.get("ZOTERO_LIBRARY_TYPE", "user"),
+        library_id=os.environ.get("ZOTERO_LIBRARY_ID"),
+    )
+    df = items_to_dataframe(items)
+    print(f"  Loaded {len(df)} items from zotero.sqlite")
+    return df
 
-    # 1. 데이터 로드 (CSV 또는 API)
-    try:
-        if args.source == "api":
-            df = load_from_api()
-        else:
-            df = load_from_csv()
-    except FileNotFoundError as e:
-        print(f"❌ {e}")
-        return
-    except ValueError as e:
-        print(f"❌ API Error: {e}")
-        print("  Set ZOTERO_LIBRARY_ID and ZOTERO_API_KEY in .env file")
-        return
 
+def filter_items(df: "pd.DataFrame", include_all: bool = False) -> "pd.DataFrame":
+    """중복 제거 + (기본값) 노트 있는 것만 필터링"""
     # 중복 제거 (Title + DOI 기준)
     before_dedup = len(df)
     df = df.drop_duplicates(subset=["Title", "DOI"], keep="first")
@@ -648,12 +671,16 @@ def main():
     print(f"  Total: {len(df)} items")
 
     # 노트 있는 것만 필터링 (기본값)
-    if not args.all:
+    if not include_all:
         df = df[df["Notes"].notna() & (df["Notes"].str.len() > 50)]
         df = df.reset_index(drop=True)
         print(f"  Filtered to {len(df)} items with notes")
 
-    # 2. 메타데이터 처리
+    return df
+
+
+def process_metadata(df: "pd.DataFrame") -> "pd.DataFrame":
+    """연도/venue/type 점수 등 메타데이터 컬럼 추가"""
     print("\n[2/5] Processing metadata...")
     df["year_clean"] = df["Publication Year"].apply(parse_year)
     df["age"] = df["year_clean"].apply(lambda y: CURRENT_YEAR - y if y else None)
@@ -667,26 +694,46 @@ def main():
     df["is_paper"] = df["Item Type"].isin(["conferencePaper", "journalArticle", "bookSection", "preprint", "book"])
 
     print(f"  Papers: {df['is_paper'].sum()}, Apps/Services: {(~df['is_paper']).sum()}")
+    return df
 
-    # 3. 텍스트 임베딩
+
+# --embedding 옵션별 sentence-transformers 모델
+EMBEDDING_MODELS = {
+    "weighted": "paraphrase-multilingual-MiniLM-L12-v2",
+    "local": "paraphrase-multilingual-MiniLM-L12-v2",
+    "local-large": "paraphrase-multilingual-mpnet-base-v2",
+}
+
+
+def build_embeddings(df: "pd.DataFrame", method: str = "weighted", model=None, on_progress=None,
+                     passages: list | None = None) -> np.ndarray:
+    """텍스트 임베딩 생성
+
+    model: 이미 로드된 SentenceTransformer (EMBEDDING_MODELS[method]와 같은 모델일 때만 전달)
+    on_progress: Callback function(current, total)
+    passages: weighted 방식에서 청크 임베딩을 모을 리스트 (embed_with_weighted_sections 참고)
+    """
     print("\n[3/5] Building embeddings...")
 
-    if args.embedding == "weighted":
+    if method == "weighted":
         # 청킹 + 섹션별 가중치 (추천)
-        embeddings = embed_with_weighted_sections(df, "paraphrase-multilingual-MiniLM-L12-v2")
-    elif args.embedding == "local":
-        texts = [build_text_for_embedding(row) for _, row in df.iterrows()]
-        embeddings = embed_with_sentence_transformers(texts, "paraphrase-multilingual-MiniLM-L12-v2")
-    elif args.embedding == "local-large":
+        embeddings = embed_with_weighted_sections(df, EMBEDDING_MODELS[method], model=model, on_progress=on_progress,
+                                                  passages=passages)
+    elif method in ("local", "local-large"):
         texts = [build_text_for_embedding(row) for _, row in df.iterrows()]
-        embeddings = embed_with_sentence_transformers(texts, "paraphrase-multilingual-mpnet-base-v2")
+        embeddings = embed_with_sentence_transformers(texts, EMBEDDING_MODELS[method], model=model)
     else:
         texts = [build_text_for_embedding(row) for _, row in df.iterrows()]
-        embeddings = embed_with_openai(texts)
+        embeddings = embed_with_openai(texts, on_progress=on_progress)
 
     print(f"  Embedding shape: {embeddings.shape}")
+    return embeddings
+
+
+def combine_features(df: "pd.DataFrame", embeddings: np.ndarray) -> np.ndarray:
+    """임베딩 + 메타데이터 feature 결합"""
+    from sklearn.preprocessing import StandardScaler
 
-    # 4. 메타데이터 feature 결합
     print("\n[4/5] Combining features and reducing dimensions...")
     meta_features = df[["venue_quality", "type_score", "age"]].values
 
@@ -704,20 +751,27 @@ def main():
     emb_scaled = emb_scaler.fit_transform(embeddings)
 
     # 메타데이터 비중 조절 (임베딩 대비 0.3 정도)
-    combined = np.hstack([emb_scaled, meta_scaled * 0.3])
+    return np.hstack([emb_scaled, meta_scaled * 0.3])
+
+
+def reduce_dimensions(combined: np.ndarray, method: str = "umap", min_dist: float = 0.3) -> np.ndarray:
+    """2D 좌표로 차원 축소"""
+    if method == "umap":
+        import umap
 
-    # 차원 축소
-    if args.dim_reduction == "umap":
         reducer = umap.UMAP(
             n_components=2,
             n_neighbors=15,
-            min_dist=args.min_dist,
+            min_dist=min_dist,
             metric='cosine',
             random_state=42
         )
         coords = reducer.fit_transform(combined)
-        print(f"  UMAP: min_dist={args.min_dist}")
-    elif args.dim_reduction == "tsne":
+        print(f"  UMAP: min_dist={min_dist}")
+    elif method == "tsne":
+        from sklearn.decomposition import PCA
+        from sklearn.manifold import TSNE
+
         # t-SNE는 고차원에서 바로 하면 느리므로 PCA로 먼저 축소
         if combined.shape[1] > 50:
             pca = PCA(n_components=50, random_state=42)
@@ -725,26 +779,34 @@ def main():
         else:
             combined_reduced = combined
 
-        tsne = TSNE(n_components=2, random_state=42, perplexity=min(30, len(df)-1))
+        tsne = TSNE(n_components=2, random_state=42, perplexity=min(30, len(combined)-1))
         coords = tsne.fit_transform(combined_reduced)
     else:
+        from sklearn.decomposition import PCA
+
         pca = PCA(n_components=2, random_state=42)
         coords = pca.fit_transform(combined)
 
-    df["x"] = coords[:, 0]
-    df["y"] = coords[:, 1]
+    return coords
+
+
+def cluster_papers(combined: np.ndarray, n_clusters: int = 0, on_progress=None) -> tuple[np.ndarray, int]:
+    """KMeans 클러스터링 (n_clusters=0이면 silhouette score로 최적 k 탐색)
+
+    on_progress: Callback function(current, total) per candidate k
+    """
+    from sklearn.cluster import KMeans
+    from sklearn.metrics import silhouette_score
 
-    # 5. 클러스터링
-    n_clusters = args.clusters
     if n_clusters == 0:
         # 최적 k 탐색 (Silhouette score)
         print("\n[5/5] Finding optimal number of clusters...")
-        k_range = range(5, min(20, len(df) // 10))
+        k_range = range(5, min(20, len(combined) // 10))
         best_k = 10
         best_score = -1
         scores = []
 
-        for k in k_range:
+        for i, k in enumerate(k_range):
             kmeans_test = KMeans(n_clusters=k, random_state=42, n_init=10)
             labels = kmeans_test.fit_predict(combined)
             score = silhouette_score(combined, labels)
@@ -753,6 +815,8 @@ def main():
             if score > best_score:
                 best_score = score
                 best_k = k
+            if on_progress:
+                on_progress(i + 1, len(k_range))
 
         n_clusters = best_k
         print(f"\n  → Best k={best_k} (silhouette={best_score:.3f})")
@@ -760,9 +824,56 @@ def main():
         print(f"\n[5/5] Clustering into {n_clusters} clusters...")
 
     kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    df["cluster"] = kmeans.fit_predict(combined)
+    return kmeans.fit_predict(combined), n_clusters
+
+
+# 다국어 불용어 (영어 + 한국어)
+MULTILINGUAL_STOP_WORDS = [
+    # English
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with',
+    'by', 'from', 'as', 'is', 'was', 'are', 'were', 'been', 'be', 'have', 'has', 'had',
+    'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must',
+    'this', 'that', 'these', 'those', 'it', 'its', 'we', 'our', 'they', 'their', 'them',
+    'can', 'also', 'more', 'how', 'what', 'which', 'who', 'when', 'where', 'why',
+    'using', 'use', 'used', 'based', 'through', 'between', 'into', 'such', 'than',
+    'study', 'research', 'paper', 'results', 'findings', 'analysis', 'data', 'method',
+    # Korean
+    '및', '등', '를', '을', '이', '가', '은', '는', '에', '의', '로', '으로', '와', '과',
+    '하는', '있는', '되는', '한', '된', '수', '것', '대한', '통해', '위해', '대해',
+    '연구', '기술', '위한', '사용', '제안', '보여', '제시', '기반', '활용', '가능',
+    '사용자', '논문', '시스템', '인터페이스', '사람', '정보', '방법', '결과',
+    '모델', '분석', '설계', '개발', '평가', '실험', '참여자', '프로세스',
+]
+
+# 한글/영어 2글자 이상
+TOKEN_PATTERN = r'(?u)\b[가-힣a-zA-Z]{2,}\b'
+
+# 조사 패턴 (단어 끝에 붙는 것들)
+KOREAN_PARTICLES = r'(을|를|이|가|은|는|에|의|로|으로|와|과|도|만|까지|부터|에서|으로서|이라|라|란|라는|이라는)$'
+
+
+def strip_korean_particles(text: str) -> str:
+    """한국어 조사 제거 전처리"""
+    words = text.split()
+    cleaned = []
+    for word in words:
+        # 한글 단어에서 조사 제거
+        if re.search(r'[가-힣]', word):
+            cleaned_word = re.sub(KOREAN_PARTICLES, '', word)
+            if len(cleaned_word) >= 2:  # 너무 짧아지면 원본 유지
+                cleaned.append(cleaned_word)
+            else:
+                cleaned.append(word)
+        else:
+            cleaned.append(word)
+    return ' '.join(cleaned)
+
+
+def generate_cluster_labels(df: "pd.DataFrame", n_clusters: int) -> dict:
+    """클러스터 라벨 생성 (TF-IDF 키워드)"""
+    import pandas as pd
+    from sklearn.feature_extraction.text import TfidfVectorizer
 
-    # 6. 클러스터 라벨 생성 (TF-IDF 키워드)
     print("\nGenerating cluster labels...")
     cluster_texts = {}
     for idx, row in df.iterrows():
@@ -775,52 +886,14 @@ def main():
         cluster_texts[c] = cluster_texts.get(c, "") + " " + str(text)
 
     corpus = [cluster_texts.get(i, "") for i in range(n_clusters)]
-
-    # 한국어 조사 제거 전처리
-    def strip_korean_particles(text):
-        import re
-        # 조사 패턴 (단어 끝에 붙는 것들)
-        particles = r'(을|를|이|가|은|는|에|의|로|으로|와|과|도|만|까지|부터|에서|으로서|이라|라|란|라는|이라는)$'
-        words = text.split()
-        cleaned = []
-        for word in words:
-            # 한글 단어에서 조사 제거
-            if re.search(r'[가-힣]', word):
-                cleaned_word = re.sub(particles, '', word)
-                if len(cleaned_word) >= 2:  # 너무 짧아지면 원본 유지
-                    cleaned.append(cleaned_word)
-                else:
-                    cleaned.append(word)
-            else:
-                cleaned.append(word)
-        return ' '.join(cleaned)
-
     corpus = [strip_korean_particles(c) for c in corpus]
 
-    # 다국어 불용어 (영어 + 한국어)
-    multilingual_stop_words = [
-        # English
-        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with',
-        'by', 'from', 'as', 'is', 'was', 'are', 'were', 'been', 'be', 'have', 'has', 'had',
-        'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must',
-        'this', 'that', 'these', 'those', 'it', 'its', 'we', 'our', 'they', 'their', 'them',
-        'can', 'also', 'more', 'how', 'what', 'which', 'who', 'when', 'where', 'why',
-        'using', 'use', 'used', 'based', 'through', 'between', 'into', 'such', 'than',
-        'study', 'research', 'paper', 'results', 'findings', 'analysis', 'data', 'method',
-        # Korean
-        '및', '등', '를', '을', '이', '가', '은', '는', '에', '의', '로', '으로', '와', '과',
-        '하는', '있는', '되는', '한', '된', '수', '것', '대한', '통해', '위해', '대해',
-        '연구', '기술', '위한', '사용', '제안', '보여', '제시', '기반', '활용', '가능',
-        '사용자', '논문', '시스템', '인터페이스', '사람', '정보', '방법', '결과',
-        '모델', '분석', '설계', '개발', '평가', '실험', '참여자', '프로세스',
-    ]
-
     tfidf_vec = TfidfVectorizer(
         max_features=500,
-        stop_words=multilingual_stop_words,
+        stop_words=MULTILINGUAL_STOP_WORDS,
         ngram_range=(1, 2),
         min_df=1,
-        token_pattern=r'(?u)\b[가-힣a-zA-Z]{2,}\b'  # 한글/영어 2글자 이상
+        token_pattern=TOKEN_PATTERN
     )
     tfidf_matrix = tfidf_vec.fit_transform(corpus)
     feature_names = tfidf_vec.get_feature_names_out()
@@ -841,7 +914,11 @@ def main():
         cluster_labels[i] = ", ".join(keywords[:3]) if keywords else f"Cluster {i}"
         print(f"  Cluster {i}: {cluster_labels[i]}")
 
-    # 6.5. 클러스터 중심점 계산 (2D 좌표 기준)
+    return cluster_labels
+
+
+def compute_cluster_centroids(df: "pd.DataFrame", n_clusters: int) -> dict:
+    """클러스터 중심점 계산 (2D 좌표 기준)"""
     print("\nCalculating cluster centroids...")
     cluster_centroids = {}
     for i in range(n_clusters):
@@ -851,19 +928,31 @@ def main():
             centroid_y = float(np.mean(cluster_points[:, 1]))
             cluster_centroids[i] = {"x": centroid_x, "y": centroid_y}
             print(f"  Cluster {i}: ({centroid_x:.2f}, {centroid_y:.2f})")
+    return cluster_centroids
+
+
+def paper_identity(zotero_key: str, doi: str, title: str) -> str:
+    """빌드 간 같은 논문을 식별하는 키 (zotero_key > DOI > 제목)"""
+    if zotero_key:
+        return f"key:{zotero_key}"
+    if doi:
+        return f"doi:{doi.lower()}"
+    return f"title:{title.strip().lower()}"
 
-    # 7. JSON 출력
-    print(f"\nWriting {args.output}...")
 
-    # 기존 papers.json에서 citation 데이터 로드 (있으면)
+def load_existing_output(path: str) -> tuple[dict, dict, dict]:
+    """기존 papers.json에서 citation 데이터와 이전 클러스터 배정 로드 (있으면)
+
+    Returns: (doi -> citation data, reference_cache,
+              {"assignments": paper_identity -> cluster, "labels": cluster -> label})
+    """
     existing_citation_data = {}
-    existing_citation_links = []
     existing_reference_cache = {}
+    previous_clusters = {"assignments": {}, "labels": {}}
     try:
-        with open(args.output, "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             existing = json.load(f)
             existing_papers = existing.get("papers", existing)
-            existing_citation_links = existing.get("citation_links", [])
             existing_reference_cache = existing.get("reference_cache", {})
             for p in existing_papers:
                 if p.get("doi"):
@@ -873,11 +962,93 @@ def main():
                         "references": p.get("references", []),
                         "citations": p.get("citations", []),
                     }
+                if p.get("cluster") is not None:
+                    ident = paper_identity(p.get("zotero_key", ""), p.get("doi", ""), p.get("title", ""))
+                    previous_clusters["assignments"][ident] = int(p["cluster"])
+            previous_clusters["labels"] = {
+                int(c): label for c, label in existing.get("cluster_labels", {}).items()
+            }
         print(f"  Loaded citation data for {len(existing_citation_data)} papers")
         if existing_reference_cache:
             print(f"  Loaded reference_cache with {len(existing_reference_cache)} entries")
+        if previous_clusters["assignments"]:
+            print(f"  Loaded previous cluster assignments for {len(previous_clusters['assignments'])} papers")
     except:
         pass
+    return existing_citation_data, existing_reference_cache, previous_clusters
+
+
+def match_clusters(df: "pd.DataFrame", previous_clusters: dict, threshold: float = 0.3) -> tuple[dict, dict]:
+    """새 KMeans 클러스터를 이전 빌드 클러스터와 매칭 (멤버십 overlap 기반 Hungarian assignment)
+
+    KMeans 번호는 빌드마다 바뀌므로, 이전 빌드와 공유하는 논문들의 Jaccard overlap이
+    threshold 이상인 클러스터는 이전 ID(와 라벨)를 이어받는다.
+    매칭되지 않은 클러스터는 이전에 쓰인 적 없는 새 ID를 받는다.
+
+    Returns: (new cluster -> stable cluster ID, stats)
+    """
+    from scipy.optimize import linear_sum_assignment
+
+    new_ids = sorted(int(c) for c in df["cluster"].unique())
+    previous = previous_clusters.get("assignments", {})
+
+    # 양쪽 빌드에 모두 있는 논문만으로 overlap 계산 (추가/삭제된 논문은 무시)
+    pairs = []
+    for _, row in df.iterrows():
+        ident = paper_identity(str(row.get("Key", "") or ""), str(row.get("DOI", "") or ""),
+                               str(row.get("Title", "") or ""))
+        if ident in previous:
+            pairs.append((int(row["cluster"]), previous[ident]))
+
+    old_ids = sorted({old for _, old in pairs})
+    mapping = {}
+    if pairs and old_ids:
+        new_index = {c: i for i, c in enumerate(new_ids)}
+        old_index = {c: i for i, c in enumerate(old_ids)}
+        overlap = np.zeros((len(new_ids), len(old_ids)))
+        for new, old in pairs:
+            overlap[new_index[new], old_index[old]] += 1
+        new_sizes = overlap.sum(axis=1, keepdims=True)
+        old_sizes = overlap.sum(axis=0, keepdims=True)
+        jaccard = overlap / np.maximum(new_sizes + old_sizes - overlap, 1)
+
+        rows, cols = linear_sum_assignment(-jaccard)
+        for r, c in zip(rows, cols):
+            if jaccard[r, c] >= threshold:
+                mapping[new_ids[r]] = old_ids[c]
+
+    matched = len(mapping)
+
+    # 매칭 안 된 클러스터: 이전 빌드에서 쓰지 않은 가장 작은 ID
+    used = set(mapping.values()) | set(previous_clusters.get("labels", {})) | set(previous.values())
+    next_id = 0
+    for c in new_ids:
+        if c in mapping:
+            continue
+        while next_id in used:
+            next_id += 1
+        mapping[c] = next_id
+        used.add(next_id)
+
+    moved = sum(1 for new, old in pairs if mapping[new] != old)
+    stats = {
+        "matched": matched,
+        "new": len(new_ids) - matched,
+        "retired": len(set(old_ids) - set(mapping.values())),
+        "shared_papers": len(pairs),
+        "papers_moved": moved,
+        "threshold": threshold,
+    }
+    return mapping, stats
+
+
+def build_records(df: "pd.DataFrame", embeddings: np.ndarray, cluster_labels: dict,
+                  existing_citation_data: dict) -> tuple[list, int]:
+    """papers.json용 레코드 생성
+
+    Returns: (records, 자동 태깅된 리뷰 논문 수)
+    """
+    import pandas as pd
 
     records = []
     review_count = 0
@@ -936,15 +1107,11 @@ def main():
 
         records.append(rec)
 
-    # 데이터 소스 업데이트 시간
-    if args.source == "api":
-        data_updated = datetime.now().strftime("%Y-%m-%d %H:%M")
-    else:
-        csv_files = glob.glob("*.csv")
-        csv_mtime = max(os.path.getmtime(f) for f in csv_files) if csv_files else 0
-        data_updated = datetime.fromtimestamp(csv_mtime).strftime("%Y-%m-%d %H:%M")
+    return records, review_count
+
 
-    # S2 ID → paper ID 매핑 생성 후 citation_links 재생성
+def build_citation_links(records: list) -> list:
+    """S2 ID → paper ID 매핑 생성 후 내부 citation_links 재생성"""
     s2_to_id = {r["s2_id"]: r["id"] for r in records if r.get("s2_id")}
     citation_links_set = set()
     for rec in records:
@@ -959,7 +1126,112 @@ def main():
             if cite_s2_id in s2_to_id:
                 citing_id = s2_to_id[cite_s2_id]
                 citation_links_set.add((citing_id, source_id))
-    citation_links = [{"source": s, "target": t} for s, t in citation_links_set]
+    return [{"source": s, "target": t} for s, t in citation_links_set]
+
+
+def run_pipeline(df: "pd.DataFrame", output: str = "papers.json", source: str = "api",
+                 embedding: str = "weighted", clusters: int = 0, dim_reduction: str = "umap",
+                 min_dist: float = 0.3, include_all: bool = False, cluster_match_threshold: float = 0.3,
+                 model=None, on_progress=None, profiler: StageProfiler | None = None, ann: str = "auto",
+                 neighbors: int | None = None) -> dict:
+    """로드된 DataFrame으로 맵 빌드 후 output에 저장 (CLI와 api_server가 공유)
+
+    Args:
+        df: load_from_csv / load_from_api / items_to_dataframe 결과
+        cluster_match_threshold: 이전 빌드 클러스터와 ID/라벨을 이어받을 최소 Jaccard overlap
+        model: 이미 로드된 SentenceTransformer (서버의 시맨틱 검색 모델 재사용)
+        on_progress: Callback function(stage, current, total) for structured progress
+        profiler: StageProfiler (없으면 측정 안 함)
+        ann: 시맨틱 검색 ANN 인덱스(<output>.ann.npz) - auto: SEMANTIC_ANN_MIN_PAPERS 이상일 때, always, never
+        neighbors: 논문당 미리 계산할 유사 논문 수 (<output>.neighbors.npz, None = SIMILAR_PAPERS_K, 0 = 안 함)
+
+    Returns: {"output_data", "papers", "apps", "clusters", "auto_reviews", "cluster_stability"}
+    """
+    profiler = profiler or StageProfiler(enabled=False)
+
+    @contextmanager
+    def stage(name: str, items: int):
+        if on_progress:
+            on_progress(name, 0, items)
+        with profiler.stage(name, items=items) as st:
+            yield st
+        if on_progress:
+            on_progress(name, items, items)
+
+    def stage_progress(name: str):
+        return (lambda cur, tot: on_progress(name, cur, tot)) if on_progress else None
+
+    with stage("filter", len(df)):
+        df = filter_items(df, include_all=include_all)
+
+    # 2. 메타데이터 처리
+    with stage("metadata", len(df)):
+        df = process_metadata(df)
+
+    # 3. 텍스트 임베딩
+    # 청크 임베딩은 weighted 방식에서만 나옴 (passage 검색용)
+    passages = [] if embedding == "weighted" else None
+    with stage("embedding", len(df)):
+        embeddings = build_embeddings(df, embedding, model=model, on_progress=stage_progress("embedding"),
+                                      passages=passages)
+
+    # 4. 메타데이터 feature 결합 + 차원 축소
+    with stage("combine", len(df)):
+        combined = combine_features(df, embeddings)
+
+    with stage("reduce", len(df)):
+        coords = reduce_dimensions(combined, dim_reduction, min_dist)
+
+    df["x"] = coords[:, 0]
+    df["y"] = coords[:, 1]
+
+    # 5. 클러스터링
+    with stage("cluster", len(df)):
+        df["cluster"], n_clusters = cluster_papers(combined, clusters, on_progress=stage_progress("cluster"))
+
+    # 6. 클러스터 라벨 생성 (TF-IDF 키워드)
+    with stage("labels", len(df)):
+        cluster_labels = generate_cluster_labels(df, n_clusters)
+
+    # 6.5. 클러스터 중심점 계산 (2D 좌표 기준)
+    with stage("centroids", len(df)):
+        cluster_centroids = compute_cluster_centroids(df, n_clusters)
+
+    # 6.6. 이전 빌드와 클러스터 매칭 (ID/라벨 유지 → Zotero cluster 태그 churn 최소화)
+    with stage("match", len(df)) as st:
+        existing_citation_data, existing_reference_cache, previous_clusters = load_existing_output(output)
+        cluster_stability = None
+        if previous_clusters["assignments"]:
+            mapping, cluster_stability = match_clusters(df, previous_clusters, cluster_match_threshold)
+            df["cluster"] = df["cluster"].map(mapping)
+            # 살아남은 클러스터는 이전 라벨 유지 (UI에서 바꾼 이름 포함)
+            cluster_labels = {
+                mapping[c]: previous_clusters["labels"].get(mapping[c], label)
+                for c, label in cluster_labels.items()
+            }
+            cluster_centroids = {mapping[c]: xy for c, xy in cluster_centroids.items()}
+            st.update(cluster_stability)
+            print(f"\nMatched {cluster_stability['matched']}/{n_clusters} clusters to previous build "
+                  f"({cluster_stability['papers_moved']}/{cluster_stability['shared_papers']} papers changed cluster)")
+
+    # 7. JSON 출력
+    print(f"\nWriting {output}...")
+
+    with stage("records", len(df)):
+        records, review_count = build_records(df, embeddings, cluster_labels, existing_citation_data)
+
+    # 데이터 소스 업데이트 시간 (api/sqlite는 방금 읽은 스냅샷)
+    if source in ("api", "sqlite"):
+        data_updated = datetime.now().strftime("%Y-%m-%d %H:%M")
+    else:
+        csv_files = glob.glob("*.csv")
+        csv_mtime = max(os.path.getmtime(f) for f in csv_files) if csv_files else 0
+        data_updated = datetime.fromtimestamp(csv_mtime).strftime("%Y-%m-%d %H:%M")
+
+    # S2 ID 기반 citation_links 재생성
+    with stage("citation_links", len(records)) as st:
+        citation_links = build_citation_links(records)
+        st["links"] = len(citation_links)
     print(f"   - Internal citation links: {len(citation_links)}")
 
     # 출력 데이터에 클러스터 중심점 포함
@@ -970,7 +1242,7 @@ def main():
         "citation_links": citation_links,  # S2 ID 기반 재생성
         "reference_cache": existing_reference_cache,  # S2 외부 참조 캐시 보존
         "meta": {
-            "source": args.source,
+            "source": source,
             "data_updated": data_updated,
             "map_built": datetime.now().strftime("%Y-%m-%d %H:%M"),
             "total_papers": sum(1 for r in records if r['is_paper']),
@@ -980,15 +1252,174 @@ def main():
             "zotero_library_type": os.environ.get("ZOTERO_LIBRARY_TYPE", "user")
         }
     }
+    if cluster_stability:
+        output_data["meta"]["cluster_stability"] = cluster_stability
+
+    if profiler.enabled:
+        # write stage는 아직 끝나지 않았으므로 .profile.json에만 기록됨
+        output_data["meta"]["profile"] = profiler.summary()
+
+    # ANN 중심점은 papers.json보다 먼저 씀 (서버가 새 papers.json을 로드할 때 같이 읽도록)
+    from semantic_index import ANN_MIN_PAPERS, ann_path, build_ann_file
+    if ann == "always" or (ann == "auto" and len(embeddings) >= ANN_MIN_PAPERS):
+        with stage("ann", len(embeddings)) as st:
+            centroids = build_ann_file(embeddings, ann_path(output))
+            st["lists"] = len(centroids)
+        print(f"   - ANN index: {len(centroids)} lists → {ann_path(output)}")
+    else:
+        # 이전 빌드의 중심점이 남아 있으면 SemanticIndex가 로드하므로 --ann never가 무시됨
+        ann_path(output).unlink(missing_ok=True)
+
+    # BM25 역색인 (papers.json의 잘린 초록/노트 대신 전체 텍스트로)
+    from lexical_index import LexicalIndex, lexical_path
+    with stage("lexical", len(df)) as st:
+        texts = [
+            " ".join([
+                str(row.get("Title", "") or ""),
+                str(row.get("Author", "") or ""),
+                str(row.get("Abstract Note", "") or ""),
+                extract_text_from_html(row.get("Notes", "")),
+            ])
+            for _, row in df.iterrows()
+        ]
+        lexical = LexicalIndex.build([r["id"] for r in records], texts)
+        lexical.save(lexical_path(output))
+        st["terms"] = len(lexical.terms)
+    print(f"   - BM25 index: {len(lexical.terms)} terms → {lexical_path(output)}")
+
+    # 초록/노트 청크 임베딩 (int8) → /api/passage-search
+    from passage_index import PassageIndex, passages_path
+    if passages:
+        with stage("passages", len(passages)) as st:
+            passage_index = PassageIndex.build(passages)
+            passage_index.save(passages_path(output))
+            st["mb"] = round(passage_index.nbytes / 1e6, 1)
+        print(f"   - Passage index: {len(passage_index)} chunks, {passage_index.nbytes / 1e6:.1f} MB → {passages_path(output)}")
+    else:
+        # weighted가 아니거나 청크가 없는 빌드: 이전 빌드의 청크 색인이 남아 있으면 서버가 그대로 씀
+        passages_path(output).unlink(missing_ok=True)
+
+    # 유사 논문 top-k (임베딩 코사인 + co-citation) → /api/papers/<id>/similar
+    from paper_neighbors import NEIGHBORS_K, build_neighbors, neighbors_path, save_neighbors
+    neighbors = NEIGHBORS_K if neighbors is None else neighbors
+    if neighbors > 0:
+        with stage("neighbors", len(records)) as st:
+            neighbor_rows, neighbor_scores = build_neighbors(
+                embeddings[[r["id"] for r in records]], neighbors,
+                citations=[r.get("citations") for r in records],
+            )
+            save_neighbors(neighbors_path(output), [r["id"] for r in records], [r["zotero_key"] for r in records],
+                           neighbor_rows, neighbor_scores)
+            st["k"] = neighbor_rows.shape[1]
+        print(f"   - Similar papers: top {neighbor_rows.shape[1]} per paper → {neighbors_path(output)}")
+    else:
+        # 이전 빌드의 이웃 목록이 남으면 서버가 바뀐 임베딩 대신 그걸로 응답함
+        neighbors_path(output).unlink(missing_ok=True)
+
+    with stage("write", len(records)):
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(output_data, f, ensure_ascii=False, indent=2)
+
+    return {
+        "output_data": output_data,
+        "papers": output_data["meta"]["total_papers"],
+        "apps": output_data["meta"]["total_apps"],
+        "clusters": n_clusters,
+        "auto_reviews": review_count,
+        "cluster_stability": cluster_stability,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build paper map from Zotero CSV or API")
+    parser.add_argument("--output", default="papers.json", help="Output JSON file")
+    parser.add_argument("--source", choices=["csv", "api", "sqlite"], default="csv",
+                        help="Data source: csv (default), api (Zotero API) or sqlite (local Zotero data dir)")
+    parser.add_argument("--zotero-dir",
+                        help="With --source sqlite: Zotero data directory (default: $ZOTERO_DATA_DIR or ~/Zotero)")
+    parser.add_argument("--embedding", choices=["local", "local-large", "weighted", "openai"], default="weighted",
+                        help="Embedding: local (simple), local-large, weighted (chunking+weights, recommended), openai")
+    parser.add_argument("--clusters", type=int, default=0,
+                        help="Number of clusters (0 = auto-detect optimal k)")
+    parser.add_argument("--dim-reduction", choices=["tsne", "pca", "umap"], default="umap",
+                        help="Dimensionality reduction method (umap recommended)")
+    parser.add_argument("--min-dist", type=float, default=0.3,
+                        help="UMAP min_dist: 0.1(tight) ~ 0.5(spread)")
+    parser.add_argument("--all", action="store_true",
+                        help="Include all papers (default: notes-only)")
+    parser.add_argument("--cluster-match-threshold", type=float, default=0.3,
+                        help="Min Jaccard overlap to keep a previous cluster's ID/label (>1 = always fresh IDs)")
+    parser.add_argument("--notes-only", action="store_true", default=True,
+                        help="Only include items with notes")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record per-stage wall/CPU time and peak RSS (writes <output>.profile.json)")
+    parser.add_argument("--profile-dump", choices=["cprofile", "pyinstrument"],
+                        help="With --profile: also dump a per-stage profile into <output>.profile/")
+    parser.add_argument("--ann", choices=["auto", "always", "never"], default="auto",
+                        help="Semantic search ANN index <output>.ann.npz (auto: $SEMANTIC_ANN_MIN_PAPERS+ papers)")
+    parser.add_argument("--neighbors", type=int, default=None,
+                        help="Similar papers to precompute per paper into <output>.neighbors.npz "
+                             "(default: $SIMILAR_PAPERS_K or 20, 0 = skip)")
+    args = parser.parse_args()
+
+    output_path = Path(args.output)
+    profiler = StageProfiler(
+        enabled=args.profile,
+        dump=args.profile_dump,
+        dump_dir=output_path.with_suffix(".profile"),
+    )
 
-    with open(args.output, "w", encoding="utf-8") as f:
-        json.dump(output_data, f, ensure_ascii=False, indent=2)
+    # 1. 데이터 로드 (CSV, API 또는 zotero.sqlite)
+    try:
+        with profiler.stage("load") as st:
+            if args.source == "api":
+                df = load_from_api()
+            elif args.source == "sqlite":
+                df = load_from_sqlite(args.zotero_dir)
+            else:
+                df = load_from_csv()
+            st["items"] = len(df)
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        return
+    except ValueError as e:
+        if args.source == "sqlite":
+            print(f"❌ {e}")
+            return
+        print(f"❌ API Error: {e}")
+        print("  Set ZOTERO_LIBRARY_ID and ZOTERO_API_KEY in .env file")
+        return
+
+    result = run_pipeline(
+        df,
+        output=args.output,
+        source=args.source,
+        embedding=args.embedding,
+        clusters=args.clusters,
+        dim_reduction=args.dim_reduction,
+        min_dist=args.min_dist,
+        include_all=args.all,
+        cluster_match_threshold=args.cluster_match_threshold,
+        profiler=profiler,
+        ann=args.ann,
+        neighbors=args.neighbors,
+    )
 
-    print(f"\n✅ Done! Generated {args.output} with {len(records)} items")
-    print(f"   - Papers: {sum(1 for r in records if r['is_paper'])}")
-    print(f"   - Apps/Services: {sum(1 for r in records if not r['is_paper'])}")
-    print(f"   - Clusters: {n_clusters}")
-    print(f"   - Auto-tagged reviews: {review_count}")
+    if args.profile:
+        profile_path = output_path.with_suffix(".profile.json")
+        profiler.write(profile_path)
+        profiler.print_summary()
+        print(f"  Profile written to {profile_path}")
+
+    print(f"\n✅ Done! Generated {args.output} with {result['papers'] + result['apps']} items")
+    print(f"   - Papers: {result['papers']}")
+    print(f"   - Apps/Services: {result['apps']}")
+    print(f"   - Clusters: {result['clusters']}")
+    if result["cluster_stability"]:
+        stability = result["cluster_stability"]
+        print(f"   - Stable clusters: {stability['matched']} kept, {stability['new']} new, "
+              f"{stability['papers_moved']} papers moved")
+    print(f"   - Auto-tagged reviews: {result['auto_reviews']}")
 
 
 if __name__ == "__main__":
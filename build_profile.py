@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Zotero Explorer - Build Profiler
+- 파이프라인 stage별 wall time / CPU time / peak RSS / item 수 기록
+- 선택적으로 stage별 cProfile / pyinstrument 덤프
+"""
+
+import sys
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb() -> float | None:
+    """프로세스 peak RSS (MB)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux는 KB, macOS는 bytes
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class StageProfiler:
+    """build_map 파이프라인 stage 측정기
+
+    Usage:
+        profiler = StageProfiler(dump="cprofile", dump_dir="papers.profile")
+        with profiler.stage("embedding") as st:
+            ...
+            st["items"] = len(df)
+    """
+
+    def __init__(self, enabled: bool = True, dump: str | None = None, dump_dir: str | Path | None = None):
+        self.enabled = enabled
+        self.dump = dump if enabled else None
+        self.dump_dir = Path(dump_dir) if dump_dir else None
+        self.stages = []
+        self.started_at = datetime.now()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+        if self.dump == "pyinstrument":
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                print("  ⚠ pyinstrument not installed, falling back to cProfile")
+                self.dump = "cprofile"
+
+        if self.dump and self.dump_dir:
+            self.dump_dir.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def stage(self, name: str, items: int | None = None):
+        """stage 하나를 측정. yield된 dict에 items 등 추가 정보를 기록할 수 있음"""
+        record = {"stage": name, "items": items}
+        if not self.enabled:
+            yield record
+            return
+
+        dumper = self._start_dump()
+        rss_before = peak_rss_mb()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = round(time.perf_counter() - wall_start, 4)
+            record["cpu_s"] = round(time.process_time() - cpu_start, 4)
+            rss_after = peak_rss_mb()
+            if rss_after is not None:
+                record["peak_rss_mb"] = round(rss_after, 1)
+                record["rss_growth_mb"] = round(rss_after - rss_before, 1)
+            if record.get("items") and record["wall_s"] > 0:
+                record["items_per_s"] = round(record["items"] / record["wall_s"], 1)
+            if dumper:
+                record["dump"] = self._stop_dump(dumper, name)
+            self.stages.append(record)
+
+    def _start_dump(self):
+        if not self.dump or not self.dump_dir:
+            return None
+        if self.dump == "pyinstrument":
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+        else:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def _stop_dump(self, profiler, name: str) -> str:
+        if self.dump == "pyinstrument":
+            profiler.stop()
+            path = self.dump_dir / f"{name}.html"
+            path.write_text(profiler.output_html(), encoding="utf-8")
+        else:
+            profiler.disable()
+            path = self.dump_dir / f"{name}.prof"
+            profiler.dump_stats(str(path))
+        return str(path)
+
+    def report(self) -> dict:
+        """전체 리포트 (JSON 파일용)"""
+        peak = peak_rss_mb()
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "total_wall_s": round(time.perf_counter() - self._wall_start, 4),
+            "total_cpu_s": round(time.process_time() - self._cpu_start, 4),
+            "peak_rss_mb": round(peak, 1) if peak is not None else None,
+            "python": sys.version.split()[0],
+            "stages": self.stages,
+        }
+
+    def summary(self) -> dict:
+        """papers.json meta에 들어갈 요약"""
+        report = self.report()
+        return {
+            "total_wall_s": report["total_wall_s"],
+            "peak_rss_mb": report["peak_rss_mb"],
+            "stages": {
+                s["stage"]: {"wall_s": s.get("wall_s"), "cpu_s": s.get("cpu_s"), "items": s.get("items")}
+                for s in self.stages
+            },
+        }
+
+    def write(self, path: str | Path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    def print_summary(self) -> None:
+        print("\nProfile:")
+        for s in self.stages:
+            items = f"{s['items']} items" if s.get("items") is not None else ""
+            rss = f"peak {s['peak_rss_mb']:.0f}MB" if s.get("peak_rss_mb") is not None else ""
+            print(f"  {s['stage']:<24} wall {s['wall_s']:8.2f}s  cpu {s['cpu_s']:8.2f}s  {rss:>14}  {items}")
@@ -80,7 +80,7 @@ async function loadData() {
           highlightCluster = c;
           item.classList.add('active');
         }
-        applyFilters();
+        onSearchFilterChange();
       });
 
       // 더블클릭으로 라벨 편집
@@ -214,7 +214,7 @@ function updateFilterChips() {
     chip.onclick = () => {
       highlightCluster = null;
       document.querySelectorAll('.cluster-item').forEach(el => el.classList.remove('active'));
-      applyFilters();
+      onSearchFilterChange();
     };
     container.appendChild(chip);
   }
@@ -227,7 +227,7 @@ function updateFilterChips() {
     chip.innerHTML = `<i data-lucide="tag"></i> ${tagFilter} <span class="chip-close"><i data-lucide="x"></i></span>`;
     chip.onclick = () => {
       document.getElementById('tagFilter').value = '';
-      applyFilters();
+      onSearchFilterChange();
     };
     container.appendChild(chip);
   }
@@ -257,7 +257,7 @@ function updateFilterChips() {
     chip.onclick = () => {
       yearRange = null;
       document.getElementById('brushSelection').classList.remove('active');
-      applyFilters();
+      onSearchFilterChange();
       if (typeof renderMiniTimeline === 'function') renderMiniTimeline(allPapers);
     };
     container.appendChild(chip);
@@ -306,7 +306,8 @@ async function toggleBookmark(paper) {
         body: JSON.stringify({
           action: wasBookmarked ? 'remove' : 'add',
           tag: 'starred',
-          zotero_keys: [zoteroKey]
+          zotero_keys: [zoteroKey],
+          queue: true  // 서버가 바로 응답, Zotero 쓰기는 태그 큐에서 모아서 처리
         })
       });
 
@@ -304,8 +304,8 @@ function renderCitationSectionHtml(papers, title, color, maxItems = null, titleM
 }
 
 // Render similar papers section
-function renderSimilarPapersHtml(item, count = 5, titleMaxLen = 50) {
-  const similar = findSimilarPapers(item, allPapers, count);
+function renderSimilarPapersHtml(item, count = 5, titleMaxLen = 50, similar = null) {
+  similar = similar || findSimilarPapers(item, allPapers, count);
   let html = '<h3>Similar Papers</h3><ul>';
   similar.forEach(p => {
     const title = p.title.length > titleMaxLen ? p.title.substring(0, titleMaxLen) + '...' : p.title;
@@ -315,6 +315,23 @@ function renderSimilarPapersHtml(item, count = 5, titleMaxLen = 50) {
   return html;
 }
 
+// Replace the map-distance list with precomputed embedding neighbours from the server
+async function loadSimilarPapers(item, containerId, count = 5, titleMaxLen = 50) {
+  try {
+    const resp = await fetch(`${API_BASE}/papers/${item.id}/similar?top_k=${count}`);
+    if (!resp.ok) return;
+    const data = await resp.json();
+    const byId = new Map(allPapers.map(p => [p.id, p]));
+    const similar = data.results.map(r => byId.get(r.id)).filter(Boolean);
+    if (!similar.length || selectedPaper?.id !== item.id) return;
+    const container = document.getElementById(containerId);
+    container.innerHTML = renderSimilarPapersHtml(item, count, titleMaxLen, similar);
+    attachPaperListClickHandlers(`#${containerId}`, containerId === 'similarPapers' ? showDetail : showMobileDetail);
+  } catch (e) {
+    // API 서버 없음 (정적 호스팅) → 맵 거리 기반 목록 유지
+  }
+}
+
 // Setup bookmark button with click handler (using cloneNode to remove old listeners)
 function setupBookmarkButton(btn, item, onUpdate) {
   const newBtn = btn.cloneNode(true);
@@ -780,6 +797,7 @@ function showDetail(item) {
   // Similar papers
   document.getElementById('similarPapers').innerHTML = renderSimilarPapersHtml(item, 5, 50);
   attachPaperListClickHandlers('#similarPapers', showDetail);
+  loadSimilarPapers(item, 'similarPapers', 5, 50);
 }
 
 function findSimilarPapers(target, papers, n = 5) {
@@ -856,6 +874,7 @@ function showMobileDetail(item) {
 
   // Click handlers
   attachPaperListClickHandlers('#bottomSheetContent', showMobileDetail);
+  loadSimilarPapers(item, 'mobileSimilarPapers', 3, 35);
 
   openBottomSheet();
 }
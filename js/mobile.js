@@ -54,7 +54,7 @@ function populateMobileClusterChips() {
   allChip.addEventListener('click', () => {
     highlightCluster = null;
     updateMobileClusterChips();
-    applyFilters();
+    onSearchFilterChange();
   });
   container.appendChild(allChip);
 
@@ -74,7 +74,7 @@ function populateMobileClusterChips() {
         highlightCluster = c;
       }
       updateMobileClusterChips();
-      applyFilters();
+      onSearchFilterChange();
     });
     container.appendChild(chip);
   });
@@ -263,7 +263,7 @@ function initMobileHandlers() {
   if (mobileTagFilter) {
     mobileTagFilter.addEventListener('change', () => {
       syncDesktopControls();
-      applyFilters();
+      onSearchFilterChange();
     });
   }
 
@@ -344,7 +344,7 @@ function updateMobileFilterStatus() {
         highlightCluster = null;
         updateMobileClusterList();
         document.querySelectorAll('.cluster-item').forEach(el => el.classList.remove('active'));
-        applyFilters();
+        onSearchFilterChange();
       }
     });
   }
@@ -358,7 +358,7 @@ function updateMobileFilterStatus() {
       clear: () => {
         document.getElementById('tagFilter').value = '';
         document.getElementById('mobileTagFilter').value = '';
-        applyFilters();
+        onSearchFilterChange();
       }
     });
   }
@@ -386,7 +386,7 @@ function updateMobileFilterStatus() {
         if (typeof clearMiniTimelineBrush === 'function') {
           clearMiniTimelineBrush();
         }
-        applyFilters();
+        onSearchFilterChange();
       }
     });
   }
@@ -467,7 +467,7 @@ function populateMobileClusterList() {
         const itemCluster = parseInt(item.dataset.cluster);
         item.classList.toggle('active', highlightCluster === itemCluster);
       });
-      applyFilters();
+      onSearchFilterChange();
       closeMobileMenu();  // 선택 후 메뉴 닫기
     };
   });
@@ -390,8 +390,8 @@ function initMiniTimelineBrush() {
       }
     }
 
-    // Update filter and re-render
-    applyFilters();
+    // Update filter and re-render (semantic search re-runs on the server with the new year range)
+    onSearchFilterChange();
     renderMiniTimeline(allPapers);
   });
 
@@ -405,7 +405,7 @@ function initMiniTimelineBrush() {
   canvas.addEventListener('dblclick', () => {
     yearRange = null;
     brush.classList.remove('active');
-    applyFilters();
+    onSearchFilterChange();
     renderMiniTimeline(allPapers);
   });
 }
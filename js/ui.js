@@ -138,8 +138,8 @@ async function checkSyncStatus() {
 }
 
 const STEP_NAMES = {
-  1: 'Building',
-  2: 'Loading',
+  1: 'Fetching',
+  2: 'Building',
   3: 'Clusters',
   4: 'Reviews'
 };
@@ -188,7 +188,7 @@ function startSyncPolling() {
             addSyncLog(`Built ${r.build.papers} papers, ${r.build.clusters} clusters`, 'success');
           }
           if (r.cluster_sync) {
-            addSyncLog(`Clusters: ${r.cluster_sync.success} synced`, 'success');
+            addSyncLog(`Clusters: ${r.cluster_sync.success} synced, ${r.cluster_sync.unchanged || 0} unchanged`, 'success');
           }
           if (r.review_sync && r.review_sync.success > 0) {
             addSyncLog(`Reviews: ${r.review_sync.success} tagged`, 'success');
@@ -477,13 +477,36 @@ function applyTheme(theme) {
   }
 }
 
+// Filter change that also narrows the server-side semantic search
+// (cluster / year / tag / venue / paper-only); set up in initFilterHandlers
+let onSearchFilterChange = () => applyFilters();
+
+// Active filters as semantic search params (server applies them before top-k)
+function semanticFilterParams() {
+  const params = new URLSearchParams({ has_notes: 'true' });
+  const minVenue = parseFloat(document.getElementById('minVenue').value) || 0;
+  if (minVenue > 0) params.set('min_venue_quality', minVenue);
+  if (document.getElementById('papersOnly').checked) params.set('is_paper', 'true');
+  const tagFilter = document.getElementById('tagFilter').value;
+  if (tagFilter) params.set('tags', tagFilter);
+  if (highlightCluster !== null) params.set('clusters', highlightCluster);
+  if (yearRange) {
+    params.set('year_min', yearRange.min);
+    params.set('year_max', yearRange.max);
+  }
+  return params;
+}
+
 // Semantic search function
 async function performSemanticSearch(query) {
   const toggle = document.getElementById('semanticToggle');
   toggle.classList.add('loading');
 
   try {
-    const resp = await fetch(`/api/semantic-search?q=${encodeURIComponent(query)}&top_k=50`);
+    const params = semanticFilterParams();
+    params.set('q', query);
+    params.set('top_k', 50);
+    const resp = await fetch(`/api/semantic-search?${params}`);
     const data = await resp.json();
 
     if (data.error) {
@@ -542,10 +565,19 @@ function initFilterHandlers() {
     }
   }, SEMANTIC_SEARCH_DEBOUNCE);
 
-  document.getElementById('minVenue').addEventListener('change', applyFilters);
-  document.getElementById('papersOnly').addEventListener('change', applyFilters);
+  // 시맨틱 검색 중이면 필터가 바뀔 때 서버에서 다시 검색 (필터 적용 후 top-k)
+  onSearchFilterChange = () => {
+    if (semanticSearchMode && document.getElementById('searchFilter').value.trim()) {
+      debouncedSemanticSearch();
+    } else {
+      applyFilters();
+    }
+  };
+
+  document.getElementById('minVenue').addEventListener('change', onSearchFilterChange);
+  document.getElementById('papersOnly').addEventListener('change', onSearchFilterChange);
   document.getElementById('bookmarkedOnly').addEventListener('change', applyFilters);
-  document.getElementById('tagFilter').addEventListener('change', applyFilters);
+  document.getElementById('tagFilter').addEventListener('change', onSearchFilterChange);
   document.getElementById('searchFilter').addEventListener('input', () => {
     if (semanticSearchMode) {
       showFilterStatus('updating');
@@ -1183,7 +1215,7 @@ function initSyncModalHandlers() {
               const r = status.last_result;
               syncStats.innerHTML = `
                 <strong>Build:</strong> ${r.build?.papers || 0} papers, ${r.build?.clusters || 0} clusters<br>
-                <strong>Cluster Tags:</strong> ${r.cluster_sync?.success || 0} synced<br>
+                <strong>Cluster Tags:</strong> ${r.cluster_sync?.success || 0} synced, ${r.cluster_sync?.unchanged || 0} unchanged<br>
                 <strong>Review Tags:</strong> ${r.review_sync?.success || 0} synced
               `;
               syncResult.style.display = 'block';
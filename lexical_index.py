@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Zotero Explorer - Lexical (BM25) Index
+- 제목 / 저자 / 초록 / 노트 텍스트에 대한 BM25 역색인
+- 토큰화는 클러스터 라벨 TF-IDF와 동일 (build_map의 TOKEN_PATTERN, 한국어 조사 제거, 다국어 불용어)
+- build_map이 <output>.bm25.npz로 저장 (papers.json에는 잘린 초록/노트만 있음), 서버가 로드
+- 벡터 검색 결과와 reciprocal rank fusion으로 합침
+"""
+
+import hashlib
+import math
+import os
+import re
+import threading
+import weakref
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from build_map import MULTILINGUAL_STOP_WORDS, TOKEN_PATTERN, strip_korean_particles
+
+_TOKEN_RE = re.compile(TOKEN_PATTERN)
+_STOP_WORDS = frozenset(MULTILINGUAL_STOP_WORDS)
+
+# RRF 상수 (일반적으로 쓰는 60)
+RRF_K = 60
+
+
+def lexical_path(papers_path: str | Path) -> Path:
+    """papers.json → papers.bm25.npz"""
+    return Path(papers_path).with_suffix(".bm25.npz")
+
+
+def tokenize(text: str) -> list[str]:
+    """TfidfVectorizer(token_pattern=TOKEN_PATTERN, stop_words=...)와 같은 토큰 (소문자)"""
+    text = strip_korean_particles(text or "").lower()
+    return [t for t in _TOKEN_RE.findall(text) if t not in _STOP_WORDS]
+
+
+def paper_text(paper: dict) -> str:
+    """papers.json 레코드의 검색 대상 텍스트 (맵 빌드 때 만든 색인이 없을 때)"""
+    return " ".join(str(paper.get(k) or "") for k in ("title", "authors", "abstract", "notes"))
+
+
+class LexicalIndex:
+    """BM25 역색인 (term-major postings)
+
+    Usage:
+        index = LexicalIndex.build(ids, texts)
+        scores = index.scores("haptic glove")  # 문서(행)별 BM25 점수
+    """
+
+    def __init__(self, terms, offsets, docs, tfs, doc_len, ids, k1: float = 1.2, b: float = 0.75):
+        self.terms = terms
+        self.term_index = {t: i for i, t in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.ids = ids
+        self.k1 = k1
+        self.b = b
+        self.avg_len = float(doc_len.mean()) if len(doc_len) else 0.0
+        self.row_by_id = {int(pid): row for row, pid in enumerate(ids)}
+
+    @classmethod
+    def build(cls, ids: list[int], texts: list[str]) -> "LexicalIndex":
+        vocab: dict[str, int] = {}
+        term_ids, doc_rows, counts = [], [], []
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_len[row] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_rows.append(row)
+                counts.append(tf)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        terms = [None] * len(vocab)
+        for term, i in vocab.items():
+            terms[i] = term
+        return cls(
+            terms=terms,
+            offsets=np.searchsorted(term_ids[order], np.arange(len(vocab) + 1)),
+            docs=np.asarray(doc_rows, dtype=np.int32)[order],
+            tfs=np.asarray(counts, dtype=np.float32)[order],
+            doc_len=doc_len,
+            ids=np.asarray(ids, dtype=np.int64),
+        )
+
+    @classmethod
+    def from_papers(cls, papers: list[dict]) -> "LexicalIndex":
+        return cls.build([p["id"] for p in papers], [paper_text(p) for p in papers])
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez_compressed(tmp, terms=np.asarray(self.terms, dtype=str), offsets=self.offsets, docs=self.docs,
+                            tfs=self.tfs, doc_len=self.doc_len, ids=self.ids)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "LexicalIndex | None":
+        try:
+            with np.load(path) as f:
+                return cls(f["terms"].tolist(), f["offsets"], f["docs"], f["tfs"], f["doc_len"], f["ids"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def scores(self, query: str) -> np.ndarray:
+        """문서(행)별 BM25 점수 (쿼리 단어가 하나도 없는 문서는 0)"""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        n = len(self.ids)
+        for term in dict.fromkeys(tokenize(query)):
+            t = self.term_index.get(term)
+            if t is None:
+                continue
+            start, end = self.offsets[t], self.offsets[t + 1]
+            docs, tf = self.docs[start:end], self.tfs[start:end]
+            idf = math.log(1 + (n - (end - start) + 0.5) / ((end - start) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / (self.avg_len or 1.0))
+            # 한 term의 postings 안에서 문서는 한 번씩만 나옴 → fancy index += 안전
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, top_k: int = 100, allowed_ids: np.ndarray | None = None) -> list[tuple[int, float]]:
+        """BM25 상위 top_k [(paper id, score)] (점수 0은 제외)
+
+        allowed_ids: paper id로 인덱싱하는 bool 배열 (필터)
+        """
+        scores = self.scores(query)
+        if allowed_ids is not None:
+            in_range = self.ids < len(allowed_ids)
+            allowed = np.zeros(len(self.ids), dtype=bool)
+            allowed[in_range] = allowed_ids[self.ids[in_range]]
+            scores[~allowed] = 0
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(self.ids[i]), float(scores[i])) for i in hits]
+
+
+def reciprocal_rank_fusion(rankings: list[list[int]], k: int = RRF_K) -> list[tuple[int, float]]:
+    """여러 순위 목록(paper id, 좋은 순)을 RRF로 합침: score = Σ 1 / (k + rank)"""
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, pid in enumerate(ranking, start=1):
+            fused[pid] = fused.get(pid, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda x: -x[1])
+
+
+_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_latest: tuple | None = None  # (signature, 마지막으로 만든/로드한 색인)
+_lock = threading.Lock()
+
+
+def _signature(snapshot, path: str | Path | None) -> tuple:
+    """색인 재사용 판단용: bm25 파일 (mtime, size) + (id, zotero_key) 목록
+
+    build_map은 위치 기반 id를 쓰므로 id만으로는 재빌드를 구분할 수 없음.
+    파일이 없으면 papers.json 텍스트 해시도 포함 (텍스트로 직접 만드는 경우)
+    """
+    try:
+        st = os.stat(path) if path else None
+        stat = (st.st_mtime_ns, st.st_size) if st else None
+    except FileNotFoundError:
+        stat = None
+    papers = tuple((p.get("id", -1), p.get("zotero_key", "")) for p in snapshot.papers)
+    if stat is not None:
+        return stat, papers
+    digest = hashlib.blake2b(digest_size=16)
+    for p in snapshot.papers:
+        digest.update(paper_text(p).encode("utf-8", errors="ignore") + b"\0")
+    return None, papers, digest.hexdigest()
+
+
+def lexical_index_for(snapshot, path: str | Path | None = None) -> LexicalIndex:
+    """papers_store 스냅샷에 대한 BM25 색인 (스냅샷당 한 번)
+
+    path: build_map이 만든 색인 (lexical_path(papers.json)). paper id가 스냅샷과 같을 때만 사용하고,
+    없거나 다르면 papers.json 텍스트로 다시 만듦. 태그/인용 동기화처럼 파일과 논문 목록이 그대로인
+    스냅샷은 이전 색인을 재사용.
+    """
+    global _latest
+    index = _indexes.get(snapshot)
+    if index is not None:
+        return index
+    with _lock:
+        index = _indexes.get(snapshot)
+        if index is not None:
+            return index
+        signature = _signature(snapshot, path)
+        if _latest is not None and _latest[0] == signature:
+            index = _latest[1]
+        else:
+            ids = np.asarray([p.get("id", -1) for p in snapshot.papers], dtype=np.int64)
+            index = LexicalIndex.load(path) if signature[0] is not None else None
+            if index is None or not np.array_equal(index.ids, ids):
+                if index is not None:
+                    print(f"BM25 index {path} does not match papers.json, rebuilding from papers.json")
+                index = LexicalIndex.from_papers(snapshot.papers)
+            _latest = (signature, index)
+        _indexes[snapshot] = index
+        return index
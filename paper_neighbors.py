@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Zotero Explorer - Precomputed Similar Papers
+- build_map이 논문마다 가장 가까운 이웃 top-k를 미리 계산해서 <output>.neighbors.npz로 저장
+  (임베딩 코사인 + co-citation 가중치: 같은 논문에 함께 인용된 정도, Salton 코사인)
+- 서버는 스냅샷당 한 번 로드, 조회는 id → 행 dict + 배열 슬라이스
+- 빌드 후에 추가된 논문(파일에 없거나 zotero_key가 다른 id)은 호출하는 쪽에서 exact 검색으로
+"""
+
+import os
+import threading
+import weakref
+from pathlib import Path
+
+import numpy as np
+
+# 논문당 저장할 이웃 수
+NEIGHBORS_K = int(os.environ.get("SIMILAR_PAPERS_K", "20"))
+# co-citation 점수(0~1)에 곱해서 코사인 유사도에 더하는 가중치 (0 = 임베딩만)
+COCITATION_WEIGHT = float(os.environ.get("SIMILAR_PAPERS_COCITATION_WEIGHT", "0.2"))
+# 블록 하나의 (행 × 논문) 점수 원소 수 상한 (float32 64MB)
+_BLOCK_ELEMENTS = 16_000_000
+
+
+def neighbors_path(papers_path: str | Path) -> Path:
+    """papers.json → papers.neighbors.npz"""
+    return Path(papers_path).with_suffix(".neighbors.npz")
+
+
+def cocitation_matrix(citations: list[list[str]]):
+    """논문별 인용한 논문(S2 ID) 목록 → (n, n) sparse co-citation 점수 (Salton 코사인, 대각선 0)
+
+    인용 데이터가 없으면 None
+    """
+    from scipy import sparse
+
+    citing_ids: dict[str, int] = {}
+    rows, cols = [], []
+    for paper_row, citing in enumerate(citations):
+        for s2_id in set(citing or []):
+            rows.append(citing_ids.setdefault(s2_id, len(citing_ids)))
+            cols.append(paper_row)
+    if not rows:
+        return None
+
+    # A: (인용한 논문 × 우리 논문), A^T A = 함께 인용된 횟수
+    a = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                          shape=(len(citing_ids), len(citations)))
+    counts = (a.T @ a).tocsr()
+    counts.setdiag(0)
+    counts.eliminate_zeros()
+    degree = np.asarray(a.sum(axis=0)).ravel()
+    inv = np.zeros_like(degree)
+    inv[degree > 0] = 1.0 / np.sqrt(degree[degree > 0])
+    return sparse.diags(inv) @ counts @ sparse.diags(inv)
+
+
+def build_neighbors(embeddings: np.ndarray, k: int = NEIGHBORS_K, citations: list[list[str]] | None = None,
+                    cocitation_weight: float = COCITATION_WEIGHT) -> tuple[np.ndarray, np.ndarray]:
+    """행마다 자기 자신을 뺀 top-k 이웃 (exact, 블록 단위 행렬곱)
+
+    citations: 행별 인용한 논문 S2 ID 목록 (co-citation 가중치용)
+    Returns: (neighbors (n, k) int32 행 번호, scores (n, k) float16) - 점수 내림차순
+    """
+    from semantic_index import normalize_rows
+
+    matrix = normalize_rows(embeddings)
+    n = len(matrix)
+    k = max(0, min(k, n - 1))
+    neighbors = np.zeros((n, k), dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float16)
+    if k == 0:
+        return neighbors, scores
+
+    cocited = cocitation_matrix(citations) if citations and cocitation_weight else None
+    block = max(1, _BLOCK_ELEMENTS // n)
+    for start in range(0, n, block):
+        end = min(start + block, n)
+        sims = matrix[start:end] @ matrix.T
+        if cocited is not None:
+            sims += cocitation_weight * cocited[start:end].toarray()
+        sims[np.arange(end - start), np.arange(start, end)] = -np.inf  # 자기 자신 제외
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        neighbors[start:end] = np.take_along_axis(top, order, axis=1)
+        scores[start:end] = np.take_along_axis(top_scores, order, axis=1)
+    return neighbors, scores
+
+
+def save_neighbors(path: str | Path, ids, keys, neighbors: np.ndarray, scores: np.ndarray) -> None:
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp.npz")
+    np.savez(tmp, ids=np.asarray(ids, dtype=np.int64), keys=np.asarray(keys, dtype=str),
+             neighbors=neighbors, scores=scores)
+    os.replace(tmp, path)
+
+
+class PaperNeighbors:
+    """저장된 이웃 목록 (build_map 결과 한 버전)
+
+    Usage:
+        table = PaperNeighbors.load("papers.neighbors.npz")
+        table.lookup(snapshot, paper_id, 10)  # [(paper, score)] 또는 None (파일에 없는 논문)
+    """
+
+    def __init__(self, ids: np.ndarray, keys: list[str], neighbors: np.ndarray, scores: np.ndarray):
+        self.ids = ids
+        self.keys = keys
+        self.neighbors = neighbors
+        self.scores = scores
+        self.row_by_id = {int(pid): row for row, pid in enumerate(ids)}
+
+    @classmethod
+    def load(cls, path: str | Path) -> "PaperNeighbors | None":
+        try:
+            with np.load(path) as f:
+                return cls(f["ids"], f["keys"].tolist(), f["neighbors"], f["scores"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    @property
+    def k(self) -> int:
+        return self.neighbors.shape[1]
+
+    def _matches(self, snapshot, row: int) -> dict | None:
+        """파일의 행이 스냅샷의 같은 논문인지 (id가 재사용됐으면 zotero_key가 다름)"""
+        paper = snapshot.get(int(self.ids[row]))
+        if paper is None or paper.get("zotero_key", "") != self.keys[row]:
+            return None
+        return paper
+
+    def lookup(self, snapshot, paper_id: int, top_k: int) -> list[tuple[dict, float]] | None:
+        """미리 계산한 이웃 [(paper, score)] - 이 논문이 파일에 없거나 top_k > k면 None"""
+        row = self.row_by_id.get(paper_id)
+        if row is None or top_k > self.k or self._matches(snapshot, row) is None:
+            return None
+        results = []
+        for neighbor, score in zip(self.neighbors[row], self.scores[row]):
+            paper = self._matches(snapshot, int(neighbor))
+            if paper is not None:  # 빌드 후 삭제된 논문은 건너뜀
+                results.append((paper, float(score)))
+                if len(results) == top_k:
+                    break
+        return results
+
+
+_tables: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def neighbors_for(snapshot, path: str | Path) -> PaperNeighbors | None:
+    """papers_store 스냅샷에 대한 이웃 목록 (스냅샷당 한 번 로드, 파일이 없으면 None)"""
+    if snapshot in _tables:
+        return _tables[snapshot]
+    with _lock:
+        if snapshot not in _tables:
+            _tables[snapshot] = PaperNeighbors.load(path) if Path(path).exists() else None
+        return _tables[snapshot]
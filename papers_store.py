@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Zotero Explorer - In-memory papers.json Store
+- API 서버 프로세스 공용 papers.json 캐시 (요청마다 json.load 하지 않음)
+- 파일 mtime/size가 바뀌면 해시를 비교해서 내용이 다를 때만 다시 파싱
+- 새 스냅샷은 통째로 교체 (읽는 쪽은 항상 완결된 스냅샷 하나를 봄)
+- id / zotero_key / doi / s2_id 인덱스 조회
+- 쓰기는 임시 파일 + os.replace (쓰는 중인 파일을 다른 스레드가 읽지 않음)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_PATH = Path(__file__).parent / "papers.json"
+
+
+class PapersSnapshot:
+    """papers.json 한 버전 (읽기 전용으로 취급 - 수정하려면 PapersStore.copy())"""
+
+    def __init__(self, data, digest: str = ""):
+        self.is_list = isinstance(data, list)  # 예전 형식: papers 목록만 있는 파일
+        self.data = {"papers": data} if self.is_list else data
+        self.papers: list[dict] = self.data.get("papers", [])
+        self.digest = digest
+        self.loaded_at = time.time()
+
+        self.by_id: dict = {}
+        self.by_zotero_key: dict[str, dict] = {}
+        self.by_doi: dict[str, dict] = {}
+        self.by_s2_id: dict[str, dict] = {}
+        for p in self.papers:
+            if p.get("id") is not None:
+                self.by_id[p["id"]] = p
+            if p.get("zotero_key"):
+                self.by_zotero_key[p["zotero_key"]] = p
+            if p.get("doi"):
+                self.by_doi[p["doi"].lower()] = p
+            if p.get("s2_id"):
+                self.by_s2_id[p["s2_id"]] = p
+
+    def get(self, paper_id) -> dict | None:
+        return self.by_id.get(paper_id)
+
+    def by_key(self, zotero_key: str) -> dict | None:
+        return self.by_zotero_key.get(zotero_key)
+
+    def find_doi(self, doi: str) -> dict | None:
+        return self.by_doi.get(doi.lower()) if doi else None
+
+    def find_s2(self, s2_id: str) -> dict | None:
+        return self.by_s2_id.get(s2_id) if s2_id else None
+
+    @property
+    def has_embeddings(self) -> bool:
+        return any(p.get("embedding") for p in self.papers)
+
+
+class PapersStore:
+    """papers.json 파일 하나에 대한 스레드 공용 캐시
+
+    Usage:
+        snap = get_papers_store().snapshot()
+        paper = snap.by_key("ABCD1234")
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._snapshot: PapersSnapshot | None = None
+        self._stat = None  # 마지막으로 확인한 (mtime_ns, size)
+        self.stats = {"loads": 0, "hash_checks": 0, "writes": 0, "last_load_ms": None}
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def snapshot(self) -> PapersSnapshot:
+        """현재 스냅샷 (파일이 바뀌었으면 다시 로드). 파일이 없으면 FileNotFoundError"""
+        stat = self._file_stat()
+        snap = self._snapshot
+        if snap is not None and stat == self._stat:
+            return snap
+
+        with self._lock:
+            stat = self._file_stat()
+            if self._snapshot is not None and stat == self._stat:
+                return self._snapshot
+            if stat is None:
+                raise FileNotFoundError(f"{self.path} not found. Run build_map.py first.")
+
+            start = time.perf_counter()
+            raw = self.path.read_bytes()
+            digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+            if self._snapshot is not None and digest == self._snapshot.digest:
+                # touch 등으로 mtime만 바뀜 → 다시 파싱하지 않음
+                self.stats["hash_checks"] += 1
+            else:
+                self._snapshot = PapersSnapshot(json.loads(raw), digest)
+                self.stats["loads"] += 1
+                self.stats["last_load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            self._stat = stat
+            return self._snapshot
+
+    def exists(self) -> bool:
+        return self._file_stat() is not None
+
+    def copy(self) -> dict | list:
+        """수정용 사본 (papers 목록과 각 paper dict만 복사, embedding 등 값은 공유)"""
+        snap = self.snapshot()
+        papers = [dict(p) for p in snap.papers]
+        return papers if snap.is_list else {**snap.data, "papers": papers}
+
+    def write(self, data: dict | list) -> PapersSnapshot:
+        """papers.json을 원자적으로 쓰고 새 스냅샷으로 교체"""
+        raw = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+        with self._lock:
+            tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(raw)
+            os.replace(tmp, self.path)
+            self._snapshot = PapersSnapshot(data, hashlib.blake2b(raw, digest_size=16).hexdigest())
+            self._stat = self._file_stat()
+            self.stats["writes"] += 1
+            return self._snapshot
+
+    def update(self, fn) -> PapersSnapshot:
+        """read-modify-write: fn(사본 data)로 수정한 결과를 씀 (동시 update끼리 직렬화)"""
+        with self._update_lock:
+            data = self.copy()
+            fn(data)
+            return self.write(data)
+
+    def status(self) -> dict:
+        snap = self._snapshot
+        return {
+            "path": str(self.path),
+            "loaded": snap is not None,
+            "papers": len(snap.papers) if snap else 0,
+            "digest": snap.digest if snap else None,
+            **self.stats,
+        }
+
+
+_stores: dict[Path, PapersStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_papers_store(path: str | Path = DEFAULT_PATH) -> PapersStore:
+    """경로별 프로세스 공용 store"""
+    path = Path(path).resolve()
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = PapersStore(path)
+        return _stores[path]
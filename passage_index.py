@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Zotero Explorer - Passage (Chunk) Index
+- build_map의 weighted 임베딩이 초록/노트 청크마다 계산한 임베딩을 평균 내기 전에 저장 (<output>.passages.npz)
+- 청크 = (paper id, section, chunk 번호, 스니펫), 논문별로 연속된 행
+- 메모리: 정규화한 임베딩을 행별 scale + int8로 양자화 (float32의 1/4, 코사인 오차 ~0.003)
+  스니펫은 UTF-8 바이트 하나로 이어 붙이고 offset 배열로 자름 (Python 문자열 객체 없음)
+- 검색: 블록 단위로 float32로 풀어서 matvec → 논문별 최대 청크 점수 (max-over-chunks)
+"""
+
+import os
+import threading
+import weakref
+from pathlib import Path
+
+import numpy as np
+
+SECTIONS = ("abstract", "notes")
+# 청크당 저장할 스니펫 길이 (문자)
+SNIPPET_CHARS = int(os.environ.get("PASSAGE_SNIPPET_CHARS", "400"))
+# 한 번에 float32로 풀 행 수 (L2 캐시에 맞는 크기)
+_BLOCK_ROWS = 4096
+
+
+def passages_path(papers_path: str | Path) -> Path:
+    """papers.json → papers.passages.npz"""
+    return Path(papers_path).with_suffix(".passages.npz")
+
+
+def quantize_rows(embeddings: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """정규화 후 행별 대칭 int8 양자화 → (int8 행렬, float32 scale)"""
+    from semantic_index import normalize_rows
+
+    matrix = normalize_rows(embeddings)
+    scale = np.abs(matrix).max(axis=1, initial=0.0) / 127.0
+    scale[scale == 0] = 1.0
+    codes = np.round(matrix / scale[:, None]).astype(np.int8)
+    return codes, scale.astype(np.float32)
+
+
+class PassageIndex:
+    """청크 임베딩 색인
+
+    Usage:
+        index = PassageIndex.build(chunks)  # [(paper id, zotero_key, section, chunk 번호, text, embedding)]
+        index.search(query_emb, top_k=20)  # 논문별 가장 잘 맞는 청크
+    """
+
+    def __init__(self, codes, scale, sections, chunk_no, text_offsets, text_bytes, ids, keys, paper_starts):
+        self.codes = codes                # (n_chunks, dim) int8
+        self.scale = scale                # (n_chunks,) float32
+        self.sections = sections          # (n_chunks,) uint8 - SECTIONS 인덱스
+        self.chunk_no = chunk_no          # (n_chunks,) uint16 - 섹션 안 청크 번호
+        self.text_offsets = text_offsets  # (n_chunks + 1,) int64
+        self.text_bytes = text_bytes      # UTF-8 스니펫을 이어 붙인 uint8
+        self.ids = ids                    # (n_papers,) paper id
+        self.keys = keys                  # (n_papers,) zotero_key
+        self.paper_starts = paper_starts  # (n_papers,) 논문별 첫 청크 행
+
+    @classmethod
+    def build(cls, chunks: list[tuple]) -> "PassageIndex":
+        """chunks: [(paper id, zotero_key, section, chunk 번호, text, embedding)] - 같은 논문끼리 연속"""
+        ids, keys, starts, texts = [], [], [], []
+        for row, (paper_id, key, _, _, text, _) in enumerate(chunks):
+            if not ids or ids[-1] != paper_id:
+                ids.append(paper_id)
+                keys.append(key)
+                starts.append(row)
+            texts.append(text[:SNIPPET_CHARS].encode("utf-8"))
+
+        # 블록 단위로 양자화 (청크 전체를 float32 행렬로 만들지 않음)
+        dim = len(chunks[0][5]) if chunks else 0
+        codes = np.empty((len(chunks), dim), dtype=np.int8)
+        scale = np.empty(len(chunks), dtype=np.float32)
+        for start in range(0, len(chunks), _BLOCK_ROWS):
+            end = min(start + _BLOCK_ROWS, len(chunks))
+            codes[start:end], scale[start:end] = quantize_rows(np.asarray([c[5] for c in chunks[start:end]]))
+        return cls(
+            codes=codes,
+            scale=scale,
+            sections=np.asarray([SECTIONS.index(c[2]) for c in chunks], dtype=np.uint8),
+            chunk_no=np.asarray([c[3] for c in chunks], dtype=np.uint16),
+            text_offsets=np.concatenate([[0], np.cumsum([len(t) for t in texts])]).astype(np.int64),
+            text_bytes=np.frombuffer(b"".join(texts), dtype=np.uint8),
+            ids=np.asarray(ids, dtype=np.int64),
+            keys=keys,
+            paper_starts=np.asarray(starts, dtype=np.int64),
+        )
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp, codes=self.codes, scale=self.scale, sections=self.sections,
+                 chunk_no=self.chunk_no, text_offsets=self.text_offsets, text_bytes=self.text_bytes,
+                 ids=self.ids, keys=np.asarray(self.keys, dtype=str), paper_starts=self.paper_starts)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "PassageIndex | None":
+        try:
+            with np.load(path) as f:
+                return cls(f["codes"], f["scale"], f["sections"], f["chunk_no"],
+                           f["text_offsets"], f["text_bytes"], f["ids"], f["keys"].tolist(), f["paper_starts"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.codes, self.scale, self.sections, self.chunk_no,
+                                      self.text_offsets, self.text_bytes, self.paper_starts))
+
+    def snippet(self, row: int) -> str:
+        start, end = self.text_offsets[row], self.text_offsets[row + 1]
+        return self.text_bytes[start:end].tobytes().decode("utf-8", errors="ignore")
+
+    def chunk_scores(self, query_emb) -> np.ndarray:
+        """청크별 코사인 유사도 (int8 블록을 재사용 버퍼에 float32로 풀어서 matvec)"""
+        query = np.asarray(query_emb, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        buf = np.empty((min(_BLOCK_ROWS, len(self.codes)), self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(self.codes), _BLOCK_ROWS):
+            end = min(start + _BLOCK_ROWS, len(self.codes))
+            block = buf[:end - start]
+            np.copyto(block, self.codes[start:end], casting="unsafe")
+            np.matmul(block, query, out=scores[start:end])
+        scores *= self.scale
+        return scores
+
+    def search(self, query_emb, top_k: int = 20, allowed_ids: np.ndarray | None = None) -> list[dict]:
+        """논문별 최고 청크 점수로 상위 top_k 논문
+
+        allowed_ids: paper id로 인덱싱하는 bool 배열 (필터)
+        Returns: [{"id", "key", "score", "section", "chunk", "snippet"}] 점수 내림차순
+        """
+        if not len(self.codes):
+            return []
+        scores = self.chunk_scores(query_emb)
+        paper_scores = np.maximum.reduceat(scores, self.paper_starts)
+        if allowed_ids is not None:
+            in_range = self.ids < len(allowed_ids)
+            allowed = np.zeros(len(self.ids), dtype=bool)
+            allowed[in_range] = allowed_ids[self.ids[in_range]]
+            paper_scores[~allowed] = -np.inf
+            top_k = min(top_k, int(allowed.sum()))
+
+        from semantic_index import SemanticIndex
+
+        paper_ends = np.append(self.paper_starts[1:], len(self.codes))
+        results = []
+        for p in SemanticIndex.top_indices(paper_scores, top_k):
+            start, end = self.paper_starts[p], paper_ends[p]
+            row = start + int(np.argmax(scores[start:end]))
+            results.append({
+                "id": int(self.ids[p]),
+                "key": self.keys[p],
+                "score": float(scores[row]),
+                "section": SECTIONS[self.sections[row]],
+                "chunk": int(self.chunk_no[row]),
+                "snippet": self.snippet(row),
+            })
+        return results
+
+
+_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_latest: tuple | None = None  # ((mtime_ns, size), 마지막으로 로드한 색인)
+_lock = threading.Lock()
+
+
+def passages_for(snapshot, path: str | Path) -> PassageIndex | None:
+    """papers_store 스냅샷에 대한 청크 색인 (파일이 없으면 None)
+
+    태그 동기화처럼 papers.json만 다시 쓰인 스냅샷은 파일이 그대로면 이전 색인을 재사용
+    """
+    global _latest
+    if snapshot in _indexes:
+        return _indexes[snapshot]
+    with _lock:
+        if snapshot not in _indexes:
+            try:
+                st = os.stat(path)
+                stat = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                stat = None
+            if stat is None:
+                index = None
+            elif _latest is not None and _latest[0] == stat:
+                index = _latest[1]
+            else:
+                index = PassageIndex.load(path)
+                _latest = (stat, index)
+            _indexes[snapshot] = index
+        return _indexes[snapshot]
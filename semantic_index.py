@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Zotero Explorer - Semantic Search Index
+- papers.json 스냅샷마다 한 번만 만드는 정규화된 float32 임베딩 행렬 (C-contiguous)
+- 쿼리 = 행렬 × 쿼리 벡터 한 번 (BLAS matvec) + argpartition top-k (전체 정렬 없음)
+- 태그 수정처럼 임베딩이 그대로인 새 스냅샷은 이전 행렬을 재사용
+- 큰 라이브러리는 IVF ANN 인덱스 (build_map이 학습한 중심점 <output>.ann.npz를 로드)
+  요청마다 nprobe로 recall/지연시간 조절, 논문이 뒤에 추가된 스냅샷은 리스트에 증분 삽입
+- 쿼리 임베딩 LRU 캐시 + 같은 쿼리 동시 요청은 모델 호출 한 번으로 합침 (single-flight)
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+# 이 수 이상일 때 ANN 사용 (그 아래는 exact 검색도 수 ms)
+ANN_MIN_PAPERS = int(os.environ.get("SEMANTIC_ANN_MIN_PAPERS", "50000"))
+# 기본 탐색 리스트 수 (요청의 nprobe로 덮어씀, 0 = exact)
+ANN_NPROBE = int(os.environ.get("SEMANTIC_ANN_NPROBE", "16"))
+# 캐시할 쿼리 임베딩 수
+QUERY_CACHE_SIZE = int(os.environ.get("SEMANTIC_QUERY_CACHE_SIZE", "1024"))
+
+
+def ann_path(papers_path: str | Path) -> Path:
+    """papers.json → papers.ann.npz"""
+    return Path(papers_path).with_suffix(".ann.npz")
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.array(matrix, dtype=np.float32)
+    if matrix.size:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0  # 영벡터는 유사도 0
+        matrix /= norms
+    return np.ascontiguousarray(matrix)
+
+
+def assign_lists(centroids: np.ndarray, matrix: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    """각 행의 가장 가까운 중심점 (정규화된 행렬 기준)"""
+    out = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), chunk):
+        out[start:start + chunk] = np.argmax(matrix[start:start + chunk] @ centroids.T, axis=1)
+    return out
+
+
+def train_centroids(matrix: np.ndarray, n_lists: int = 0, seed: int = 42, max_sample: int = 100000) -> np.ndarray:
+    """정규화된 행렬로 IVF 중심점 학습 (구면 k-means, n_lists=0 → sqrt(n))"""
+    from sklearn.cluster import MiniBatchKMeans
+
+    n = len(matrix)
+    n_lists = min(n, n_lists or max(1, int(np.sqrt(n))))
+    rng = np.random.default_rng(seed)
+    sample = matrix[rng.choice(n, max_sample, replace=False)] if n > max_sample else matrix
+    kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, batch_size=4096, n_init=1)
+    kmeans.fit(sample)
+    return normalize_rows(kmeans.cluster_centers_)
+
+
+def build_ann_file(embeddings: np.ndarray, path: str | Path, n_lists: int = 0) -> np.ndarray:
+    """build_map용: 임베딩으로 IVF 중심점을 학습해서 path에 저장 (배정은 서버가 로드할 때 계산)"""
+    centroids = train_centroids(normalize_rows(embeddings), n_lists)
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp.npz")
+    np.savez(tmp, centroids=centroids)
+    os.replace(tmp, path)
+    return centroids
+
+
+def load_centroids(path: str | Path, dim: int) -> np.ndarray | None:
+    """저장된 IVF 중심점 (파일이 없거나 임베딩 차원이 다르면 None)"""
+    try:
+        with np.load(path) as f:
+            centroids = f["centroids"]
+    except (OSError, KeyError, ValueError):
+        return None
+    if centroids.ndim != 2 or centroids.shape[1] != dim:
+        print(f"ANN index {path} does not match embedding dimension, using exact search")
+        return None
+    return normalize_rows(centroids)
+
+
+class IVFIndex:
+    """Inverted-file ANN 인덱스: 중심점 + 리스트별 행 범위
+
+    벡터는 따로 들고 있지 않음 - SemanticIndex.matrix가 리스트 순서로 정렬되어 있어서
+    리스트 하나 = 연속된 행 구간 (gather 없이 구간별 matvec)
+    """
+
+    def __init__(self, centroids: np.ndarray, sorted_assignments: np.ndarray):
+        self.centroids = centroids
+        self.assignments = sorted_assignments
+        self.offsets = np.searchsorted(sorted_assignments, np.arange(len(centroids) + 1))
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def probe(self, query: np.ndarray, nprobe: int) -> list[tuple[int, int]]:
+        """쿼리와 가까운 nprobe개 리스트의 행 구간 [(start, end)]"""
+        scores = self.centroids @ query
+        lists = np.sort(np.argpartition(-scores, nprobe - 1)[:nprobe])
+        return [(self.offsets[l], self.offsets[l + 1]) for l in lists if self.offsets[l] < self.offsets[l + 1]]
+
+
+class SemanticIndex:
+    """임베딩이 있는 논문들의 코사인 유사도 검색
+
+    Usage:
+        index = index_for(get_papers_store().snapshot())
+        for paper, similarity in index.search(query_emb, top_k=20): ...
+    """
+
+    def __init__(self, papers: list[dict], previous: "SemanticIndex | None" = None,
+                 ann_file: str | Path | None = None):
+        with_emb = [p for p in papers if p.get("embedding")]
+        # 재사용 판단용: 임베딩 list 객체 자체 (PapersStore.copy()는 embedding을 복사하지 않음)
+        self._embedding_refs = [p["embedding"] for p in with_emb]
+        self.ann: IVFIndex | None = None
+        self.reused = False
+        self._columns: PaperColumns | None = None
+
+        if previous is not None and previous.is_prefix_of(self._embedding_refs):
+            # matrix/papers의 행 i = with_emb[layout[i]] (ANN이 있으면 리스트 순서로 정렬되어 있음)
+            added = self._embedding_refs[len(previous._embedding_refs):]
+            new_rows = normalize_rows(added)
+            self.matrix = np.vstack([previous.matrix, new_rows]) if added else previous.matrix
+            self.layout = np.concatenate([previous.layout, np.arange(len(previous.layout), len(with_emb))])
+            self.papers = [with_emb[i] for i in self.layout]
+            self.reused = not added
+            if previous.ann is not None:
+                if added:
+                    # 논문이 뒤에 추가됨 → 새 행만 리스트에 배정해서 증분 삽입
+                    self._attach(previous.ann.centroids, np.concatenate(
+                        [previous.ann.assignments, assign_lists(previous.ann.centroids, new_rows)]))
+                else:
+                    self.ann = previous.ann
+            return
+
+        self.matrix = normalize_rows(self._embedding_refs) if self._embedding_refs else np.zeros((0, 0), np.float32)
+        self.layout = np.arange(len(with_emb))
+        self.papers = with_emb
+        if ann_file is not None and len(with_emb) >= ANN_MIN_PAPERS:
+            centroids = load_centroids(ann_file, self.matrix.shape[1])
+            if centroids is not None:
+                self.attach_ann(centroids)
+
+    def attach_ann(self, centroids: np.ndarray) -> None:
+        """IVF 중심점으로 모든 행을 배정하고 리스트 순서로 재배치"""
+        self._attach(centroids, assign_lists(centroids, self.matrix))
+
+    def _attach(self, centroids: np.ndarray, assignments: np.ndarray) -> None:
+        order = np.argsort(assignments, kind="stable")
+        self.matrix = np.ascontiguousarray(self.matrix[order])
+        self.layout = self.layout[order]
+        self.papers = [self.papers[i] for i in order]
+        self.ann = IVFIndex(centroids, assignments[order])
+        self._columns = None
+
+    def is_prefix_of(self, refs: list) -> bool:
+        return len(self._embedding_refs) <= len(refs) and all(
+            a is b for a, b in zip(self._embedding_refs, refs))
+
+    def __len__(self) -> int:
+        return len(self.papers)
+
+    @staticmethod
+    def normalize_query(query_emb) -> np.ndarray:
+        query = np.asarray(query_emb, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        return query / norm if norm > 0 else query
+
+    def similarities(self, query_emb) -> np.ndarray:
+        """모든 논문과의 코사인 유사도 (float32)"""
+        return self.matrix @ self.normalize_query(query_emb)
+
+    @staticmethod
+    def top_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """유사도 내림차순 상위 top_k개 인덱스 (argpartition 후 k개만 정렬)"""
+        n = len(scores)
+        if top_k <= 0 or n == 0:
+            return np.zeros(0, dtype=np.intp)
+        if top_k < n:
+            idx = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            idx = np.arange(n)
+        return idx[np.argsort(-scores[idx], kind="stable")]
+
+    @property
+    def columns(self) -> "PaperColumns":
+        """필터용 컬럼 (처음 필터 검색할 때 한 번 만듦)"""
+        if self._columns is None:
+            self._columns = PaperColumns(self.papers)
+        return self._columns
+
+    def filter_mask(self, filters: dict | None) -> np.ndarray | None:
+        """필터 → 행 mask (필터가 없으면 None)"""
+        return self.columns.mask(filters) if filters else None
+
+    def _use_ann(self, nprobe: int, candidates: int) -> bool:
+        if self.ann is None or nprobe <= 0 or nprobe >= self.ann.n_lists:
+            return False
+        # 필터를 통과한 행이 ANN이 훑을 행 수보다 적으면 그 행들만 exact로 계산하는 게 더 쌈
+        return candidates > len(self) * nprobe / self.ann.n_lists
+
+    def search(self, query_emb, top_k: int = 20, nprobe: int | None = None,
+               mask: np.ndarray | None = None) -> list[tuple[dict, float]]:
+        """Returns: [(paper, similarity)] sorted by similarity (descending)
+
+        nprobe: ANN 인덱스가 있을 때 탐색할 리스트 수 (None = ANN_NPROBE, 0 = exact)
+        mask: filter_mask() 결과 - top-k 선택 전에 적용
+        """
+        if not self.papers:
+            return []
+        nprobe = ANN_NPROBE if nprobe is None else nprobe
+        query = self.normalize_query(query_emb)
+        candidates = np.flatnonzero(mask) if mask is not None else None
+        n_candidates = len(self) if candidates is None else len(candidates)
+        if n_candidates == 0:
+            return []
+
+        if self._use_ann(nprobe, n_candidates):
+            segments = self.ann.probe(query, nprobe)
+            scores = np.concatenate([self.matrix[start:end] @ query for start, end in segments])
+            rows = np.concatenate([np.arange(start, end) for start, end in segments])
+            if mask is not None:
+                keep = mask[rows]
+                rows, scores = rows[keep], scores[keep]
+            # 필터 때문에 결과가 모자라면 아래 exact 검색으로
+            if len(rows) >= min(top_k, n_candidates):
+                return [(self.papers[rows[i]], float(scores[i])) for i in self.top_indices(scores, top_k)]
+
+        if candidates is None:
+            scores = self.matrix @ query
+            return [(self.papers[i], float(scores[i])) for i in self.top_indices(scores, top_k)]
+        # 선택적인 필터는 통과한 행만 계산, 아니면 전체 matvec 후 골라냄
+        scores = self.matrix[candidates] @ query if n_candidates < len(self) // 4 else (self.matrix @ query)[candidates]
+        return [(self.papers[candidates[i]], float(scores[i])) for i in self.top_indices(scores, top_k)]
+
+    def score_matrix(self, query_embs) -> np.ndarray:
+        """(n_papers, n_queries) 유사도 - 모든 쿼리를 행렬곱 한 번으로"""
+        queries = np.asarray(query_embs, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return self.matrix @ np.ascontiguousarray((queries / norms).T)
+
+    def search_many(self, query_embs, top_k: int = 20,
+                    mask: np.ndarray | None = None) -> list[list[tuple[dict, float]]]:
+        """여러 쿼리 exact 검색 (쿼리마다 [(paper, similarity)])"""
+        if not self.papers:
+            return [[] for _ in query_embs]
+        scores = self.score_matrix(query_embs)
+        rows = np.arange(len(self))
+        if mask is not None:
+            rows = np.flatnonzero(mask)
+            scores = scores[rows]
+        results = []
+        for j in range(scores.shape[1]):
+            column = scores[:, j]
+            results.append([(self.papers[rows[i]], float(column[i])) for i in self.top_indices(column, top_k)])
+        return results
+
+    def scores_by_id(self, query_embs, dtype=np.float16, mask: np.ndarray | None = None) -> np.ndarray:
+        """(n_queries, max_id + 1) 유사도, 열 = paper id (임베딩 없거나 필터에 걸린 id는 NaN) - 클라이언트 fusion용"""
+        ids = np.fromiter((p["id"] for p in self.papers), dtype=np.int64, count=len(self.papers))
+        out = np.full((len(query_embs), int(ids.max()) + 1 if len(ids) else 0), np.nan, dtype=dtype)
+        if len(ids):
+            scores = self.score_matrix(query_embs)
+            if mask is not None:
+                ids, scores = ids[mask], scores[mask]
+            out[:, ids] = scores.T
+        return out
+
+    def mode(self, nprobe: int | None = None, mask: np.ndarray | None = None) -> str:
+        nprobe = ANN_NPROBE if nprobe is None else nprobe
+        return "ann" if self._use_ann(nprobe, len(self) if mask is None else int(mask.sum())) else "exact"
+
+
+class PaperColumns:
+    """필터 조건용 컬럼 배열 (SemanticIndex.papers와 같은 행 순서)"""
+
+    def __init__(self, papers: list[dict]):
+        n = len(papers)
+        self.year = np.fromiter((p.get("year") if p.get("year") else np.nan for p in papers), dtype=np.float64, count=n)
+        self.cluster = np.fromiter((p.get("cluster") if p.get("cluster") is not None else -1 for p in papers),
+                                   dtype=np.int64, count=n)
+        self.venue_quality = np.fromiter((p.get("venue_quality") or 0.0 for p in papers), dtype=np.float32, count=n)
+        self.is_paper = np.fromiter((bool(p.get("is_paper")) for p in papers), dtype=bool, count=n)
+        self.has_notes = np.fromiter((bool(p.get("has_notes")) for p in papers), dtype=bool, count=n)
+
+        # 태그 → 행 번호 (프론트엔드와 같이 ; , 로 나누고 대소문자 무시)
+        tag_rows: dict[str, list[int]] = {}
+        for i, p in enumerate(papers):
+            for tag in re.split(r"[;,]", p.get("tags") or ""):
+                tag = tag.strip().lower()
+                if tag:
+                    tag_rows.setdefault(tag, []).append(i)
+        self.tag_rows = {tag: np.asarray(rows, dtype=np.int64) for tag, rows in tag_rows.items()}
+        self.size = n
+
+    def mask(self, filters: dict) -> np.ndarray:
+        """filters: year_min, year_max, clusters, tags (모두 포함), min_venue_quality, is_paper, has_notes
+
+        연도 없는 논문은 연도 필터를 통과 (프론트엔드 필터와 동일)
+        """
+        mask = np.ones(self.size, dtype=bool)
+        if filters.get("year_min") is not None:
+            mask &= np.isnan(self.year) | (self.year >= filters["year_min"])
+        if filters.get("year_max") is not None:
+            mask &= np.isnan(self.year) | (self.year <= filters["year_max"])
+        if filters.get("clusters"):
+            mask &= np.isin(self.cluster, list(filters["clusters"]))
+        for tag in filters.get("tags") or ():
+            tagged = np.zeros(self.size, dtype=bool)
+            rows = self.tag_rows.get(tag.strip().lower())
+            if rows is not None:
+                tagged[rows] = True
+            mask &= tagged
+        if filters.get("min_venue_quality") is not None:
+            mask &= self.venue_quality >= filters["min_venue_quality"]
+        if filters.get("is_paper") is not None:
+            mask &= self.is_paper == bool(filters["is_paper"])
+        if filters.get("has_notes") is not None:
+            mask &= self.has_notes == bool(filters["has_notes"])
+        return mask
+
+
+_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_columns: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_latest: SemanticIndex | None = None
+_lock = threading.Lock()
+
+
+def columns_for(snapshot) -> PaperColumns:
+    """스냅샷 전체 논문(임베딩 없는 논문 포함)에 대한 필터 컬럼 (snapshot.papers 행 순서, 스냅샷당 한 번)"""
+    columns = _columns.get(snapshot)
+    if columns is not None:
+        return columns
+    with _lock:
+        columns = _columns.get(snapshot)
+        if columns is None:
+            columns = _columns[snapshot] = PaperColumns(snapshot.papers)
+        return columns
+
+
+def index_for(snapshot, ann_file: str | Path | None = None) -> SemanticIndex:
+    """papers_store 스냅샷에 대한 검색 인덱스 (스냅샷당 한 번 생성, 스냅샷이 사라지면 같이 해제)
+
+    ann_file: build_map이 만든 IVF 중심점 (ann_path(papers.json))
+    """
+    global _latest
+    index = _indexes.get(snapshot)
+    if index is not None:
+        return index
+    with _lock:
+        index = _indexes.get(snapshot)
+        if index is None:
+            index = SemanticIndex(snapshot.papers, previous=_latest, ann_file=ann_file)
+            _indexes[snapshot] = index
+            _latest = index
+        return index
+
+
+def normalize_query_text(query: str) -> str:
+    """캐시 키용 쿼리 정규화 (NFKC + 공백 정리) - 모델에도 정규화된 텍스트를 넣음"""
+    return " ".join(unicodedata.normalize("NFKC", query).split())
+
+
+class QueryEmbeddingCache:
+    """쿼리 임베딩 LRU 캐시 (키: 모델 이름 + 정규화된 쿼리)
+
+    같은 쿼리가 동시에 들어오면 첫 요청만 모델을 돌리고 나머지는 그 결과를 기다림.
+
+    Usage:
+        cache = QueryEmbeddingCache(lambda texts: model.encode(texts), "model-name")
+        query_emb = cache.get("haptic feedback")
+    """
+
+    def __init__(self, encode, model_name: str, max_size: int = QUERY_CACHE_SIZE):
+        self.encode = encode  # list[str] -> (n, dim) array
+        self.model_name = model_name
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._cache: OrderedDict = OrderedDict()
+        self._inflight: dict[tuple, dict] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0, "encode_s": 0.0, "saved_s": 0.0}
+
+    def _avg_encode_s(self) -> float:
+        return self.stats["encode_s"] / self.stats["misses"] if self.stats["misses"] else 0.0
+
+    def get(self, query: str) -> np.ndarray:
+        """쿼리 임베딩 (읽기 전용 float32 배열)"""
+        return self.get_many([query])[0]
+
+    def get_many(self, queries: list[str]) -> list[np.ndarray]:
+        """여러 쿼리 임베딩 - 캐시에 없는 것만 모델 호출 한 번으로 배치 인코딩"""
+        keys = [(self.model_name, normalize_query_text(q)) for q in queries]
+        found: dict[tuple, np.ndarray] = {}
+        waiting: dict[tuple, dict] = {}
+        leading: dict[tuple, dict] = {}
+
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                emb = self._cache.get(key)
+                if emb is not None:
+                    self._cache.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["saved_s"] += self._avg_encode_s()
+                    found[key] = emb
+                elif key in self._inflight:
+                    self.stats["coalesced"] += 1
+                    waiting[key] = self._inflight[key]
+                else:
+                    leading[key] = self._inflight[key] = {"done": threading.Event(), "emb": None, "error": None}
+
+        if leading:
+            texts = [key[1] for key in leading]
+            start = time.perf_counter()
+            try:
+                embs = np.asarray(self.encode(texts), dtype=np.float32)
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                    for key in leading:
+                        del self._inflight[key]
+                for flight in leading.values():
+                    flight["error"] = e
+                    flight["done"].set()
+                raise
+
+            with self._lock:
+                self.stats["misses"] += len(leading)
+                self.stats["encode_s"] += time.perf_counter() - start
+                for key, emb in zip(leading, embs):
+                    emb = emb.copy()
+                    emb.setflags(write=False)  # 캐시 공유 → 호출한 쪽에서 수정하지 못하게
+                    found[key] = self._cache[key] = emb
+                    del self._inflight[key]
+                while len(self._cache) > self.max_size:
+                    self._cache.popitem(last=False)
+            for key, flight in leading.items():
+                flight["emb"] = found[key]
+                flight["done"].set()
+
+        for key, flight in waiting.items():
+            flight["done"].wait()
+            if flight["error"] is not None:
+                raise flight["error"]
+            found[key] = flight["emb"]
+        if waiting:
+            with self._lock:
+                self.stats["saved_s"] += self._avg_encode_s() * len(waiting)
+
+        return [found[key] for key in keys]
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+            return {
+                "model": self.model_name,
+                "size": len(self._cache),
+                "max_size": self.max_size,
+                "hits": self.stats["hits"],
+                "misses": self.stats["misses"],
+                "coalesced": self.stats["coalesced"],
+                "errors": self.stats["errors"],
+                "hit_rate": round((self.stats["hits"] + self.stats["coalesced"]) / lookups, 4) if lookups else 0.0,
+                "avg_encode_ms": round(self._avg_encode_s() * 1000, 2),
+                "saved_encode_ms": round(self.stats["saved_s"] * 1000, 1),
+            }
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Zotero Explorer - Write-behind Tag Queue
+- API 서버의 태그 편집을 바로 응답하고 Zotero 쓰기는 뒤에서 모아서 처리
+- 같은 아이템의 연속 편집(starred 토글 등)은 하나로 합침 (coalescing)
+- SQLite에 저장 → 서버가 재시작돼도 밀린 편집을 잃지 않음
+- 최대 50개씩 zotero_api.batch_update_items로 flush, 실패하면 backoff 후 재시도
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from zotero_api import batch_update_items, fetch_items_by_keys
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tag_queue (
+    item_key TEXT PRIMARY KEY,
+    op TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    last_error TEXT
+);
+"""
+
+
+def merge_op(op: dict | None, replace: list[str] | None = None,
+             add: list[str] = (), remove: list[str] = ()) -> dict:
+    """대기 중인 편집(op)에 새 편집을 합침
+
+    op = {"replace": 전체 태그 또는 None, "add": [...], "remove": [...]}
+    replace가 있으면 add/remove는 그 안에 반영되어 항상 비어 있음
+    """
+    if op is None or replace is not None:
+        op = {"replace": list(replace) if replace is not None else None, "add": [], "remove": []}
+    else:
+        op = {"replace": op["replace"], "add": list(op["add"]), "remove": list(op["remove"])}
+
+    for tag in add:
+        if tag in op["remove"]:
+            op["remove"].remove(tag)
+        target = op["replace"] if op["replace"] is not None else op["add"]
+        if tag not in target:
+            target.append(tag)
+    for tag in remove:
+        if op["replace"] is not None:
+            op["replace"] = [t for t in op["replace"] if t != tag]
+            continue
+        if tag in op["add"]:
+            op["add"].remove(tag)
+        if tag not in op["remove"]:
+            op["remove"].append(tag)
+    return op
+
+
+def apply_op(tags: list[dict], op: dict) -> list[dict]:
+    """현재 태그(Zotero 형식 [{tag, type}])에 편집 적용 (기존 태그의 type 유지)"""
+    by_name = {t['tag']: t for t in tags}
+    if op["replace"] is not None:
+        return [by_name.get(name, {'tag': name}) for name in op["replace"]]
+    result = [t for t in tags if t['tag'] not in op["remove"]]
+    result += [{'tag': name} for name in op["add"] if name not in by_name]
+    return result
+
+
+class TagWriteQueue:
+    """Zotero 태그 쓰기 write-behind 큐 (스레드 간 공유 가능)
+
+    Usage:
+        queue = TagWriteQueue(path)
+        queue.enqueue(key, add=["starred"])
+        queue.start(zotero_client, get_mirror, on_flushed=update_papers_json_tags_bulk)
+    """
+
+    def __init__(self, path: str | Path, flush_interval: float = 2.0, batch_size: int = 50,
+                 max_backoff: float = 300):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM tag_queue").fetchone()[0]
+
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.stats = {
+            "flushes": 0,
+            "written": 0,
+            "failed": 0,
+            "dropped": 0,
+            "last_flush_at": None,
+            "last_flush_ms": None,
+            "last_flush_items": 0,
+            "last_error": None,
+        }
+
+    # --- enqueue ---
+
+    def enqueue(self, key: str, replace: list[str] | None = None,
+                add: list[str] = (), remove: list[str] = ()) -> dict:
+        """편집 추가 (같은 아이템의 대기 중 편집과 합침). Returns: 합쳐진 op"""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT op FROM tag_queue WHERE item_key = ?", (key,)).fetchone()
+            op = merge_op(json.loads(row[0]) if row else None, replace, add, remove)
+            self._seq += 1
+            if row:
+                # 새 편집은 바로 시도 (이전 실패의 backoff 초기화)
+                self._conn.execute(
+                    "UPDATE tag_queue SET op = ?, seq = ?, attempts = 0, next_attempt = 0 WHERE item_key = ?",
+                    (json.dumps(op), self._seq, key),
+                )
+            else:
+                self._conn.execute(
+                    "INSERT INTO tag_queue (item_key, op, seq, enqueued_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(op), self._seq, time.time()),
+                )
+            depth = self._conn.execute("SELECT COUNT(*) FROM tag_queue").fetchone()[0]
+        if depth >= self.batch_size:
+            self._wake.set()  # 한 배치가 차면 interval을 기다리지 않음
+        return op
+
+    def pending_op(self, key: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT op FROM tag_queue WHERE item_key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # --- flush ---
+
+    def _due(self) -> list[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT item_key, op, seq, attempts FROM tag_queue WHERE next_attempt <= ? "
+                "ORDER BY enqueued_at LIMIT ?",
+                (time.time(), self.batch_size),
+            ).fetchall()
+
+    def _retry_later(self, rows: list[tuple], errors: dict) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            for key, _, seq, attempts in rows:
+                delay = min(self.max_backoff, 2 ** attempts)
+                self._conn.execute(
+                    "UPDATE tag_queue SET attempts = attempts + 1, next_attempt = ?, last_error = ? "
+                    "WHERE item_key = ? AND seq = ?",
+                    (now + delay, json.dumps(errors.get(key)), key, seq),
+                )
+
+    def _remove(self, rows: list[tuple]) -> None:
+        """flush된 편집 삭제 (flush 중 새 편집이 들어온 아이템은 남김)"""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM tag_queue WHERE item_key = ? AND seq = ?",
+                                   [(key, seq) for key, _, seq, _ in rows])
+
+    def flush(self, zot, store) -> dict | None:
+        """due 편집을 최대 batch_size개 Zotero에 쓰기
+
+        Returns: {"written", "failed", "dropped", "tags": key -> 새 태그 목록} (대기 편집 없으면 None)
+        """
+        with self._flush_lock:
+            rows = self._due()
+            if not rows:
+                return None
+
+            start = time.perf_counter()
+            keys = [r[0] for r in rows]
+            result = {"written": 0, "failed": 0, "dropped": 0, "tags": {}}
+            try:
+                items = fetch_items_by_keys(zot, keys, store=store)
+
+                # 라이브러리에서 삭제된 아이템의 편집은 버림
+                gone = [r for r in rows if r[0] not in items]
+                self._remove(gone)
+                result["dropped"] = len(gone)
+                rows = [r for r in rows if r[0] in items]
+
+                ops = {key: json.loads(op) for key, op, _, _ in rows}
+                to_write = []
+                for key, op in ops.items():
+                    item = items[key]
+                    tags = apply_op(item['data'].get('tags', []), op)
+                    to_write.append({**item, 'data': {**item['data'], 'tags': tags}})
+
+                # 버전 충돌이면 batch_update_items가 최신 태그에 편집을 다시 적용해서 재시도
+                batch_result = batch_update_items(
+                    zot, to_write, batch_size=self.batch_size, store=store,
+                    compute_tags=lambda item: apply_op(item['data'].get('tags', []), ops[item['key']]),
+                )
+                failed = set(batch_result["failed_keys"])
+                for item in to_write:
+                    key = item['key']
+                    if key in failed:
+                        continue
+                    result["tags"][key] = [t['tag'] for t in batch_result["tags"][key]]
+
+                written = [r for r in rows if r[0] not in failed]
+                self._remove(written)
+                # flush 중 들어온 편집이 있으면 미러에 다시 반영 (다음 flush에서 씀)
+                for key in result["tags"]:
+                    op = self.pending_op(key)
+                    if op is not None:
+                        self.apply_locally(store, key, op)
+
+                retry = [r for r in rows if r[0] in failed]
+                # 버전 충돌(412)이면 미러 사본이 오래된 것 → 다음 시도 때 다시 받아옴
+                stale = [key for key, _, _, _ in retry if batch_result["errors"].get(key, {}).get("code") == 412]
+                store.delete_items(stale)
+                self._retry_later(retry, batch_result["errors"])
+
+                result["written"] = len(written)
+                result["failed"] = len(retry)
+                error = next(iter(batch_result["errors"].values()), None)
+            except Exception as e:
+                print(f"Tag queue flush failed: {e}")
+                self._retry_later(rows, {r[0]: {"message": str(e)} for r in rows})
+                result["failed"] = len(rows)
+                error = {"message": str(e)}
+
+            with self._lock:
+                self.stats["flushes"] += 1
+                self.stats["written"] += result["written"]
+                self.stats["failed"] += result["failed"]
+                self.stats["dropped"] += result["dropped"]
+                self.stats["last_flush_at"] = datetime.now().isoformat(timespec="seconds")
+                self.stats["last_flush_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                self.stats["last_flush_items"] = len(rows)
+                if error:
+                    self.stats["last_error"] = error
+            return result
+
+    @staticmethod
+    def apply_locally(store, key: str, op: dict) -> list[str] | None:
+        """편집을 미러에 바로 반영 (버전은 그대로 → Zotero 쓰기 전까지 미러 태그만 앞서감)
+
+        Returns: 새 태그 목록 (미러에 없는 아이템이면 None)
+        """
+        item = store.get_item(key)
+        if item is None:
+            return None
+        tags = apply_op(item['data'].get('tags', []), op)
+        store.record_write(key, item['version'], {'tags': tags})
+        return [t['tag'] for t in tags]
+
+    # --- background flusher ---
+
+    def start(self, client_factory, store_factory, on_flushed=None) -> None:
+        """백그라운드 flush 스레드 시작 (이미 실행 중이면 무시)
+
+        client_factory: with client_factory() as zot 형태 (zotero_pool.zotero_client)
+        store_factory: zot -> ZoteroStore
+        on_flushed: Callback function(tags_by_key) - 쓰기 성공한 아이템의 새 태그
+        """
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                try:
+                    while self._due():
+                        with client_factory() as zot:
+                            result = self.flush(zot, store_factory(zot))
+                        if result and result["tags"] and on_flushed:
+                            on_flushed(result["tags"])
+                        if not result or not result["written"]:
+                            break  # 전부 실패 → backoff 동안 대기
+                except Exception as e:
+                    print(f"Tag queue error: {e}")
+
+        self._thread = threading.Thread(target=run, name="tag-queue", daemon=True)
+        self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    # --- status ---
+
+    def status(self) -> dict:
+        with self._lock:
+            depth, oldest, retrying = self._conn.execute(
+                "SELECT COUNT(*), MIN(enqueued_at), SUM(attempts > 0) FROM tag_queue"
+            ).fetchone()
+            return {
+                "depth": depth,
+                "retrying": retrying or 0,
+                "oldest_age_s": round(time.time() - oldest, 1) if oldest else None,
+                **self.stats,
+            }
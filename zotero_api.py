@@ -5,11 +5,19 @@ Zotero API wrapper using pyzotero
 - Update tags on items
 """
 
+from __future__ import annotations
+
 import os
 import re
+import threading
+import time
 from pathlib import Path
-from typing import Optional
-from pyzotero import zotero
+from typing import TYPE_CHECKING, Optional
+
+# pyzotero는 import만으로 수백 ms가 걸리므로 클라이언트를 만들 때 로드
+if TYPE_CHECKING:
+    from pyzotero import zotero
+    from zotero_store import ZoteroStore
 
 
 def extract_year(date_str: str) -> str:
@@ -43,9 +51,15 @@ if env_path.exists():
 def get_zotero_client(
     library_id: Optional[str] = None,
     api_key: Optional[str] = None,
-    library_type: Optional[str] = None
+    library_type: Optional[str] = None,
+    client=None,
 ) -> zotero.Zotero:
-    """Get authenticated Zotero client"""
+    """Get authenticated Zotero client
+
+    client: 공유할 httpx 클라이언트 (zotero_pool에서 연결 풀 공유용). 없으면 pyzotero가 새로 만듦
+    """
+    from pyzotero import zotero
+
     library_id = library_id or os.environ.get("ZOTERO_LIBRARY_ID")
     api_key = api_key or os.environ.get("ZOTERO_API_KEY")
     library_type = library_type or os.environ.get("ZOTERO_LIBRARY_TYPE", "user")
@@ -55,10 +69,304 @@ def get_zotero_client(
             "ZOTERO_LIBRARY_ID and ZOTERO_API_KEY must be set in .env or passed as arguments"
         )
 
-    return zotero.Zotero(library_id, library_type, api_key)
+    return zotero.Zotero(library_id, library_type, api_key, client=client)
+
+
+ZOTERO_PAGE_SIZE = 100  # Zotero API 최대 limit
+
 
+def http_client(zot: zotero.Zotero):
+    """zot이 쓰는 HTTP 클라이언트 (raw 요청도 같은 keep-alive 연결 재사용)
+
+    requests 기반 구버전 pyzotero면 requests 세션 (get/patch/post 시그니처 동일)
+    """
+    client = getattr(zot, "client", None)
+    if client is None:
+        import requests
+
+        client = zot.client = requests.Session()
+    return client
+
+
+def backoff_seconds(headers) -> float | None:
+    """Zotero Backoff / Retry-After 헤더 (초)"""
+    for name in ("Backoff", "Retry-After"):
+        value = headers.get(name)
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    return None
+
+
+class ConcurrentPager:
+    """Zotero API 페이지를 병렬로 가져오는 fetcher
+
+    pyzotero 클라이언트는 요청 상태(url_params)를 공유해서 스레드 안전하지 않으므로
+    zot의 endpoint/라이브러리/API 키로 zot의 HTTP 클라이언트(httpx, 스레드 안전)를 직접 사용한다.
+    (zotero_pool 클라이언트면 프로세스 공용 keep-alive 연결 풀)
+    - 전체 동시 요청은 max_workers, 스트림(top/notes/attachments)별로는 per_stream 이하
+    - Backoff / Retry-After를 지키고, throttle 되면 동시성을 절반으로 줄임
+      (throttle 없이 성공이 이어지면 1씩 회복)
+
+    Usage:
+        pager = ConcurrentPager(zot)
+        pages = pager.fetch({"items": ("items/top", {}), "notes": ("items", {"itemType": "note"})})
+    """
 
-def fetch_all_items(zot: zotero.Zotero, include_notes: bool = True, include_pdfs: bool = True, on_progress=None) -> list[dict]:
+    def __init__(self, zot: zotero.Zotero, max_workers: int = 8, per_stream: int = 4,
+                 max_retries: int = 5, timeout: float = 60):
+        self.base_url = f"{zot.endpoint}/{zot.library_type}/{zot.library_id}"
+        self.http = http_client(zot)
+        self.request_headers = {"Zotero-API-Key": zot.api_key, "Zotero-API-Version": "3"}
+
+        self.max_workers = max_workers
+        self.per_stream = per_stream
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self.limit = max_workers  # 현재 허용 동시 요청 수 (throttle 시 감소)
+        self.active = 0
+        self.backoff_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.headers = {}  # 스트림별 첫 페이지 응답 헤더
+        self._streak = 0
+        self._cond = threading.Condition()
+
+    def _acquire(self) -> None:
+        with self._cond:
+            while True:
+                wait = self.backoff_until - time.time()
+                if wait > 0:
+                    self._cond.wait(wait)
+                elif self.active < self.limit:
+                    self.active += 1
+                    return
+                else:
+                    self._cond.wait()
+
+    def _release(self, delay: float | None) -> None:
+        with self._cond:
+            self.active -= 1
+            self.requests += 1
+            now = time.time()
+            if delay:
+                # 이미 backoff 중이면 (같은 throttle에 대한 동시 응답) 한 번만 줄임
+                if now >= self.backoff_until:
+                    self.limit = max(1, self.limit // 2)
+                    self.throttled += 1
+                    print(f"  Throttled by Zotero: waiting {delay:.0f}s, concurrency → {self.limit}")
+                self.backoff_until = max(self.backoff_until, now + delay)
+                self._streak = 0
+            else:
+                self._streak += 1
+                if self._streak >= 2 * self.limit and self.limit < self.max_workers:
+                    self.limit += 1
+                    self._streak = 0
+            self._cond.notify_all()
+
+    def get(self, path: str, params: dict | None = None):
+        """GET {library}/{path} (throttle 시 재시도)"""
+        return self.request("GET", path, params=params)
+
+    def request(self, method: str, path: str, params: dict | None = None, json=None):
+        """{library}/{path} 요청 (동시성 제한 + throttle 시 재시도, batch_update_items의 쓰기에도 사용)"""
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            delay = None
+            try:
+                resp = self.http.request(method, f"{self.base_url}/{path}", params=params, json=json,
+                                         headers=self.request_headers, timeout=self.timeout)
+                delay = backoff_seconds(resp.headers)
+                if resp.status_code in (429, 503) and not delay:
+                    delay = 2 ** attempt
+            finally:
+                self._release(delay)
+            if resp.status_code in (429, 503) and attempt < self.max_retries:
+                continue
+            resp.raise_for_status()
+            return resp
+
+    def fetch(self, streams: dict, on_progress=None) -> dict[str, list]:
+        """여러 스트림을 동시에 페이징
+
+        Args:
+            streams: name -> (path, params), 예: {"items": ("items/top", {})}
+            on_progress: Callback function(current, total) (전체 스트림 합계)
+
+        Returns: name -> items (API 순서대로 재조립, 중복 키 제거)
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        pages = {name: {} for name in streams}
+        totals = {}
+        semaphores = {name: threading.Semaphore(self.per_stream) for name in streams}
+        lock = threading.Lock()
+
+        def fetch_page(name: str, start: int):
+            path, params = streams[name]
+            with semaphores[name]:
+                resp = self.get(path, {"format": "json", **params, "limit": ZOTERO_PAGE_SIZE, "start": start})
+            batch = resp.json()
+            with lock:
+                pages[name][start] = batch
+                current = sum(len(b) for p in pages.values() for b in p.values())
+                total = sum(totals.values())
+            if on_progress:
+                on_progress(current, max(total, current))
+            return resp
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # 1. 스트림별 첫 페이지 → Total-Results로 나머지 offset 결정
+            first_pages = {pool.submit(fetch_page, name, 0): name for name in streams}
+            rest = []
+            for future in as_completed(first_pages):
+                name = first_pages[future]
+                resp = future.result()
+                self.headers[name] = resp.headers
+                with lock:
+                    totals[name] = int(resp.headers.get("Total-Results", len(pages[name][0])))
+                for start in range(ZOTERO_PAGE_SIZE, totals[name], ZOTERO_PAGE_SIZE):
+                    rest.append(pool.submit(fetch_page, name, start))
+            # 2. 나머지 페이지
+            for future in rest:
+                future.result()
+
+        results = {}
+        for name, by_start in pages.items():
+            seen = set()
+            results[name] = []
+            for start in sorted(by_start):
+                for item in by_start[start]:
+                    if item["key"] not in seen:
+                        seen.add(item["key"])
+                        results[name].append(item)
+        return results
+
+
+def sync_store(zot: zotero.Zotero, store: ZoteroStore, on_progress=None) -> dict:
+    """로컬 저장소를 라이브러리 버전 기준으로 증분 동기화
+
+    store.library_version 이후 변경된 아이템(노트/첨부/휴지통 포함)만 받아오고
+    /deleted로 삭제된 키를 반영한다. 변경이 없으면 요청 1번으로 끝난다.
+    저장소가 이미 있으면 format=versions 목록(key -> 버전, 요청 1번)과 로컬 버전을 비교해서
+    버전이 다른 아이템의 JSON만 받는다 (이 프로세스가 방금 쓴 아이템은 다시 받지 않음).
+
+    Returns: {"since", "version", "changed", "fetched", "deleted", "requests"}
+    """
+    since = store.library_version
+    pager = ConcurrentPager(zot)
+    progress = (lambda cur, tot: on_progress(cur, tot, f"Fetching changed items ({cur}/{tot})...")) \
+        if on_progress else None
+
+    if since == 0:
+        # 첫 동기화: 전체를 페이지(100개) 단위로
+        # 첫 페이지 응답의 Last-Modified-Version을 기준 버전으로 사용
+        # (페이징 중 바뀐 아이템은 다음 동기화에서 다시 받음)
+        changed = pager.fetch({"changed": ("items", {"includeTrashed": 1})}, on_progress=progress)["changed"]
+        version = int(pager.headers["changed"].get("Last-Modified-Version", since))
+        n_changed = len(changed)
+    else:
+        resp = pager.get("items", {"since": since, "format": "versions", "includeTrashed": 1})
+        version = int(resp.headers.get("Last-Modified-Version", since))
+        if version == since:
+            store.mark_synced(version)
+            print(f"Local store up to date (library version {version})")
+            return {"since": since, "version": version, "changed": 0, "fetched": 0, "deleted": 0,
+                    "requests": pager.requests}
+
+        remote_versions = resp.json()
+        local_versions = store.item_versions(list(remote_versions))
+        stale = [key for key, v in remote_versions.items() if local_versions.get(key) != v]
+        n_changed = len(remote_versions)
+
+        # 전체 JSON은 버전이 다른 아이템만 (itemKey는 요청당 최대 50개, 동시에 받음)
+        chunk = ZOTERO_PAGE_SIZE // 2
+        streams = {f"keys{i}": ("items", {"itemKey": ",".join(stale[i:i + chunk]), "includeTrashed": 1})
+                   for i in range(0, len(stale), chunk)}
+        pages = pager.fetch(streams, on_progress=progress) if streams else {}
+        changed = [item for page in pages.values() for item in page]
+
+    print(f"{n_changed} items changed since library version {since}, fetched {len(changed)}")
+
+    # 라이브러리가 바뀐 경우에만 컬렉션/삭제 목록 확인
+    collections = pager.fetch({"collections": ("collections", {"since": since})})["collections"]
+    deleted = {}
+    if since > 0:
+        deleted = pager.get("deleted", {"since": since}).json()
+    deleted_keys = deleted.get("items", [])
+
+    store.apply_changes(changed, deleted_keys, version,
+                        collections=collections, deleted_collections=deleted.get("collections", []))
+    print(f"Local store: {len(changed)} changed, {len(deleted_keys)} deleted, "
+          f"{len(collections)} collections → library version {version}")
+    return {"since": since, "version": version, "changed": n_changed, "fetched": len(changed),
+            "deleted": len(deleted_keys), "requests": pager.requests}
+
+
+def sync_store_if_stale(zot: zotero.Zotero, store: ZoteroStore, max_age: float = 30) -> ZoteroStore:
+    """마지막 동기화가 max_age초보다 오래됐으면 증분 동기화 (실패하면 기존 사본 사용)
+
+    동기화는 store당 한 스레드만: 사본이 있으면 다른 스레드는 기다리지 않고 기존 사본을 쓰고,
+    아직 한 번도 동기화하지 않았으면 (전체 다운로드) 끝날 때까지 기다림
+    """
+    age = store.seconds_since_sync()
+    if age is not None and age <= max_age:
+        return store
+    if not store.sync_lock.acquire(blocking=age is None):
+        return store
+    try:
+        # 기다리는 동안 다른 스레드가 동기화했을 수 있음
+        age = store.seconds_since_sync()
+        if age is None or age > max_age:
+            try:
+                sync_store(zot, store)
+            except Exception as e:
+                if age is None:
+                    raise
+                print(f"Local store sync failed, serving cached copy ({age:.0f}s old): {e}")
+    finally:
+        store.sync_lock.release()
+    return store
+
+
+def attach_notes(items: list[dict], all_notes: list[dict]) -> None:
+    """parentItem 기준으로 노트를 item['_notes']에 연결"""
+    notes_by_parent = {}
+    for note in all_notes:
+        parent_key = note['data'].get('parentItem')
+        if parent_key:
+            if parent_key not in notes_by_parent:
+                notes_by_parent[parent_key] = []
+            notes_by_parent[parent_key].append(note)
+
+    for item in items:
+        item['_notes'] = notes_by_parent.get(item['key'], [])
+
+
+def attach_pdfs(items: list[dict], all_attachments: list[dict]) -> None:
+    """PDF 첨부 키를 item['_pdf_key']에 연결 (Zotero deep link용)"""
+    pdfs_by_parent = {}
+    for att in all_attachments:
+        data = att['data']
+        if data.get('contentType') == 'application/pdf':
+            parent_key = data.get('parentItem')
+            att_key = att['key']  # Attachment key for zotero://open-pdf
+            if parent_key and att_key:
+                # Prefer first PDF (usually the main one)
+                if parent_key not in pdfs_by_parent:
+                    pdfs_by_parent[parent_key] = att_key
+
+    print(f"Found {len(pdfs_by_parent)} PDFs total")
+
+    for item in items:
+        item['_pdf_key'] = pdfs_by_parent.get(item['key'], '')
+
+
+def fetch_all_items(zot: zotero.Zotero, include_notes: bool = True, include_pdfs: bool = True,
+                    on_progress=None, store: ZoteroStore | None = None) -> list[dict]:
     """Fetch all items from library with optional progress callback
 
     Args:
@@ -66,102 +374,49 @@ def fetch_all_items(zot: zotero.Zotero, include_notes: bool = True, include_pdfs
         include_notes: Whether to fetch notes for each item
         include_pdfs: Whether to fetch PDF attachment URLs
         on_progress: Callback function(current, total, message) for progress updates
+        store: 로컬 저장소 (있으면 변경분만 동기화한 뒤 저장소에서 읽음)
     """
-    print("Fetching items from Zotero API...")
-
-    # Get total count first
-    total = zot.num_items()
-    print(f"Total items to fetch: {total}")
+    if store is not None:
+        sync_store(zot, store, on_progress=on_progress)
+        items = store.top_items()
+        print(f"Loaded {len(items)} items from local store")
+        if include_notes:
+            attach_notes(items, store.items_of_type('note'))
+        if include_pdfs:
+            attach_pdfs(items, store.items_of_type('attachment'))
+        if on_progress:
+            on_progress(len(items), len(items), f"Loaded {len(items)} items")
+        return items
 
+    print("Fetching items from Zotero API...")
     if on_progress:
-        on_progress(0, total, f"Fetching items (0/{total})...")
-
-    # Fetch in batches for progress tracking
-    batch_size = 100
-    items = []
-    start = 0
+        on_progress(0, 0, "Fetching items...")
 
-    while start < total:
-        batch = zot.top(limit=batch_size, start=start)
-        if not batch:
-            break
-        items.extend(batch)
-        start += len(batch)
-
-        if on_progress:
-            on_progress(len(items), total, f"Fetching items ({len(items)}/{total})...")
-        print(f"  Fetched {len(items)}/{total} items...")
+    # top-level 아이템 / 노트 / 첨부를 동시에 페이징
+    # (노트와 첨부는 N+1 children 호출 대신 itemType으로 한 번에)
+    streams = {"items": ("items/top", {})}
+    if include_notes:
+        streams["notes"] = ("items", {"itemType": "note"})
+    if include_pdfs:
+        streams["attachments"] = ("items", {"itemType": "attachment"})
 
-    print(f"Fetched {len(items)} items")
+    pager = ConcurrentPager(zot)
+    results = pager.fetch(
+        streams,
+        on_progress=lambda cur, tot: on_progress(cur, tot, f"Fetching items ({cur}/{tot})...") if on_progress else None,
+    )
+    items = results["items"]
+    print(f"Fetched {len(items)} items, {len(results.get('notes', []))} notes, "
+          f"{len(results.get('attachments', []))} attachments in {pager.requests} requests"
+          + (f" (throttled {pager.throttled}x)" if pager.throttled else ""))
 
     if include_notes:
-        # Fetch ALL notes at once (much faster than N+1 children calls)
-        print("Fetching all notes...")
-        if on_progress:
-            on_progress(0, 1, "Fetching all notes...")
-
-        all_notes = []
-        note_start = 0
-        while True:
-            batch = zot.items(itemType='note', limit=100, start=note_start)
-            if not batch:
-                break
-            all_notes.extend(batch)
-            note_start += len(batch)
-            print(f"  Fetched {len(all_notes)} notes...")
-
-        print(f"Fetched {len(all_notes)} notes total")
-
-        # Build parent -> notes mapping
-        notes_by_parent = {}
-        for note in all_notes:
-            parent_key = note['data'].get('parentItem')
-            if parent_key:
-                if parent_key not in notes_by_parent:
-                    notes_by_parent[parent_key] = []
-                notes_by_parent[parent_key].append(note)
-
-        # Assign notes to items
-        for item in items:
-            item['_notes'] = notes_by_parent.get(item['key'], [])
-
+        attach_notes(items, results["notes"])
         if on_progress:
             on_progress(1, 1, f"Matched notes to {len([i for i in items if i['_notes']])} items")
 
     if include_pdfs:
-        # Fetch ALL PDF attachments at once
-        print("Fetching PDF attachments...")
-        if on_progress:
-            on_progress(0, 1, "Fetching PDF attachments...")
-
-        all_attachments = []
-        att_start = 0
-        while True:
-            batch = zot.items(itemType='attachment', limit=100, start=att_start)
-            if not batch:
-                break
-            all_attachments.extend(batch)
-            att_start += len(batch)
-            print(f"  Fetched {len(all_attachments)} attachments...")
-
-        # Filter PDFs and build parent -> pdf_key mapping (for Zotero deep links)
-        pdfs_by_parent = {}
-        for att in all_attachments:
-            data = att['data']
-            if data.get('contentType') == 'application/pdf':
-                parent_key = data.get('parentItem')
-                att_key = att['key']  # Attachment key for zotero://open-pdf
-                if parent_key and att_key:
-                    # Prefer first PDF (usually the main one)
-                    if parent_key not in pdfs_by_parent:
-                        pdfs_by_parent[parent_key] = att_key
-
-        print(f"Found {len(pdfs_by_parent)} PDFs total")
-
-        # Assign PDF keys to items
-        for item in items:
-            item['_pdf_key'] = pdfs_by_parent.get(item['key'], '')
-
+        attach_pdfs(items, results["attachments"])
         if on_progress:
             on_progress(1, 1, f"Matched PDFs to {len([i for i in items if i['_pdf_key']])} items")
 
@@ -215,57 +470,112 @@ def item_to_row(item: dict) -> dict:
     return row
 
 
-def fetch_items_as_dataframe(zot: zotero.Zotero):
-    """Fetch items and return as pandas DataFrame (CSV-compatible)"""
+def items_to_dataframe(items: list[dict]):
+    """Convert fetched items to pandas DataFrame (CSV-compatible)"""
     import pandas as pd
 
-    items = fetch_all_items(zot)
     rows = [item_to_row(item) for item in items]
-
     return pd.DataFrame(rows)
 
 
-def add_tags_to_item(zot: zotero.Zotero, item_key: str, new_tags: list[str]) -> bool:
+def fetch_items_as_dataframe(zot: zotero.Zotero, store: ZoteroStore | None = None):
+    """Fetch items and return as pandas DataFrame (CSV-compatible)"""
+    items = fetch_all_items(zot, store=store)
+    return items_to_dataframe(items)
+
+
+class VersionConflictError(Exception):
+    """If-Unmodified-Since-Version 불일치 (HTTP 412) - 아이템이 그 사이 수정됨"""
+
+
+def patch_item(zot: zotero.Zotero, key: str, version: int, changes: dict) -> int:
+    """아이템 data 일부를 PATCH (버전 확인). Returns: 새 아이템 버전
+
+    Raises: VersionConflictError (412)
+    """
+    resp = http_client(zot).patch(
+        f"{zot.endpoint}/{zot.library_type}/{zot.library_id}/items/{key}",
+        json=changes,
+        headers={
+            "Zotero-API-Key": zot.api_key,
+            "Zotero-API-Version": "3",
+            "If-Unmodified-Since-Version": str(version),
+        },
+        timeout=30,
+    )
+    if resp.status_code == 412:
+        raise VersionConflictError(f"{key} was modified since version {version}")
+    resp.raise_for_status()
+    return int(resp.headers.get("Last-Modified-Version", version))
+
+
+def update_item_tags(zot: zotero.Zotero, item_key: str, compute_tags, store: ZoteroStore | None = None) -> list[str]:
+    """현재 태그 → compute_tags(tags) → 버전 확인 PATCH
+
+    store가 있으면 현재 버전/태그를 저장소에서 읽어 GET 없이 바로 쓰고,
+    버전 충돌(412)일 때만 아이템을 다시 받아 한 번 재시도한다.
+
+    Returns: 새 태그 목록
+    """
+    item = store.get_item(item_key) if store is not None else None
+    for attempt in range(2):
+        if item is None:
+            item = zot.item(item_key)
+            if store is not None:
+                store.upsert_item(item)
+        tags = compute_tags([t['tag'] for t in item['data'].get('tags', [])])
+        changes = {'tags': [{'tag': t} for t in tags]}
+        try:
+            version = patch_item(zot, item_key, item['version'], changes)
+        except VersionConflictError:
+            if attempt:
+                raise
+            item = None  # 최신 버전 다시 받기
+            continue
+        if store is not None:
+            store.record_write(item_key, version, changes)
+        return tags
+
+
+def add_tags_to_item(zot: zotero.Zotero, item_key: str, new_tags: list[str], store: ZoteroStore | None = None) -> bool:
     """Add tags to a Zotero item (preserves existing tags)"""
     try:
-        item = zot.item(item_key)
-        existing_tags = [t['tag'] for t in item['data'].get('tags', [])]
-
         # Merge tags (avoid duplicates)
-        all_tags = list(set(existing_tags + new_tags))
-        item['data']['tags'] = [{'tag': t} for t in all_tags]
-
-        zot.update_item(item)
+        update_item_tags(zot, item_key, lambda existing: list(set(existing + new_tags)), store=store)
         return True
     except Exception as e:
         print(f"Error updating item {item_key}: {e}")
         return False
 
 
-def set_tags_on_item(zot: zotero.Zotero, item_key: str, tags: list[str]) -> bool:
+def set_tags_on_item(zot: zotero.Zotero, item_key: str, tags: list[str], store: ZoteroStore | None = None) -> bool:
     """Set tags on a Zotero item (replaces existing tags)"""
     try:
-        item = zot.item(item_key)
-        item['data']['tags'] = [{'tag': t} for t in tags]
-        zot.update_item(item)
+        update_item_tags(zot, item_key, lambda existing: list(tags), store=store)
         return True
     except Exception as e:
         print(f"Error updating item {item_key}: {e}")
         return False
 
 
+def replace_cluster_tags(tags: list[dict], new_tag: str) -> list[dict] | None:
+    """모든 cluster: 태그를 new_tag 하나로 교체한 태그 목록 (이미 그 상태면 None)"""
+    current = [t['tag'] for t in tags if t.get('tag', '').startswith('cluster:')]
+    if current == [new_tag]:
+        return None
+    return [t for t in tags if not t.get('tag', '').startswith('cluster:')] + [{'tag': new_tag}]
+
+
 def replace_cluster_tag(zot: zotero.Zotero, item_key: str, new_tag: str) -> bool:
     """Remove all cluster: tags and add the new one"""
     try:
         item = zot.item(item_key)
-        existing_tags = item['data'].get('tags', [])
 
-        # Remove all cluster: tags
-        non_cluster_tags = [t for t in existing_tags if not t.get('tag', '').startswith('cluster:')]
-
-        # Add new cluster tag
-        non_cluster_tags.append({'tag': new_tag})
-        item['data']['tags'] = non_cluster_tags
+        # Remove all cluster: tags and add the new one (이미 같은 cluster 태그면 쓰기 생략)
+        tags = replace_cluster_tags(item['data'].get('tags', []), new_tag)
+        if tags is None:
+            return True
+        item['data']['tags'] = tags
 
         zot.update_item(item)
         return True
@@ -274,38 +584,141 @@ def replace_cluster_tag(zot: zotero.Zotero, item_key: str, new_tag: str) -> bool
         return False
 
 
-def batch_update_items(zot: zotero.Zotero, items: list, batch_size: int = 50, on_progress=None) -> dict:
+def fetch_items_by_keys(zot: zotero.Zotero, keys: list[str], store: ZoteroStore | None = None) -> dict[str, dict]:
+    """key -> 아이템 (store에 있으면 로컬에서, 없는 것만 itemKey= 50개씩 한 번에 GET)
+
+    라이브러리에 없는 키는 결과에서 빠짐
+    """
+    found = {}
+    missing = []
+    for key in dict.fromkeys(keys):
+        item = store.get_item(key) if store is not None else None
+        if item is None:
+            missing.append(key)
+        else:
+            found[key] = item
+
+    for i in range(0, len(missing), ZOTERO_PAGE_SIZE // 2):
+        chunk = missing[i:i + ZOTERO_PAGE_SIZE // 2]  # itemKey는 요청당 최대 50개
+        for item in zot.items(itemKey=",".join(chunk), limit=len(chunk)):
+            found[item['key']] = item
+            if store is not None:
+                store.upsert_item(item)
+    return found
+
+
+def parse_write_response(batch: list, body: dict) -> tuple[dict[str, int], dict[str, dict]]:
+    """Zotero 다중 쓰기 응답 → (key -> 새 버전, key -> 실패 정보 {code, message})
+
+    응답은 요청 배열 인덱스 기준 (successful / unchanged / failed)
+    """
+    versions, failed = {}, {}
+    for index, item in (body.get("successful") or {}).items():
+        versions[batch[int(index)]['key']] = int(item.get("version", 0))
+    for index in (body.get("unchanged") or {}):
+        versions[batch[int(index)]['key']] = int(batch[int(index)]['version'])
+    for index, error in (body.get("failed") or {}).items():
+        failed[batch[int(index)]['key']] = error
+    return versions, failed
+
+
+def batch_update_items(zot: zotero.Zotero, items: list, batch_size: int = 50, on_progress=None,
+                       compute_tags=None, max_in_flight: int = 4, max_rounds: int = 3,
+                       store: ZoteroStore | None = None) -> dict:
     """Update multiple items in batches (much faster than individual updates)
 
     Items should be full Zotero item objects with 'data' containing updated tags.
     This function extracts key, version, and tags for PATCH-style updates.
+    Zotero는 아이템별로 성공/실패를 돌려주므로 결과도 아이템 단위:
+    results["versions"] / results["tags"] = 성공한 key -> 새 버전 / 쓴 태그,
+    results["failed_keys"] = 실패한 key, results["errors"] = key -> {code, message}
+
+    - 배치를 최대 max_in_flight개 동시에 보냄 (Backoff/429면 ConcurrentPager가 동시성을 줄임)
+    - compute_tags(item) -> 새 태그 목록 (쓸 필요 없으면 None)을 주면 버전 충돌(412) 아이템만
+      다시 받아 태그를 재계산해서 재시도. 없으면 412는 실패 (덮어쓰면 다른 곳의 수정을 잃음)
+    - 네트워크 오류 / 5xx는 그대로 재시도 (최대 max_rounds번)
+    - store가 있으면 쓴 태그/새 버전과 다시 받은 아이템을 반영
+      (다음 sync_store가 이 아이템들을 다시 받지 않음)
     """
-    results = {"success": 0, "failed": 0}
+    from concurrent.futures import ThreadPoolExecutor
+
+    results = {"success": 0, "failed": 0, "failed_keys": [], "versions": {}, "tags": {}, "errors": {},
+               "conflicts": 0, "unchanged": 0, "write_requests": 0}
     total = len(items)
+    pager = ConcurrentPager(zot, max_workers=max_in_flight)
 
-    for i in range(0, total, batch_size):
-        batch = items[i:i + batch_size]
+    def write_batch(batch: list) -> tuple[dict, dict]:
         # Convert to PATCH format (only key, version, and tags)
-        payloads = []
-        for item in batch:
-            payload = {
-                'key': item['key'],
-                'version': item['version'],
-                'tags': item['data']['tags']
-            }
-            payloads.append(payload)
+        payloads = [{'key': item['key'], 'version': item['version'], 'tags': item['data']['tags']}
+                    for item in batch]
         try:
-            zot.update_items(payloads)
-            results["success"] += len(batch)
-            print(f"  Batch {i//batch_size + 1}: {len(batch)} items updated")
+            resp = pager.request("POST", "items", json=payloads)
+            return parse_write_response(batch, resp.json())
         except Exception as e:
-            print(f"  Batch {i//batch_size + 1} failed: {e}")
-            results["failed"] += len(batch)
+            return {}, {item['key']: {"message": str(e)} for item in batch}
+
+    pending = items
+    for round_no in range(max_rounds + 1):
+        last_round = round_no == max_rounds
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        retry, conflicts = [], []
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            # map은 순서대로 결과를 돌려주므로 진행률도 배치 순서대로
+            for n, (batch, (versions, failed)) in enumerate(zip(batches, executor.map(write_batch, batches)), 1):
+                results["write_requests"] += 1
+                for item in batch:
+                    key = item['key']
+                    if key in versions:
+                        results["versions"][key] = versions[key]
+                        results["tags"][key] = item['data']['tags']
+                        continue
+                    error = failed.get(key, {"message": "missing from write response"})
+                    code = error.get("code")
+                    if code == 412 and compute_tags is not None and not last_round:
+                        conflicts.append(key)
+                    elif (code is None or code >= 500) and not last_round:
+                        retry.append(item)
+                    else:
+                        results["errors"][key] = error
+                        print(f"  {key} failed: {code} {error.get('message', '')}")
+
+                if round_no == 0:
+                    print(f"  Batch {n}/{len(batches)}: {len(versions)}/{len(batch)} items updated")
+                    if on_progress:
+                        on_progress(min(n * batch_size, total), total)
+
+        if conflicts:
+            # 충돌한 아이템만 최신으로 다시 받아 태그 재계산
+            results["conflicts"] += len(conflicts)
+            fresh = fetch_items_by_keys(zot, conflicts)
+            for key in conflicts:
+                item = fresh.get(key)
+                if item is None:
+                    results["errors"][key] = {"code": 404, "message": "Item not found"}
+                    continue
+                if store is not None:
+                    store.upsert_item(item)
+                tags = compute_tags(item)
+                if tags is None:
+                    # 다른 곳에서 이미 같은 태그로 바뀜
+                    results["unchanged"] += 1
+                    results["versions"][key] = item['version']
+                    results["tags"][key] = item['data'].get('tags', [])
+                    continue
+                retry.append({**item, 'data': {**item['data'], 'tags': tags}})
+
+        if not retry:
+            break
+        print(f"  Retrying {len(retry)} items ({len(conflicts)} version conflicts)")
+        pending = retry
 
-        # Report progress
-        if on_progress:
-            on_progress(min(i + batch_size, total), total)
+    if store is not None:
+        for key, version in results["versions"].items():
+            store.record_write(key, version, {'tags': results["tags"][key]})
 
+    results["failed_keys"] = list(results["errors"])
+    results["success"] = len(results["versions"])
+    results["failed"] = len(results["errors"])
     return results
 
 
@@ -314,10 +727,18 @@ def batch_replace_cluster_tags(
     items: list,
     cluster_mapping: dict,  # zotero_key -> new_tag
     batch_size: int = 50,
-    on_progress=None
+    on_progress=None,
+    store: ZoteroStore | None = None
 ) -> dict:
-    """Replace cluster tags for multiple items in batches"""
-    results = {"success": 0, "failed": 0, "skipped": 0}
+    """Replace cluster tags for multiple items in batches
+
+    Items whose only cluster: tag already matches are not written.
+    results["unchanged"] counts those, results["requests_saved"] is the number of
+    write requests avoided compared to rewriting every mapped item.
+    Items modified in Zotero since `items` was fetched (412) are refetched and retried.
+    """
+    results = {"success": 0, "failed": 0, "skipped": 0, "unchanged": 0, "conflicts": 0,
+               "write_requests": 0, "requests_saved": 0}
 
     # Build item lookup by key
     item_by_key = {item['key']: item for item in items}
@@ -330,44 +751,31 @@ def batch_replace_cluster_tags(
             results["skipped"] += 1
             continue
 
-        existing_tags = item['data'].get('tags', [])
-
-        # Check if already has correct tag
-        current_cluster_tags = [t['tag'] for t in existing_tags if t.get('tag', '').startswith('cluster:')]
-        if len(current_cluster_tags) == 1 and current_cluster_tags[0] == new_tag:
+        # Remove all cluster: tags and add new one (None if already has the correct tag)
+        tags = replace_cluster_tags(item['data'].get('tags', []), new_tag)
+        if tags is None:
             results["skipped"] += 1
+            results["unchanged"] += 1
             continue
 
-        # Remove all cluster: tags and add new one
-        non_cluster_tags = [t for t in existing_tags if not t.get('tag', '').startswith('cluster:')]
-        non_cluster_tags.append({'tag': new_tag})
+        items_to_update.append({**item, 'data': {**item['data'], 'tags': tags}})
 
-        # For batch update, we only need to send changed fields (PATCH semantics)
-        # pyzotero's update_items expects data dicts with key and version
-        update_payload = {
-            'key': item['key'],
-            'version': item['version'],
-            'tags': non_cluster_tags
-        }
-        items_to_update.append(update_payload)
-
-    print(f"  {len(items_to_update)} items need update, {results['skipped']} skipped")
+    print(f"  {len(items_to_update)} items need update, {results['skipped']} skipped "
+          f"({results['unchanged']} already up to date)")
     total = len(items_to_update)
-
-    # Batch update
-    for i in range(0, total, batch_size):
-        batch = items_to_update[i:i + batch_size]
-        try:
-            zot.update_items(batch)
-            results["success"] += len(batch)
-            print(f"  Batch {i//batch_size + 1}/{(total-1)//batch_size + 1}: {len(batch)} items")
-        except Exception as e:
-            print(f"  Batch {i//batch_size + 1} failed: {e}")
-            results["failed"] += len(batch)
-
-        # Report progress
-        if on_progress:
-            on_progress(min(i + batch_size, total), total)
+    n_requests = (total + batch_size - 1) // batch_size
+    results["requests_saved"] = (total + results["unchanged"] + batch_size - 1) // batch_size - n_requests
+
+    # Batch update (버전 충돌 아이템은 최신 태그 기준으로 다시 계산)
+    batch_result = batch_update_items(
+        zot, items_to_update, batch_size=batch_size, on_progress=on_progress,
+        compute_tags=lambda item: replace_cluster_tags(item['data'].get('tags', []), cluster_mapping[item['key']]),
+        store=store,
+    )
+    results["success"] = batch_result["success"]
+    results["failed"] = batch_result["failed"]
+    results["conflicts"] = batch_result["conflicts"]
+    results["write_requests"] = batch_result["write_requests"]
 
     return results
 
@@ -404,44 +812,135 @@ def sync_cluster_tags(
 IDEAS_COLLECTION_NAME = "Ideas"
 
 
-def get_or_create_ideas_collection(zot: zotero.Zotero) -> str:
-    """Get or create the Ideas collection, returns collection key"""
+class IdeasIndex:
+    """라이브러리 하나의 Ideas 컬렉션 키 + 파싱된 아이디어 캐시
+
+    노트 HTML 정규식 파싱은 (key, version)이 바뀐 노트만 다시 함
+    """
+
+    def __init__(self):
+        self.collection_key = None
+        self._ideas = {}  # zotero_key -> (version, idea)
+        self._lock = threading.Lock()
+
+    def parse(self, item: dict) -> dict | None:
+        """parse_idea_from_note 결과 (같은 버전이면 캐시, 호출자가 수정해도 되도록 복사본)"""
+        key, version = item['key'], item['version']
+        with self._lock:
+            cached = self._ideas.get(key)
+        if cached is None or cached[0] != version:
+            cached = (version, parse_idea_from_note(item))
+            with self._lock:
+                self._ideas[key] = cached
+        idea = cached[1]
+        return {**idea, 'connected_papers': list(idea['connected_papers']), 'keywords': list(idea['keywords'])} \
+            if idea else None
+
+    def remember(self, idea: dict) -> None:
+        """쓰기 후 새 버전의 아이디어를 바로 캐시 (다시 파싱하지 않도록)"""
+        with self._lock:
+            self._ideas[idea['zotero_key']] = (idea['version'], {
+                **idea, 'connected_papers': list(idea.get('connected_papers', [])),
+                'keywords': list(idea.get('keywords', []))})
+
+    def forget(self, zotero_key: str) -> None:
+        with self._lock:
+            self._ideas.pop(zotero_key, None)
+
+
+_ideas_indexes: dict[tuple, IdeasIndex] = {}
+_ideas_indexes_lock = threading.Lock()
+
+
+def ideas_index(zot: zotero.Zotero) -> IdeasIndex:
+    """zot 라이브러리의 IdeasIndex (프로세스 내 공유)"""
+    key = (zot.library_type, str(zot.library_id))
+    with _ideas_indexes_lock:
+        if key not in _ideas_indexes:
+            _ideas_indexes[key] = IdeasIndex()
+        return _ideas_indexes[key]
+
+
+def get_or_create_ideas_collection(zot: zotero.Zotero, store: ZoteroStore | None = None) -> str:
+    """Get or create the Ideas collection, returns collection key (프로세스 내 캐시)"""
+    index = ideas_index(zot)
+    if index.collection_key:
+        return index.collection_key
+
+    if store is not None:
+        collection = store.collection_by_name(IDEAS_COLLECTION_NAME)
+        if collection:
+            index.collection_key = collection['key']
+            return index.collection_key
+
     collections = zot.collections()
 
     for c in collections:
         if c['data']['name'] == IDEAS_COLLECTION_NAME:
-            return c['key']
+            index.collection_key = c['key']
+            return index.collection_key
 
     # Create new collection
     new_collection = zot.create_collections([{'name': IDEAS_COLLECTION_NAME}])
     if new_collection and 'success' in new_collection:
         # new_collection['success'] is a dict like {'0': 'KEY123'}
-        return list(new_collection['success'].values())[0]
+        index.collection_key = list(new_collection['success'].values())[0]
+        return index.collection_key
 
     raise Exception(f"Failed to create {IDEAS_COLLECTION_NAME} collection")
 
 
-def fetch_ideas(zot: zotero.Zotero) -> list[dict]:
-    """Fetch all ideas (standalone notes) from Ideas collection"""
+def fetch_ideas(zot: zotero.Zotero, store: ZoteroStore | None = None) -> list[dict]:
+    """Fetch all ideas (standalone notes) from Ideas collection (store가 있으면 저장소에서 읽음)"""
     try:
-        collection_key = get_or_create_ideas_collection(zot)
+        collection_key = get_or_create_ideas_collection(zot, store=store)
     except Exception as e:
         print(f"Error getting Ideas collection: {e}")
         return []
 
     # Fetch items in collection
-    items = zot.collection_items(collection_key, itemType='note')
+    if store is not None:
+        items = store.collection_items(collection_key, item_type='note')
+    else:
+        items = zot.collection_items(collection_key, itemType='note')
 
-    # Parse each idea
+    # Parse each idea (바뀐 노트만 다시 파싱)
+    index = ideas_index(zot)
     ideas = []
     for item in items:
-        idea = parse_idea_from_note(item)
+        idea = index.parse(item)
         if idea:
             ideas.append(idea)
 
     return ideas
 
 
+def get_idea(zot: zotero.Zotero, zotero_key: str, store: ZoteroStore | None = None) -> dict | None:
+    """아이디어 하나 (store에 있으면 로컬, 없으면 아이템 하나만 GET)
+
+    Ideas 컬렉션의 standalone 노트가 아니면 None (논문 노트 등을 아이디어로 덮어쓰지 않도록)
+    """
+    try:
+        collection_key = get_or_create_ideas_collection(zot, store=store)
+    except Exception as e:
+        print(f"Error getting Ideas collection: {e}")
+        return None
+
+    item = store.get_item(zotero_key) if store is not None else None
+    if item is None:
+        try:
+            item = zot.item(zotero_key)
+        except Exception as e:
+            print(f"Error fetching idea {zotero_key}: {e}")
+            return None
+        if store is not None:
+            store.upsert_item(item)
+    data = item['data']
+    if data.get('itemType') != 'note' or data.get('parentItem') or collection_key not in data.get('collections', []):
+        return None
+    return ideas_index(zot).parse(item)
+
+
 def parse_idea_from_note(item: dict) -> dict | None:
     """Parse structured idea from Zotero note HTML"""
     import re
@@ -548,11 +1047,11 @@ def create_idea_html(idea: dict) -> str:
     return result
 
 
-def create_idea(zot: zotero.Zotero, idea: dict) -> dict | None:
+def create_idea(zot: zotero.Zotero, idea: dict, store: ZoteroStore | None = None) -> dict | None:
     """Create a new idea as standalone note in Ideas collection"""
     from datetime import datetime
 
-    collection_key = get_or_create_ideas_collection(zot)
+    collection_key = get_or_create_ideas_collection(zot, store=store)
 
     # Ensure required fields
     if 'id' not in idea:
@@ -579,15 +1078,24 @@ def create_idea(zot: zotero.Zotero, idea: dict) -> dict | None:
         if result and 'success' in result:
             new_key = list(result['success'].values())[0]
             idea['zotero_key'] = new_key
+            # 생성된 아이템을 저장소에 바로 반영 (다음 동기화 전에도 목록에 보이도록)
+            created = list(result.get('successful', {}).values())
+            if store is not None and created:
+                store.upsert_item(created[0])
             return idea
     except Exception as e:
         print(f"Error creating idea: {e}")
+        # 캐시된 컬렉션이 삭제됐을 수 있으니 다음엔 다시 찾음
+        ideas_index(zot).collection_key = None
 
     return None
 
 
-def update_idea(zot: zotero.Zotero, idea: dict) -> bool:
-    """Update an existing idea"""
+def update_idea(zot: zotero.Zotero, idea: dict, store: ZoteroStore | None = None) -> bool:
+    """Update an existing idea
+
+    store가 있으면 GET 없이 idea['version']으로 버전 확인 PATCH
+    """
     from datetime import datetime
 
     if 'zotero_key' not in idea:
@@ -595,13 +1103,24 @@ def update_idea(zot: zotero.Zotero, idea: dict) -> bool:
         return False
 
     try:
-        item = zot.item(idea['zotero_key'])
-
         # Update timestamp
         idea['updated'] = datetime.now().strftime('%Y-%m-%d')
 
         # Generate new HTML
         note_html = create_idea_html(idea)
+
+        if store is not None and 'version' in idea:
+            changes = {'note': note_html}
+            try:
+                version = patch_item(zot, idea['zotero_key'], idea['version'], changes)
+                store.record_write(idea['zotero_key'], version, changes)
+                idea['version'] = version
+                ideas_index(zot).remember(idea)
+                return True
+            except VersionConflictError as e:
+                print(f"  {e}, retrying with latest version")
+
+        item = zot.item(idea['zotero_key'])
         item['data']['note'] = note_html
 
         zot.update_item(item)
@@ -611,11 +1130,20 @@ def update_idea(zot: zotero.Zotero, idea: dict) -> bool:
         return False
 
 
-def delete_idea(zot: zotero.Zotero, zotero_key: str) -> bool:
+def delete_idea(zot: zotero.Zotero, zotero_key: str, store: ZoteroStore | None = None) -> bool:
     """Delete an idea"""
     try:
-        item = zot.item(zotero_key)
-        zot.delete_item(item)
+        item = store.get_item(zotero_key) if store is not None else None
+        try:
+            zot.delete_item(item or zot.item(zotero_key))
+        except Exception:
+            if item is None:
+                raise
+            # 저장소 사본이 오래된 버전이면 최신 버전으로 재시도
+            zot.delete_item(zot.item(zotero_key))
+        if store is not None:
+            store.delete_items([zotero_key])
+        ideas_index(zot).forget(zotero_key)
         return True
     except Exception as e:
         print(f"Error deleting idea: {e}")
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Zotero Explorer - Zotero Client Pool
+- 라이브러리별 프로세스 공용 pyzotero 클라이언트 풀 (Flask 워커 스레드 간 공유)
+- 모든 클라이언트가 keep-alive + gzip HTTP 연결 풀 하나를 공유 → 요청마다 TLS handshake 없음
+- pyzotero 인스턴스는 요청 상태(url_params)를 가지므로 with로 빌려 쓰고 반납
+- 풀 사용률 / 연결 재사용 metrics
+"""
+
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from zotero_api import get_zotero_client
+
+# 라이브러리당 동시에 빌려줄 수 있는 클라이언트 수
+POOL_SIZE = int(os.environ.get("ZOTERO_POOL_SIZE", "8"))
+
+
+class ZoteroClientPool:
+    """라이브러리 하나에 대한 Zotero 클라이언트 풀
+
+    Usage:
+        pool = get_pool()
+        with pool.client() as zot:
+            zot.item(key)
+    """
+
+    def __init__(self, library_id: str | None = None, api_key: str | None = None,
+                 library_type: str | None = None, max_clients: int = POOL_SIZE, max_connections: int = 16):
+        import httpx2
+
+        self.library_id = library_id
+        self.api_key = api_key
+        self.library_type = library_type
+        self.max_clients = max_clients
+
+        self._lock = threading.Lock()
+        self._idle = queue.LifoQueue()  # 최근 반납된 클라이언트 우선 (연결이 살아있을 확률 높음)
+        self._created = 0
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_s = 0.0
+        self._busy_s = 0.0
+        self._started = time.perf_counter()
+        self._http_requests = 0
+        self._connections_opened = 0
+
+        # pyzotero 클라이언트들과 zotero_api의 raw 요청(ConcurrentPager, patch_item)이 공유하는 HTTP 연결 풀
+        self.http = httpx2.Client(
+            follow_redirects=True,
+            timeout=httpx2.Timeout(30.0),
+            limits=httpx2.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                 keepalive_expiry=120),
+            headers={"Accept-Encoding": "gzip, deflate"},
+            event_hooks={"request": [self._on_request]},
+        )
+
+    # --- HTTP metrics ---
+
+    def _on_request(self, request) -> None:
+        request.extensions["trace"] = self._trace
+        with self._lock:
+            self._http_requests += 1
+
+    def _trace(self, event: str, info: dict) -> None:
+        if event == "connection.connect_tcp.started":
+            with self._lock:
+                self._connections_opened += 1
+
+    # --- checkout ---
+
+    def _new_client(self):
+        # 클라이언트마다 httpx 클라이언트를 만들지 않고 공유 연결 풀 사용
+        return get_zotero_client(self.library_id, self.api_key, self.library_type, client=self.http)
+
+    @contextmanager
+    def client(self, timeout: float = 60):
+        """클라이언트 하나를 빌려 씀 (풀이 다 쓰이고 있으면 timeout초까지 대기)"""
+        zot = self._checkout(timeout)
+        start = time.perf_counter()
+        try:
+            yield zot
+        finally:
+            self._checkin(zot, time.perf_counter() - start)
+
+    def _checkout(self, timeout: float):
+        with self._lock:
+            self._checkouts += 1
+            create = self._idle.empty() and self._created < self.max_clients
+            if create:
+                self._created += 1
+
+        if create:
+            try:
+                zot = self._new_client()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        else:
+            try:
+                zot = self._idle.get_nowait()
+            except queue.Empty:
+                wait_start = time.perf_counter()
+                try:
+                    zot = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No Zotero client available after {timeout}s (pool size {self.max_clients})")
+                with self._lock:
+                    self._waits += 1
+                    self._wait_s += time.perf_counter() - wait_start
+
+        with self._lock:
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+        return zot
+
+    def _checkin(self, zot, busy_s: float) -> None:
+        # 다음 사용자에게 이전 요청의 파라미터가 새지 않도록 초기화
+        zot.url_params = None
+        with self._lock:
+            self._in_use -= 1
+            self._busy_s += busy_s
+        self._idle.put(zot)
+
+    # --- metrics ---
+
+    def metrics(self) -> dict:
+        with self._lock:
+            elapsed = time.perf_counter() - self._started
+            return {
+                "library": f"{self.library_type or os.environ.get('ZOTERO_LIBRARY_TYPE', 'user')}:"
+                           f"{self.library_id or os.environ.get('ZOTERO_LIBRARY_ID', '')}",
+                "max_clients": self.max_clients,
+                "created": self._created,
+                "in_use": self._in_use,
+                "peak_in_use": self._peak_in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "avg_wait_ms": round(self._wait_s / self._waits * 1000, 2) if self._waits else 0.0,
+                # 풀 전체 용량 대비 빌려준 시간 비율
+                "utilization": round(self._busy_s / (elapsed * self.max_clients), 4) if elapsed > 0 else 0.0,
+                "http_requests": self._http_requests,
+                "connections_opened": self._connections_opened,
+                "connection_reuse": round(1 - self._connections_opened / self._http_requests, 4)
+                                    if self._http_requests else 0.0,
+            }
+
+    def close(self) -> None:
+        self.http.close()
+
+
+_pools: dict[tuple, ZoteroClientPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(library_id: str | None = None, api_key: str | None = None,
+             library_type: str | None = None) -> ZoteroClientPool:
+    """라이브러리별 공용 풀 (인자 생략 시 .env의 기본 라이브러리)"""
+    key = (library_type or os.environ.get("ZOTERO_LIBRARY_TYPE", "user"),
+           library_id or os.environ.get("ZOTERO_LIBRARY_ID"),
+           api_key or os.environ.get("ZOTERO_API_KEY"))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ZoteroClientPool(library_id, api_key, library_type)
+        return _pools[key]
+
+
+def zotero_client(timeout: float = 60):
+    """기본 라이브러리 풀에서 클라이언트 빌리기: with zotero_client() as zot: ..."""
+    return get_pool().client(timeout)
+
+
+def pool_metrics() -> list[dict]:
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [p.metrics() for p in pools]
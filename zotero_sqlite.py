@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Zotero Explorer - Local zotero.sqlite Reader
+- Zotero 데이터 디렉토리의 zotero.sqlite를 직접 읽음 (네트워크/API 키 불필요)
+- Zotero 실행 중 lock 충돌을 피하려고 SQLite backup API로 뜬 임시 스냅샷을 읽기 전용으로 사용
+- 결과는 Zotero API 형식 아이템 (zotero_api.item_to_row 입력과 동일)
+"""
+
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+# Zotero는 날짜를 "2024-01-15 2024-01-15" (SQL 날짜 + 원본 문자열) 형식으로 저장
+MULTIPART_DATE = re.compile(r"^\d{4}-\d{2}-\d{2} (.*)$", re.DOTALL)
+
+
+def default_zotero_dir() -> Path:
+    """ZOTERO_DATA_DIR 또는 ~/Zotero"""
+    return Path(os.environ.get("ZOTERO_DATA_DIR", Path.home() / "Zotero"))
+
+
+def _copy_locked_database(db_path: Path, snapshot: Path) -> None:
+    """Zotero가 exclusive lock을 잡고 있어 backup이 안 될 때: 파일 복사 후 무결성 검사
+
+    쓰는 중에 복사하면 페이지가 섞일 수 있으므로 quick_check가 실패하면 에러
+    """
+    shutil.copy2(db_path, snapshot)
+    for suffix in ("-wal", "-journal"):
+        sidecar = db_path.with_name(db_path.name + suffix)
+        if sidecar.exists():
+            shutil.copy2(sidecar, snapshot.with_name(snapshot.name + suffix))
+    conn = sqlite3.connect(str(snapshot))
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()
+    except sqlite3.DatabaseError as e:
+        result = (str(e),)
+    finally:
+        conn.close()
+    if not result or result[0] != "ok":
+        raise RuntimeError(f"zotero.sqlite copy is inconsistent ({result[0] if result else 'no result'}); "
+                           "Zotero was probably writing - close Zotero or retry")
+
+
+@contextmanager
+def open_snapshot(zotero_dir: str | Path):
+    """zotero.sqlite를 SQLite backup API로 임시 디렉토리에 스냅샷 떠서 읽기 전용 연결로 열기
+
+    원본은 읽기 전용(mode=ro)으로 열고, backup이 WAL 내용까지 일관된 시점으로 복사함
+    """
+    db_path = Path(zotero_dir) / "zotero.sqlite"
+    if not db_path.exists():
+        raise FileNotFoundError(f"zotero.sqlite not found in {zotero_dir}")
+
+    with tempfile.TemporaryDirectory(prefix="zotero-snapshot-") as tmp:
+        snapshot = Path(tmp) / "zotero.sqlite"
+        try:
+            src = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True, timeout=10)
+            try:
+                # 먼저 읽기 트랜잭션을 열어 공유 lock을 잡음: exclusive lock이면 timeout 후 바로 에러
+                # (backup()은 busy일 때 무한 재시도), backup 동안 쓰기가 끼어들지 않음
+                src.execute("BEGIN")
+                src.execute("SELECT count(*) FROM sqlite_master").fetchone()
+                dst = sqlite3.connect(str(snapshot))
+                try:
+                    src.backup(dst)
+                finally:
+                    dst.close()
+            finally:
+                src.close()
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            print(f"zotero.sqlite is locked by Zotero ({e}), falling back to a checked file copy")
+            snapshot.unlink(missing_ok=True)
+            _copy_locked_database(db_path, snapshot)
+
+        conn = sqlite3.connect(str(snapshot))
+        conn.execute("PRAGMA query_only = ON")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?",
+                        (name,)).fetchone() is not None
+
+
+def resolve_library_id(conn: sqlite3.Connection, library_type: str = "user", library_id: str | None = None) -> int:
+    """Zotero 내부 libraryID (user 라이브러리 또는 groupID에 해당하는 group 라이브러리)"""
+    if library_type == "group" and library_id:
+        row = conn.execute("SELECT libraryID FROM groups WHERE groupID = ?", (int(library_id),)).fetchone()
+        if not row:
+            raise ValueError(f"Group {library_id} not found in zotero.sqlite")
+        return row[0]
+    row = conn.execute("SELECT libraryID FROM libraries WHERE type = 'user'").fetchone()
+    return row[0] if row else 1
+
+
+def load_items_from_sqlite(zotero_dir: str | Path, library_type: str = "user",
+                           library_id: str | None = None) -> list[dict]:
+    """zotero.sqlite에서 top-level 아이템을 API 형식으로 로드
+
+    creators, tags, 자식 노트('_notes'), 첫 PDF 첨부 키('_pdf_key') 포함.
+    휴지통 아이템은 제외, 순서는 API 기본값과 같은 최근 수정 순.
+    """
+    with open_snapshot(zotero_dir) as conn:
+        lib = resolve_library_id(conn, library_type, library_id)
+        fields_table = "fieldsCombined" if _table_exists(conn, "fieldsCombined") else "fields"
+        types_table = "itemTypesCombined" if _table_exists(conn, "itemTypesCombined") else "itemTypes"
+        deleted = "SELECT itemID FROM deletedItems" if _table_exists(conn, "deletedItems") else "SELECT itemID FROM items WHERE 0"
+
+        # top-level 아이템 = 부모 있는 노트/첨부와 주석을 제외 (zot.top()처럼 독립 노트/첨부는 포함)
+        not_child = ("i.itemID NOT IN (SELECT itemID FROM itemNotes WHERE parentItemID IS NOT NULL)"
+                     " AND i.itemID NOT IN (SELECT itemID FROM itemAttachments WHERE parentItemID IS NOT NULL)")
+        if _table_exists(conn, "itemAnnotations"):
+            not_child += " AND i.itemID NOT IN (SELECT itemID FROM itemAnnotations)"
+
+        items = {}
+        for item_id, key, version, type_name, date_added, date_modified in conn.execute(f"""
+            SELECT i.itemID, i.key, i.version, t.typeName, i.dateAdded, i.dateModified
+            FROM items i JOIN {types_table} t ON t.itemTypeID = i.itemTypeID
+            WHERE i.libraryID = ? AND {not_child} AND i.itemID NOT IN ({deleted})
+            ORDER BY i.dateModified DESC, i.key
+        """, (lib,)):
+            items[item_id] = {
+                "key": key,
+                "version": version,
+                "data": {
+                    "key": key,
+                    "version": version,
+                    "itemType": type_name,
+                    "creators": [],
+                    "tags": [],
+                    "dateAdded": date_added,
+                    "dateModified": date_modified,
+                },
+                "_notes": [],
+                "_pdf_key": "",
+            }
+
+        # 필드 값 (EAV)
+        for item_id, field, value in conn.execute(f"""
+            SELECT d.itemID, f.fieldName, v.value
+            FROM itemData d
+            JOIN {fields_table} f ON f.fieldID = d.fieldID
+            JOIN itemDataValues v ON v.valueID = d.valueID
+            JOIN items i ON i.itemID = d.itemID
+            WHERE i.libraryID = ?
+        """, (lib,)):
+            if item_id in items:
+                if field == "date" and isinstance(value, str):
+                    match = MULTIPART_DATE.match(value)
+                    value = match.group(1) if match else value
+                items[item_id]["data"][field] = value
+
+        # 저자
+        for item_id, first, last, field_mode, creator_type in conn.execute("""
+            SELECT ic.itemID, c.firstName, c.lastName, c.fieldMode, ct.creatorType
+            FROM itemCreators ic
+            JOIN creators c ON c.creatorID = ic.creatorID
+            JOIN creatorTypes ct ON ct.creatorTypeID = ic.creatorTypeID
+            ORDER BY ic.itemID, ic.orderIndex
+        """):
+            if item_id in items:
+                if field_mode == 1:  # 단일 필드 이름 (기관명 등)
+                    creator = {"creatorType": creator_type, "name": last or ""}
+                else:
+                    creator = {"creatorType": creator_type, "firstName": first or "", "lastName": last or ""}
+                items[item_id]["data"]["creators"].append(creator)
+
+        # 태그
+        for item_id, name, tag_type in conn.execute("""
+            SELECT it.itemID, t.name, it.type
+            FROM itemTags it JOIN tags t ON t.tagID = it.tagID
+            ORDER BY it.itemID, t.name
+        """):
+            if item_id in items:
+                tag = {"tag": name}
+                if tag_type:
+                    tag["type"] = tag_type
+                items[item_id]["data"]["tags"].append(tag)
+
+        # 노트 (독립 노트는 본문을 data['note']에, 자식 노트는 부모의 '_notes'에)
+        for note_id, parent_id, note_key, note in conn.execute(f"""
+            SELECT n.itemID, n.parentItemID, i.key, n.note
+            FROM itemNotes n JOIN items i ON i.itemID = n.itemID
+            WHERE n.itemID NOT IN ({deleted})
+            ORDER BY i.dateModified DESC, i.key
+        """):
+            if parent_id is None and note_id in items:
+                items[note_id]["data"]["note"] = note or ""
+            elif parent_id in items:
+                parent_key = items[parent_id]["key"]
+                items[parent_id]["_notes"].append({
+                    "key": note_key,
+                    "data": {"key": note_key, "itemType": "note", "parentItem": parent_key, "note": note or ""},
+                })
+
+        # 첫 PDF 첨부 (zotero://open-pdf 링크용)
+        for parent_id, att_key in conn.execute(f"""
+            SELECT a.parentItemID, i.key
+            FROM itemAttachments a JOIN items i ON i.itemID = a.itemID
+            WHERE a.parentItemID IS NOT NULL AND a.contentType = 'application/pdf'
+              AND a.itemID NOT IN ({deleted})
+            ORDER BY i.dateModified DESC, i.key
+        """):
+            if parent_id in items and not items[parent_id]["_pdf_key"]:
+                items[parent_id]["_pdf_key"] = att_key
+
+    return list(items.values())
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Zotero Explorer - Local Item Store
+- Zotero 아이템(top-level, 노트, 첨부), 태그, 컬렉션을 SQLite에 버전과 함께 저장
+- 라이브러리 Last-Modified-Version 기록 → 다음 동기화는 since=로 변경분만 요청
+- API 서버의 읽기(태그, 아이디어)와 쓰기 계획(현재 버전/태그)을 네트워크 없이 처리
+- 동기화 로직은 zotero_api.sync_store
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+CACHE_DIR = Path(__file__).parent / "cache"
+
+SCHEMA_VERSION = 2  # 바뀌면 저장소를 비우고 전체 재동기화
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    item_type TEXT NOT NULL,
+    parent_key TEXT,
+    trashed INTEGER NOT NULL DEFAULT 0,
+    date_modified TEXT,
+    json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_items_parent ON items(parent_key);
+CREATE INDEX IF NOT EXISTS idx_items_type ON items(item_type);
+CREATE TABLE IF NOT EXISTS tags (
+    item_key TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    type INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (item_key, tag)
+);
+CREATE INDEX IF NOT EXISTS idx_tags_tag ON tags(tag);
+CREATE TABLE IF NOT EXISTS collections (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    parent_key TEXT,
+    json TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS item_collections (
+    item_key TEXT NOT NULL,
+    collection_key TEXT NOT NULL,
+    PRIMARY KEY (item_key, collection_key)
+);
+CREATE INDEX IF NOT EXISTS idx_item_collections_collection ON item_collections(collection_key);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class ZoteroStore:
+    """라이브러리 하나의 로컬 아이템 저장소 (스레드 간 공유 가능)"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        # 동기화는 한 번에 하나만 (sync_store_if_stale)
+        self.sync_lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        if int(self._get_meta("schema_version", 0)) != SCHEMA_VERSION:
+            self.clear()
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('schema_version', ?)",
+                                   (str(SCHEMA_VERSION),))
+
+    # --- meta ---
+
+    def _get_meta(self, name: str, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    @property
+    def library_version(self) -> int:
+        """마지막으로 반영한 라이브러리 버전 (0 = 아직 동기화 안 함)"""
+        return int(self._get_meta("library_version", 0))
+
+    @property
+    def last_sync(self) -> str | None:
+        return self._get_meta("last_sync")
+
+    def seconds_since_sync(self) -> float | None:
+        """마지막 동기화 후 경과 시간 (동기화한 적 없으면 None)"""
+        synced_at = self._get_meta("synced_at")
+        return time.time() - float(synced_at) if synced_at else None
+
+    # --- write ---
+
+    def _upsert_items(self, items: list[dict]) -> None:
+        """아이템 + 파생 테이블(tags, item_collections) 갱신 (lock/트랜잭션 안에서 호출)"""
+        keys = [(item["key"],) for item in items]
+        self._conn.executemany("DELETE FROM tags WHERE item_key = ?", keys)
+        self._conn.executemany("DELETE FROM item_collections WHERE item_key = ?", keys)
+
+        rows, tag_rows, collection_rows = [], [], []
+        for item in items:
+            data = item.get("data", {})
+            rows.append((
+                item["key"],
+                int(item.get("version", data.get("version", 0))),
+                data.get("itemType", ""),
+                data.get("parentItem") or None,
+                1 if data.get("deleted") else 0,
+                data.get("dateModified", ""),
+                json.dumps(item, ensure_ascii=False),
+            ))
+            tag_rows.extend((item["key"], t["tag"], int(t.get("type", 0))) for t in data.get("tags", []))
+            collection_rows.extend((item["key"], c) for c in data.get("collections", []))
+
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO items (key, version, item_type, parent_key, trashed, date_modified, json) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        self._conn.executemany("INSERT OR IGNORE INTO tags (item_key, tag, type) VALUES (?, ?, ?)", tag_rows)
+        self._conn.executemany("INSERT OR IGNORE INTO item_collections (item_key, collection_key) VALUES (?, ?)",
+                               collection_rows)
+
+    def _delete_items(self, keys: list[str]) -> None:
+        params = [(k,) for k in keys]
+        self._conn.executemany("DELETE FROM items WHERE key = ?", params)
+        self._conn.executemany("DELETE FROM tags WHERE item_key = ?", params)
+        self._conn.executemany("DELETE FROM item_collections WHERE item_key = ?", params)
+
+    def apply_changes(self, items: list[dict], deleted_keys: list[str], version: int,
+                      collections: list[dict] | None = None, deleted_collections: list[str] | None = None) -> None:
+        """변경된 아이템/컬렉션 upsert + 삭제 반영 + 라이브러리 버전 갱신 (한 트랜잭션)"""
+        with self._lock, self._conn:
+            self._upsert_items(items)
+            self._delete_items(deleted_keys)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO collections (key, version, name, parent_key, json) VALUES (?, ?, ?, ?, ?)",
+                [(c["key"], int(c.get("version", 0)), c["data"].get("name", ""),
+                  c["data"].get("parentCollection") or None, json.dumps(c, ensure_ascii=False))
+                 for c in collections or []],
+            )
+            self._conn.executemany("DELETE FROM collections WHERE key = ?", [(k,) for k in deleted_collections or []])
+            self._set_synced(version)
+
+    def mark_synced(self, version: int) -> None:
+        """변경 없음 확인 (버전 유지, 동기화 시각만 갱신)"""
+        with self._lock, self._conn:
+            self._set_synced(version)
+
+    def _set_synced(self, version: int) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+            [("library_version", str(version)),
+             ("last_sync", datetime.now().isoformat(timespec="seconds")),
+             ("synced_at", str(time.time()))],
+        )
+
+    def upsert_item(self, item: dict) -> None:
+        """API에서 받은 아이템 하나 반영 (GET/생성 결과). 라이브러리 버전은 그대로"""
+        with self._lock, self._conn:
+            self._upsert_items([item])
+
+    def record_write(self, key: str, version: int, changes: dict) -> None:
+        """쓰기 성공 후 로컬 사본 갱신 (data 필드 변경 + 새 아이템 버전)"""
+        item = self.get_item(key)
+        if item is None:
+            return
+        item["data"].update(changes)
+        item["data"]["version"] = version
+        item["version"] = version
+        self.upsert_item(item)
+
+    def delete_items(self, keys: list[str]) -> None:
+        with self._lock, self._conn:
+            self._delete_items(keys)
+
+    def clear(self) -> None:
+        """저장소 초기화 (다음 동기화는 전체 fetch)"""
+        with self._lock, self._conn:
+            for table in ("items", "tags", "collections", "item_collections"):
+                self._conn.execute(f"DELETE FROM {table}")
+            self._conn.execute("DELETE FROM meta WHERE name != 'schema_version'")
+
+    # --- read ---
+
+    def _query(self, where: str, params: tuple = ()) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT json FROM items WHERE trashed = 0 AND {where} ORDER BY date_modified DESC, key",
+                params,
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def top_items(self) -> list[dict]:
+        """zot.top()과 같은 top-level 아이템 (휴지통 제외, 최근 수정 순)"""
+        return self._query("parent_key IS NULL")
+
+    def items_of_type(self, item_type: str) -> list[dict]:
+        """zot.items(itemType=...)와 같은 결과 (예: 'note', 'attachment')"""
+        return self._query("item_type = ?", (item_type,))
+
+    def get_item(self, key: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT json FROM items WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def item_tags(self, key: str) -> list[str] | None:
+        """아이템 태그 (저장소에 없는 아이템이면 None)"""
+        with self._lock:
+            if not self._conn.execute("SELECT 1 FROM items WHERE key = ?", (key,)).fetchone():
+                return None
+            rows = self._conn.execute("SELECT tag FROM tags WHERE item_key = ? ORDER BY rowid", (key,)).fetchall()
+        return [r[0] for r in rows]
+
+    def item_versions(self, keys: list[str]) -> dict[str, int]:
+        """key -> 아이템 버전 (저장소에 있는 것만)"""
+        versions = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, version FROM items WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                versions.update(rows)
+        return versions
+
+    def collection_by_name(self, name: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT json FROM collections WHERE name = ? ORDER BY key LIMIT 1",
+                                     (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def collection_items(self, collection_key: str, item_type: str | None = None) -> list[dict]:
+        """zot.collection_items(key, itemType=...)와 같은 결과"""
+        where = "key IN (SELECT item_key FROM item_collections WHERE collection_key = ?)"
+        params = (collection_key,)
+        if item_type:
+            where += " AND item_type = ?"
+            params += (item_type,)
+        return self._query(where, params)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM items WHERE trashed = 0").fetchone()[0]
+
+
+_stores: dict[str, ZoteroStore] = {}
+_stores_lock = threading.Lock()
+
+
+def store_path(library_type: str, library_id: str) -> Path:
+    """라이브러리별 저장소 경로 (cache/zotero_users_123.sqlite)"""
+    return CACHE_DIR / f"zotero_{library_type}_{library_id}.sqlite"
+
+
+def open_store(zot) -> ZoteroStore:
+    """Zotero 클라이언트의 라이브러리에 해당하는 저장소 (프로세스 내 공유)"""
+    path = store_path(zot.library_type, zot.library_id)
+    with _stores_lock:
+        if str(path) not in _stores:
+            _stores[str(path)] = ZoteroStore(path)
+        return _stores[str(path)]